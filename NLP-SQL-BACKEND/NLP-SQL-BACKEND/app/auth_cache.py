@@ -0,0 +1,82 @@
+from datetime import datetime
+from hashlib import sha256
+from typing import NamedTuple, Optional, Dict
+import time
+from .ttl_cache import TTLCache
+
+
+class CachedUser(NamedTuple):
+    """Read-only snapshot of a User row for request handlers (no password hash)"""
+    id: int
+    email: str
+    full_name: Optional[str]
+    google_id: Optional[str]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_record(cls, record) -> "CachedUser":
+        return cls(
+            id=record.id,
+            email=record.email,
+            full_name=record.full_name,
+            google_id=record.google_id,
+            created_at=record.created_at
+        )
+
+
+class TokenCache(TTLCache):
+    """
+    sha256(token) -> subject for tokens whose signature and claims were already checked.
+    An entry never outlives the token's own exp claim. Revoked tokens are remembered
+    until they expire, so a cache miss can't re-admit them.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+        self._revoked: Dict[str, float] = {}
+        self.synced_at = 0.0 # Monotonic time revocations were last read from the system store
+        self.synced_through: Optional[datetime] = None # Revocations up to here have been applied
+
+    @staticmethod
+    def hash_token(token: str) -> str:
+        return sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[str]:
+        return super().get(self.hash_token(token))
+
+    def put(self, token: str, subject: str, expires_at: Optional[float] = None):
+        """expires_at is the token's exp claim (epoch seconds)"""
+        ttl = self.ttl_seconds
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        super().put(self.hash_token(token), subject, ttl)
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        self.revoke_hash(self.hash_token(token), expires_at)
+
+    def revoke_hash(self, key: str, expires_at: Optional[float] = None):
+        self.pop(key)
+        with self._lock:
+            now = time.time()
+            self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+            self._revoked[key] = expires_at or now + self.ttl_seconds
+
+    def is_revoked(self, token: str) -> bool:
+        expires_at = self._revoked.get(self.hash_token(token))
+        return expires_at is not None and expires_at > time.time()
+
+    def get_stats(self) -> dict:
+        return {**super().get_stats(), "revoked": len(self._revoked)}
+
+
+class UserCache(TTLCache):
+    """email -> CachedUser; invalidate on any change to the user row"""
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+
+    def put(self, user: CachedUser):
+        super().put(user.email, user)
+
+    def invalidate(self, email: str):
+        self.pop(email)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from .database import get_db
@@ -64,10 +65,10 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 async def google_auth(request: GoogleAuthRequest, db: Session = Depends(get_db)):
     """
     Authenticate with Google ID Token.
-    Synchronously verifies token and returns application access token.
+    Verifies the token in a worker thread and returns application access token.
     """
-    # 1. Verify Google Token
-    idinfo = auth_service.verify_google_token(request.token)
+    # 1. Verify Google Token (certificates come from the cache; a refetch never blocks the event loop)
+    idinfo = await run_in_threadpool(auth_service.verify_google_token, request.token)
     
     if not idinfo:
         raise HTTPException(
@@ -98,7 +99,18 @@ async def google_auth(request: GoogleAuthRequest, db: Session = Depends(get_db))
             
     db.commit()
     db.refresh(user)
+    auth_service.invalidate_user(email=user.email)
     
     # 3. Issue JWT
     access_token = auth_service.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout")
+async def logout(
+    token: str = Depends(auth_service.oauth2_scheme),
+    current_user=Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke the presented token (other workers notice within AUTH_REVOCATION_SYNC_SECONDS)"""
+    auth_service.revoke_token(token, db)
+    return {"message": "Logged out"}
@@ -7,9 +7,10 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from .database import get_db
 from . import models
+from .auth_cache import TokenCache, UserCache, CachedUser
 from config import settings
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from .google_certs import GoogleCertCache
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme for dependency injection
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Verified tokens and user records, so repeat requests skip JWT verification and the system DB
+token_cache = TokenCache(ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL, max_entries=settings.AUTH_TOKEN_CACHE_MAX)
+user_cache = UserCache(ttl_seconds=settings.AUTH_USER_CACHE_TTL, max_entries=settings.AUTH_USER_CACHE_MAX)
+
+# Google's signing certificates, refetched per their Cache-Control max-age rather than per login
+google_certs = GoogleCertCache(
+    certs_url=settings.GOOGLE_CERTS_URL,
+    max_stale_seconds=settings.GOOGLE_CERTS_MAX_STALE_SECONDS,
+    fetch_timeout=settings.GOOGLE_CERTS_FETCH_TIMEOUT
+)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -30,12 +42,12 @@ def verify_google_token(token: str) -> Optional[dict]:
     """
     Verify a Google ID token.
     In a production app, the CLIENT_ID would be in settings.
+    Blocking on a first or expired certificate fetch, so call it off the event loop.
     """
     try:
         # Verify with the configured Client ID if available
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            google_requests.Request(), 
+        idinfo = google_certs.verify(
+            token,
             audience=settings.GOOGLE_CLIENT_ID,
             clock_skew_in_seconds=30
         )
@@ -68,21 +80,75 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    _sync_revocations(db)
+    email = token_cache.get(token)
+    if email is None:
+        if token_cache.is_revoked(token) or db.get(models.RevokedToken, token_cache.hash_token(token)):
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.email == email).first()
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        token_cache.put(token, email, payload.get("exp"))
+
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        record = db.query(models.User).filter(models.User.email == email).first()
+        if record is None:
+            raise credentials_exception
+        user = CachedUser.from_record(record)
+        user_cache.put(user)
     return user
+
+def revoke_token(token: str, db: Session):
+    """Reject a token from now on, on every worker, e.g. on logout"""
+    try:
+        expires_at = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        expires_at = None
+    now = datetime.utcnow()
+    key = token_cache.hash_token(token)
+    db.merge(models.RevokedToken(
+        token_hash=key,
+        expires_at=datetime.utcfromtimestamp(expires_at) if expires_at else now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        revoked_at=now
+    ))
+    # Rows whose token has expired reject nothing any more
+    db.query(models.RevokedToken).filter(models.RevokedToken.expires_at < now).delete()
+    db.commit()
+    token_cache.revoke_hash(key, expires_at)
+
+def _sync_revocations(db: Session):
+    """Apply logouts made on other workers, at most every AUTH_REVOCATION_SYNC_SECONDS"""
+    started = time.monotonic()
+    if started - token_cache.synced_at < settings.AUTH_REVOCATION_SYNC_SECONDS:
+        return
+    token_cache.synced_at = started
+    now = datetime.utcnow()
+    query = db.query(models.RevokedToken.token_hash, models.RevokedToken.expires_at)
+    if token_cache.synced_through is None:
+        query = query.filter(models.RevokedToken.expires_at > now)
+    else:
+        # Overlap the previous read, so a revocation committed just after it is still seen
+        query = query.filter(models.RevokedToken.revoked_at >= token_cache.synced_through - timedelta(minutes=1))
+    try:
+        rows = query.all()
+    except Exception as e:
+        logger.warning(f"Could not read token revocations: {e}")
+        return
+    for token_hash, expires_at in rows:
+        token_cache.revoke_hash(token_hash, (expires_at - datetime(1970, 1, 1)).total_seconds())
+    token_cache.synced_through = now
+
+def invalidate_user(email: str):
+    """Call after any change to a user row so the next request reloads it"""
+    user_cache.invalidate(email)
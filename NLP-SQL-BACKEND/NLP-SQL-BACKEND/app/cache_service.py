@@ -2,9 +2,13 @@ import redis
 import json
 import hashlib
 import time
-from typing import Optional, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Iterable, List, Set, Tuple
 from datetime import datetime, date
 from config import settings
+from app.metrics import CACHE_SECONDS
+from app.tracing import tracer, traced, annotate
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,8 +27,16 @@ class CacheManager:
         # Local in-memory fallback for when Redis is down
         self.memory_cache = {} 
         self.memory_history = {} # NEW: Track history in memory
+        self.table_keys: Dict[str, Dict[str, Set[str]]] = {} # tenant -> table -> cache keys that read it
+        # key -> (tenant, tables, Redis expiry or None when only in memory); lets keys leave table_keys
+        self.key_tables: "OrderedDict[str, Tuple[str, Tuple[str, ...], Optional[float]]]" = OrderedDict()
+        self.max_indexed_keys = settings.CACHE_TABLE_INDEX_MAX
+        self.index_sweep_interval = 60 # Seconds between sweeps of expired Redis keys from the index
+        self._next_index_sweep = time.monotonic() + self.index_sweep_interval
         self.hits = 0
         self.misses = 0
+        # Guards memory_cache, table_keys and key_tables; request, chart batch and drift watcher threads share them
+        self._lock = threading.Lock()
         
         self._check_redis()
     
@@ -58,21 +70,34 @@ class CacheManager:
             logger.debug("Redis still unavailable, sticking to memory cache.")
             return False
 
-    def _generate_key(self, tenant_id: str, sql: str) -> str:
-        """Generate unique cache key from tenant and SQL"""
+    def _generate_key(self, tenant_id: str, sql: str, schema_version: Optional[str] = None) -> str:
+        """Generate unique cache key from tenant, schema version and SQL"""
         normalized_sql = ' '.join(sql.lower().split())
         sql_hash = hashlib.sha256(normalized_sql.encode()).hexdigest()[:16]
+        if schema_version:
+            # A schema change yields a new version, so stale results are simply never looked up again
+            return f"{tenant_id}:{schema_version}:{sql_hash}"
         return f"{tenant_id}:{sql_hash}"
     
-    def get_cached_result(self, tenant_id: str, sql: str) -> Optional[Any]:
+    def get_cached_result(self, tenant_id: str, sql: str, schema_version: Optional[str] = None) -> Optional[Any]:
         """Get cached result from Memory or Redis"""
-        key = self._generate_key(tenant_id, sql)
-        
+        start = time.perf_counter()
+        with tracer.span("CacheManager.get") as span:
+            result, tier = self._lookup(self._generate_key(tenant_id, sql, schema_version))
+            span.set_attribute("cache.tier", tier)
+        CACHE_SECONDS.observe(time.perf_counter() - start, operation="get", result=tier)
+        return result
+
+    def _lookup(self, key: str):
+        """(result, tier) where tier is memory_hit, redis_hit or miss"""
         # 1. Try Memory First (Fastest, works even if Redis is down)
-        if key in self.memory_cache:
+        with self._lock:
+            found = key in self.memory_cache
+            data = self.memory_cache.get(key)
+        if found:
             self.hits += 1
             logger.info(f"⚡ Memory Cache HIT for {key}")
-            return self.memory_cache[key]
+            return data, "memory_hit"
 
         # 2. Try Redis if available
         if self._check_redis():
@@ -82,39 +107,65 @@ class CacheManager:
                     self.hits += 1
                     data = json.loads(result)
                     # Backfill memory cache
-                    self.memory_cache[key] = data
+                    with self._lock:
+                        self.memory_cache[key] = data
                     logger.info(f"✅ Redis Cache HIT for {key}")
-                    return data
+                    return data, "redis_hit"
             except Exception as e:
                 logger.error(f"Redis get error: {e}")
                 self.available = False # Mark as down on failure
 
         self.misses += 1
-        return None
+        return None, "miss"
     
-    def cache_result(self, tenant_id: str, sql: str, result: Any, ttl: int = 300):
-        """Store result in memory and try Redis"""
-        key = self._generate_key(tenant_id, sql)
+    @traced("CacheManager.set")
+    def cache_result(
+        self,
+        tenant_id: str,
+        sql: str,
+        result: Any,
+        ttl: int = 300,
+        schema_version: Optional[str] = None,
+        tables: Optional[List[str]] = None,
+        record_history: bool = True
+    ):
+        """Store result in memory and try Redis (tables lets schema drift invalidate it)"""
+        start = time.perf_counter()
+        key = self._generate_key(tenant_id, sql, schema_version)
         
         # Always update memory cache (LRU: keep last 50)
-        self.memory_cache[key] = result
-        if len(self.memory_cache) > 50:
-            # Simple eviction: pop the oldest key
-            old_key = next(iter(self.memory_cache))
-            self.memory_cache.pop(old_key)
+        with self._lock:
+            self.memory_cache[key] = result
+            if len(self.memory_cache) > 50:
+                # Simple eviction: pop the oldest key
+                old_key = next(iter(self.memory_cache))
+                self.memory_cache.pop(old_key)
+                indexed = self.key_tables.get(old_key)
+                if indexed is not None and indexed[2] is None:
+                    # Not in Redis either, so nothing is left to invalidate
+                    self._unindex(old_key)
 
         # Try to persist to Redis
+        stored_in = "memory"
         if self._check_redis():
             try:
                 json_result = json.dumps(result, default=self._json_serializer)
                 self.redis_client.setex(key, ttl, json_result)
                 logger.info(f"💾 Redis Cached result for {key}")
-                
+                stored_in = "redis"
+                annotate({"cache.bytes": len(json_result)})
+
                 # Add to history
-                self._add_to_history(tenant_id, sql)
+                if record_history:
+                    self._add_to_history(tenant_id, sql)
             except Exception as e:
                 logger.error(f"Redis set error: {e}")
                 self.available = False
+        if tables:
+            with self._lock:
+                self._index(tenant_id, key, tables, time.monotonic() + ttl if stored_in == "redis" else None)
+        annotate({"cache.tier": stored_in})
+        CACHE_SECONDS.observe(time.perf_counter() - start, operation="set", result=stored_in)
 
     def get_tenant_stats(self, tenant_id: str) -> dict:
         """Get per-tenant statistics"""
@@ -127,13 +178,15 @@ class CacheManager:
                 self.available = False
         
         total = hits + misses
+        with self._lock:
+            memory_entries = sum(1 for k in self.memory_cache if k.startswith(tenant_id))
         return {
             "hits": hits,
             "misses": misses,
             "total_queries": total,
             "hit_rate_percentage": round((hits / total * 100) if total > 0 else 0, 2),
             "redis_available": self.available,
-            "memory_cache_entries": len([k for k in self.memory_cache if k.startswith(tenant_id)])
+            "memory_cache_entries": memory_entries
         }
 
     def get_tenant_history(self, tenant_id: str) -> list:
@@ -158,7 +211,11 @@ class CacheManager:
     def invalidate_tenant_cache(self, tenant_id: str):
         """Clear local and Redis entries for a tenant"""
         # Clear Memory
-        self.memory_cache = {k: v for k, v in self.memory_cache.items() if not k.startswith(tenant_id)}
+        with self._lock:
+            self.memory_cache = {k: v for k, v in self.memory_cache.items() if not k.startswith(tenant_id)}
+            self.table_keys.pop(tenant_id, None)
+            for key in [k for k, (tenant, _, _) in self.key_tables.items() if tenant == tenant_id]:
+                del self.key_tables[key]
         
         if self._check_redis():
             try:
@@ -175,6 +232,61 @@ class CacheManager:
                 self.available = False
         return True
     
+    def invalidate_tables(self, tenant_id: str, tables: Iterable[str]) -> int:
+        """Drop cached results that read any of the given tables; returns how many keys were dropped"""
+        with self._lock:
+            tenant_tables = self.table_keys.get(tenant_id, {})
+            keys = set()
+            for table in tables:
+                keys |= tenant_tables.pop(table.lower(), set())
+            for key in keys:
+                self.memory_cache.pop(key, None)
+                self._unindex(key)
+        if not keys:
+            return 0
+        
+        if self._check_redis():
+            try:
+                self.redis_client.delete(*keys)
+            except Exception:
+                self.available = False
+        logger.info(f"🧹 Invalidated {len(keys)} cached results for tenant {tenant_id} after schema change")
+        return len(keys)
+    
+    def _index(self, tenant_id: str, key: str, tables: List[str], expires_at: Optional[float]):
+        """Record which tables a cached result read, so a change to one of them can drop it (caller holds _lock)"""
+        self._unindex(key)
+        names = tuple(sorted({table.lower() for table in tables}))
+        tenant_tables = self.table_keys.setdefault(tenant_id, {})
+        for table in names:
+            tenant_tables.setdefault(table, set()).add(key)
+        self.key_tables[key] = (tenant_id, names, expires_at)
+
+        now = time.monotonic()
+        if now >= self._next_index_sweep:
+            self._next_index_sweep = now + self.index_sweep_interval
+            for expired in [k for k, (_, _, at) in self.key_tables.items() if at is not None and at <= now]:
+                self._unindex(expired)
+        while len(self.key_tables) > self.max_indexed_keys:
+            # Oldest first; schema versions in the keys still keep such results from being served stale
+            self._unindex(next(iter(self.key_tables)))
+
+    def _unindex(self, key: str):
+        """Forget a key in both directions of the index (caller holds _lock)"""
+        entry = self.key_tables.pop(key, None)
+        if entry is None:
+            return
+        tenant_id, names, _ = entry
+        tenant_tables = self.table_keys.get(tenant_id, {})
+        for table in names:
+            keys = tenant_tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del tenant_tables[table]
+        if not tenant_tables:
+            self.table_keys.pop(tenant_id, None)
+
     def get_stats(self):
         """Global cache stats"""
         total = self.hits + self.misses
@@ -184,7 +296,8 @@ class CacheManager:
             "total_requests": total,
             "hit_rate_percentage": round((self.hits / total * 100) if total > 0 else 0, 2),
             "redis_available": self.available,
-            "memory_cache_size": len(self.memory_cache)
+            "memory_cache_size": len(self.memory_cache),
+            "indexed_keys": len(self.key_tables)
         }
     
     def prepare_tenant(self, tenant_id: str):
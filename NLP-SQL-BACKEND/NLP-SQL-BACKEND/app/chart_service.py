@@ -0,0 +1,530 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, List, Any, Tuple
+from app.query_executor import QueryTimeoutError, QueryCancelledError
+import hashlib
+import json
+import math
+import sqlite3
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Whole type names only (int4 and int(11) still match), so point and interval are not measures
+NUMERIC_TYPE = re.compile(
+    r"(?<![a-z])(?:tinyint|smallint|mediumint|int|integer|bigint|numeric|decimal|dec|number|float|double|real"
+    r"|smallserial|serial|bigserial|money|long)(?![a-z])",
+    re.IGNORECASE
+)
+TEMPORAL_TYPE = re.compile(r"date|time", re.IGNORECASE)
+
+# (unit, approximate seconds) from finest to coarsest
+TIME_BUCKETS = [
+    ("minute", 60),
+    ("hour", 3600),
+    ("day", 86400),
+    ("week", 604800),
+    ("month", 2629746),
+    ("year", 31556952),
+]
+
+MYSQL_BUCKET_FORMATS = {
+    "minute": "'%Y-%m-%d %H:%i:00'",
+    "hour": "'%Y-%m-%d %H:00:00'",
+    "day": "'%Y-%m-%d'",
+    "month": "'%Y-%m-01'",
+    "year": "'%Y-01-01'",
+}
+
+AGGREGATIONS = ("auto", "sum", "avg", "min", "max", "count", "none")
+
+
+class ConnectionNotFoundError(Exception):
+    """Raised when the tenant has no database connection for this user"""
+
+
+class TableNotFoundError(Exception):
+    """Raised when a chart names a table that is not in the tenant's schema"""
+
+
+class ColumnNotFoundError(Exception):
+    """Raised when a chart names a column its table does not have"""
+
+
+def lttb(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indexes of the points to keep (always including the first and last).
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    keep = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+
+class ChartService:
+    """
+    Builds chart series with the aggregation pushed down to the tenant database:
+    GROUP BY / $group for categories, time buckets (date_trunc, $dateTrunc) for
+    temporal axes and width buckets / $bucketAuto for numeric axes. Every series
+    is capped at max_points; raw line series are downsampled with LTTB.
+    Results are cached per normalized spec alongside the tenant's query results.
+    """
+
+    def __init__(
+        self,
+        db_service,
+        schema_service,
+        query_executor,
+        cache_service=None,
+        max_points: int = 500,
+        max_raw_points: int = 50000,
+        batch_concurrency: int = 4,
+        cache_ttl: int = 300,
+        rollup_manager=None
+    ):
+        self.db_service = db_service
+        self.schema_service = schema_service
+        self.query_executor = query_executor
+        self.cache_service = cache_service
+        self.max_points = max_points
+        self.max_raw_points = max_raw_points
+        self.batch_concurrency = batch_concurrency
+        self.cache_ttl = cache_ttl
+        self.rollup_manager = rollup_manager
+
+    def get_chart_data(self, request, user_id: int, db, cancel_token=None) -> dict:
+        """Series for one chart spec ({'x', 'y'} plus how it was aggregated)"""
+        conn_record, engine = self._connect(request.tenant_id, user_id, db)
+        return self._cached_chart(request.tenant_id, request, conn_record, engine, cancel_token)
+
+    def get_chart_batch(self, tenant_id: str, specs: List[Any], user_id: int, db, cancel_token=None) -> dict:
+        """
+        Several charts for one tenant in one call. The connection is resolved once and
+        specs run concurrently, at most batch_concurrency at a time so a dashboard can't
+        exhaust the tenant's pool. A failing chart reports its error without failing the rest.
+        """
+        # The request's db session is not thread-safe, so it is only used here
+        conn_record, engine = self._connect(tenant_id, user_id, db)
+        results: List[Optional[dict]] = [None] * len(specs)
+
+        def run(index: int):
+            try:
+                results[index] = {"data": self._cached_chart(tenant_id, specs[index], conn_record, engine, cancel_token)}
+            except QueryTimeoutError as e:
+                results[index] = {"error": str(e), "status_code": 504}
+            except (TableNotFoundError, ColumnNotFoundError) as e:
+                results[index] = {"error": str(e), "status_code": 404}
+            except ValueError as e:
+                results[index] = {"error": str(e), "status_code": 400}
+            except QueryCancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chart {index} failed for tenant {tenant_id}: {e}")
+                results[index] = {"error": str(e), "status_code": 500}
+
+        workers = min(self.batch_concurrency, len(specs))
+        registry = getattr(self.db_service, "registry", None)
+        if registry is not None:
+            # Never ask for more connections than the tenant pool can hand out
+            workers = min(workers, registry.tenant_capacity)
+        workers = max(1, workers)
+        if workers == 1:
+            for index in range(len(specs)):
+                run(index)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"charts-{tenant_id[:8]}") as pool:
+                for future in [pool.submit(run, index) for index in range(len(specs))]:
+                    future.result()
+
+        return {
+            "charts": results,
+            "cached": sum(1 for result in results if result.get("data", {}).get("cached"))
+        }
+
+    def _connect(self, tenant_id: str, user_id: int, db):
+        conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
+        if not conn_record:
+            raise ConnectionNotFoundError("Database connection not found.")
+        engine = self.db_service.get_engine(tenant_id, user_id, db)
+        if not engine:
+            raise PermissionError("Failed to retrieve database connection.")
+        return conn_record, engine
+
+    def _cached_chart(self, tenant_id: str, spec, conn_record, engine, cancel_token) -> dict:
+        if getattr(spec, "filters", None):
+            # Not applied by any query path, so refuse rather than answer (or cache) unfiltered data
+            raise ValueError("Chart filters are not supported.")
+        if self.cache_service is None:
+            return self._chart(tenant_id, spec, conn_record, engine, cancel_token)
+
+        cache_key = self.cache_key(spec, self.max_points)
+        schema_version = self.schema_service.get_schema_version(tenant_id)
+        cached = self.cache_service.get_cached_result(tenant_id, cache_key, schema_version=schema_version)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        data = self._chart(tenant_id, spec, conn_record, engine, cancel_token)
+        # Keyed under the tenant, so it goes with invalidate_tenant_cache and schema drift on the table
+        self.cache_service.cache_result(
+            tenant_id, cache_key, data,
+            ttl=self.cache_ttl,
+            schema_version=schema_version,
+            tables=[spec.table_name],
+            record_history=False
+        )
+        return {**data, "cached": False}
+
+    @staticmethod
+    def cache_key(spec, max_points: int) -> str:
+        """Stable key for a chart spec; options are normalized so equivalent specs share an entry"""
+        normalized = {
+            "table": spec.table_name,
+            "x": spec.x_column,
+            "y": spec.y_column,
+            "chart": (spec.chart_type or "bar").lower(),
+            "aggregation": (spec.aggregation or "auto").lower(),
+            "bucket": (spec.bucket or "auto").lower(),
+            "points": min(spec.max_points or max_points, max_points)
+        }
+        # Hashed here because identifiers are case-sensitive and the cache lowercases its key text
+        digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+        return f"chart:{digest}"
+
+    def _chart(self, tenant_id: str, spec, conn_record, engine, cancel_token) -> dict:
+        x_kind, y_numeric = self._column_kinds(tenant_id, spec.table_name, spec.x_column, spec.y_column)
+        chart_type = spec.chart_type.lower()
+        max_points = min(spec.max_points or self.max_points, self.max_points)
+        aggregation = self._resolve_aggregation(spec.aggregation, chart_type, y_numeric)
+        if self.rollup_manager is not None and aggregation != "none":
+            served = self._rollup_series(tenant_id, spec, chart_type, x_kind, aggregation, max_points)
+            if served is not None:
+                return served
+        run = _Run(self.query_executor, engine, conn_record, tenant_id, cancel_token)
+
+        if conn_record.db_type in ('mysql', 'postgresql'):
+            return self._sql_series(run, spec, chart_type, x_kind, aggregation, max_points)
+        if conn_record.db_type == 'mongodb':
+            return self._mongo_series(run, spec, chart_type, x_kind, aggregation, max_points)
+        raise ValueError(f"Charts are not supported for {conn_record.db_type}")
+
+    def _rollup_series(self, tenant_id: str, spec, chart_type: str, x_kind: str, aggregation: str, max_points: int) -> Optional[dict]:
+        """Series from a materialized rollup, or None to query the database (every request counts towards one)"""
+        if _is_categorical(chart_type, x_kind):
+            grain = "category"
+        elif x_kind == "temporal":
+            grain = "day"
+        else:
+            return None
+        measure = None if aggregation == "count" else spec.y_column
+        shape = self.rollup_manager.shape_for(tenant_id, spec.table_name, spec.x_column, grain, measure)
+        if shape is None:
+            return None
+        self.rollup_manager.record(tenant_id, shape)
+        entry = self.rollup_manager.find(tenant_id, shape)
+        if entry is None:
+            return None
+
+        function = "count*" if aggregation == "count" else aggregation
+        try:
+            if grain == "category":
+                pairs = self.rollup_manager.query(tenant_id, entry, function, order=[("value", True)], limit=max_points + 1)
+                truncated = len(pairs) > max_points
+                rows = [{"x": x, "y": y} for x, y in pairs[:max_points]]
+                if chart_type != 'pie':
+                    rows.sort(key=lambda row: (row["x"] is None, _sort_key(row["x"])))
+                series = self._series(rows, "category", aggregation, truncated=truncated)
+            else:
+                low, high = self.rollup_manager.bounds(tenant_id, entry)
+                unit = self._time_bucket(low, high, max_points, spec.bucket)
+                if unit not in self.rollup_manager.UNITS:
+                    # Finer than the rollup's day grain
+                    return None
+                pairs = self.rollup_manager.query(
+                    tenant_id, entry, function, unit, order=[("group", False)], limit=max_points, skip_null_groups=True
+                )
+                series = self._series([{"x": x, "y": y} for x, y in pairs], unit, aggregation)
+        except sqlite3.Error as e:
+            logger.warning(f"Rollup {entry['table']} unreadable for tenant {tenant_id}, using the database: {e}")
+            return None
+        series["source"] = "rollup"
+        series["refreshed_at"] = datetime.utcfromtimestamp(entry["refreshed_at"]).isoformat()
+        return series
+
+    def _column_kinds(self, tenant_id: str, table_name: str, x_column: str, y_column: str) -> Tuple[str, bool]:
+        """('temporal' | 'numeric' | 'categorical', y is numeric); unknown names raise *NotFoundError"""
+        schema = self.schema_service.get_schema(tenant_id)
+        if schema is None:
+            raise ValueError("Schema not available yet for this tenant.")
+        if table_name not in schema:
+            raise TableNotFoundError(f"Unknown table: {table_name}")
+        types = {column['name']: column['type'] for column in schema[table_name]['columns']}
+        for column in (x_column, y_column):
+            if column not in types:
+                raise ColumnNotFoundError(f"Unknown column: {table_name}.{column}")
+
+        x_type = types[x_column]
+        if TEMPORAL_TYPE.search(x_type):
+            x_kind = "temporal"
+        elif NUMERIC_TYPE.search(x_type):
+            x_kind = "numeric"
+        else:
+            x_kind = "categorical"
+        return x_kind, bool(NUMERIC_TYPE.search(types[y_column]))
+
+    def _resolve_aggregation(self, aggregation: str, chart_type: str, y_numeric: bool) -> str:
+        aggregation = (aggregation or "auto").lower()
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {aggregation}")
+        if chart_type == 'pie':
+            return "count"
+        if aggregation == "auto":
+            return "sum" if y_numeric else "count"
+        if aggregation in ("sum", "avg") and not y_numeric:
+            return "count"
+        return aggregation
+
+    def _time_bucket(self, low, high, max_points: int, requested: Optional[str]) -> str:
+        if requested and requested != "auto":
+            if requested not in dict(TIME_BUCKETS):
+                raise ValueError(f"Unsupported bucket: {requested}")
+            return requested
+        low, high = _as_datetime(low), _as_datetime(high)
+        if low is None or high is None:
+            return "day"
+        span = max((high - low).total_seconds(), 0)
+        for unit, seconds in TIME_BUCKETS:
+            if span / seconds <= max_points:
+                return unit
+        return "year"
+
+    # SQL
+
+    def _sql_series(self, run: "_Run", request, chart_type: str, x_kind: str, aggregation: str, max_points: int) -> dict:
+        quote = run.engine.dialect.identifier_preparer.quote_identifier
+        table, x, y = quote(request.table_name), quote(request.x_column), quote(request.y_column)
+        value = {"count": "COUNT(*)", "sum": f"SUM({y})", "avg": f"AVG({y})", "min": f"MIN({y})", "max": f"MAX({y})"}.get(aggregation)
+
+        if _is_categorical(chart_type, x_kind):
+            # Top categories by value, capped at max_points
+            rows = run.sql(
+                f"SELECT {x} AS x, {value or f'MAX({y})'} AS y FROM {table} GROUP BY {x} "
+                f"ORDER BY y DESC LIMIT {max_points + 1}"
+            )
+            truncated = len(rows) > max_points
+            rows = rows[:max_points]
+            if chart_type != 'pie':
+                rows.sort(key=lambda row: (row["x"] is None, _sort_key(row["x"])))
+            return self._series(rows, "category", aggregation, truncated=truncated)
+
+        if aggregation == "none":
+            rows = run.sql(
+                f"SELECT {x} AS x, {y} AS y FROM {table} WHERE {x} IS NOT NULL "
+                f"ORDER BY {x} LIMIT {self.max_raw_points + 1}"
+            )
+            return self._downsampled(rows, max_points, x_kind)
+
+        bounds = run.sql(f"SELECT MIN({x}) AS lo, MAX({x}) AS hi FROM {table}")
+        low, high = (bounds[0]["lo"], bounds[0]["hi"]) if bounds else (None, None)
+
+        if x_kind == "temporal":
+            unit = self._time_bucket(low, high, max_points, request.bucket)
+            bucket = self._sql_time_bucket(run.db_type, x, unit)
+            rows = run.sql(
+                f"SELECT {bucket} AS x, {value} AS y FROM {table} WHERE {x} IS NOT NULL "
+                f"GROUP BY {bucket} ORDER BY {bucket} LIMIT {max_points}"
+            )
+            return self._series(rows, unit, aggregation)
+
+        # Numeric x on a line chart: equal-width buckets labelled by their lowest x
+        if low is None or high is None:
+            return self._series([], "width", aggregation)
+        low, high = float(low), float(high)
+        width = (high - low) / max_points or 1.0
+        rows = run.sql(
+            f"SELECT MIN({x}) AS x, {value} AS y FROM {table} WHERE {x} IS NOT NULL "
+            f"GROUP BY FLOOR(({x} - {low!r}) / {width!r}) ORDER BY MIN({x}) LIMIT {max_points + 1}"
+        )
+        return self._series(rows[:max_points], "width", aggregation)
+
+    def _sql_time_bucket(self, db_type: str, x: str, unit: str) -> str:
+        if db_type == 'postgresql':
+            return f"date_trunc('{unit}', {x})"
+        if unit == "week":
+            return f"DATE_FORMAT(DATE_SUB({x}, INTERVAL WEEKDAY({x}) DAY), '%Y-%m-%d')"
+        return f"DATE_FORMAT({x}, {MYSQL_BUCKET_FORMATS[unit]})"
+
+    # MongoDB
+
+    def _mongo_series(self, run: "_Run", request, chart_type: str, x_kind: str, aggregation: str, max_points: int) -> dict:
+        x, y = request.x_column, request.y_column
+        value = {
+            "count": {"$sum": 1}, "sum": {"$sum": f"${y}"}, "avg": {"$avg": f"${y}"},
+            "min": {"$min": f"${y}"}, "max": {"$max": f"${y}"}
+        }.get(aggregation)
+        present = {"$match": {x: {"$ne": None}}}
+
+        if _is_categorical(chart_type, x_kind):
+            docs = run.mongo(request.table_name, [
+                {"$group": {"_id": f"${x}", "y": value or {"$max": f"${y}"}}},
+                {"$sort": {"y": -1}},
+                {"$limit": max_points + 1}
+            ])
+            truncated = len(docs) > max_points
+            rows = [{"x": doc["_id"], "y": doc.get("y")} for doc in docs[:max_points]]
+            if chart_type != 'pie':
+                rows.sort(key=lambda row: (row["x"] is None, _sort_key(row["x"])))
+            return self._series(rows, "category", aggregation, truncated=truncated)
+
+        if aggregation == "none":
+            docs = run.mongo(request.table_name, [
+                present,
+                {"$sort": {x: 1}},
+                {"$limit": self.max_raw_points + 1},
+                {"$project": {"_id": 0, "x": f"${x}", "y": f"${y}"}}
+            ])
+            return self._downsampled(docs, max_points, x_kind)
+
+        if x_kind == "temporal":
+            bounds = run.mongo(request.table_name, [
+                {"$group": {"_id": None, "lo": {"$min": f"${x}"}, "hi": {"$max": f"${x}"}}}
+            ])
+            low, high = (bounds[0].get("lo"), bounds[0].get("hi")) if bounds else (None, None)
+            unit = self._time_bucket(low, high, max_points, request.bucket)
+            docs = run.mongo(request.table_name, [
+                present,
+                {"$group": {"_id": {"$dateTrunc": {"date": f"${x}", "unit": unit}}, "y": value}},
+                {"$sort": {"_id": 1}},
+                {"$limit": max_points}
+            ])
+            return self._series([{"x": doc["_id"], "y": doc.get("y")} for doc in docs], unit, aggregation)
+
+        docs = run.mongo(request.table_name, [
+            present,
+            {"$bucketAuto": {"groupBy": f"${x}", "buckets": max_points, "output": {"y": value}}}
+        ])
+        rows = [{"x": (doc["_id"] or {}).get("min"), "y": doc.get("y")} for doc in docs]
+        return self._series(rows, "auto", aggregation)
+
+    # Shaping
+
+    def _downsampled(self, rows: List[dict], max_points: int, x_kind: str) -> dict:
+        truncated = len(rows) > self.max_raw_points
+        rows = rows[:self.max_raw_points]
+        raw_points = len(rows)
+        if raw_points > max_points:
+            xs = [_numeric_x(row["x"], i, x_kind) for i, row in enumerate(rows)]
+            ys = [_safe_float(row["y"]) for row in rows]
+            rows = [rows[i] for i in lttb(xs, ys, max_points)]
+        series = self._series(rows, "raw", "none", truncated=truncated)
+        series["raw_points"] = raw_points
+        series["downsampled"] = raw_points > len(rows)
+        return series
+
+    def _series(self, rows: List[dict], bucket: str, aggregation: str, truncated: bool = False) -> dict:
+        return {
+            "x": [str(row["x"]) for row in rows],
+            "y": [_safe_float(row["y"]) for row in rows],
+            "bucket": bucket,
+            "aggregation": aggregation,
+            "truncated": truncated,
+            "downsampled": False
+        }
+
+
+class _Run:
+    """Executes one chart's queries under the tenant's budget and cancel token"""
+
+    __slots__ = ("query_executor", "engine", "conn_record", "tenant_id", "cancel_token", "db_type", "timeout_ms")
+
+    def __init__(self, query_executor, engine, conn_record, tenant_id: str, cancel_token):
+        self.query_executor = query_executor
+        self.engine = engine
+        self.conn_record = conn_record
+        self.tenant_id = tenant_id
+        self.cancel_token = cancel_token
+        self.db_type = conn_record.db_type
+        self.timeout_ms = query_executor.resolve_timeout_ms(conn_record)
+
+    def sql(self, query: str) -> List[Dict[str, Any]]:
+        return self.query_executor.execute_sql(
+            self.engine, query, self.db_type,
+            tenant_id=self.tenant_id,
+            timeout_ms=self.timeout_ms,
+            cancel_token=self.cancel_token
+        )
+
+    def mongo(self, collection: str, pipeline: List[dict]) -> List[Dict[str, Any]]:
+        return self.query_executor.execute_mongo(
+            self.engine, self.conn_record.database_name or "test", collection, pipeline,
+            tenant_id=self.tenant_id,
+            timeout_ms=self.timeout_ms,
+            cancel_token=self.cancel_token
+        )
+
+
+def _is_categorical(chart_type: str, x_kind: str) -> bool:
+    """Charts drawn as top-N groups of x rather than along a continuous axis"""
+    return chart_type == 'pie' or x_kind == "categorical" or (x_kind == "numeric" and chart_type != 'line')
+
+
+def _safe_float(value) -> float:
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        # Dates or category strings can't be plotted as a Y value
+        return 0.0
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _numeric_x(value, index: int, x_kind: str) -> float:
+    """Position on the x axis for LTTB (row index when x has no numeric meaning)"""
+    if x_kind == "temporal":
+        parsed = _as_datetime(value)
+        return parsed.timestamp() if parsed else float(index)
+    if x_kind == "numeric":
+        number = _safe_float(value)
+        return number if math.isfinite(number) else float(index)
+    return float(index)
+
+
+def _sort_key(value):
+    return (0, value) if isinstance(value, (int, float)) else (1, str(value))
@@ -9,10 +9,15 @@ class CleanupService:
     Orchestrates complete cleanup when tenant disconnects
     """
     
-    def __init__(self, db_service, schema_service, cache_service):
+    def __init__(self, db_service, schema_service, cache_service, profile_service=None, rollup_manager=None,
+                 history_service=None, slow_query_log=None):
         self.db_service = db_service
         self.schema_service = schema_service
         self.cache_service = cache_service
+        self.profile_service = profile_service
+        self.rollup_manager = rollup_manager
+        self.history_service = history_service
+        self.slow_query_log = slow_query_log
         logger.info("CleanupService initialized")
     
     def cleanup_tenant(self, tenant_id: str, user_id: Optional[int] = None, db: Optional[Session] = None) -> bool:
@@ -25,6 +30,12 @@ class CleanupService:
             
             logger.info(f"Step 2/3: Removing schema...")
             self.schema_service.remove_schema(tenant_id)
+            if self.profile_service:
+                self.profile_service.remove_profile(tenant_id)
+            if self.rollup_manager:
+                self.rollup_manager.remove_tenant(tenant_id)
+            if self.slow_query_log:
+                self.slow_query_log.remove_tenant(tenant_id)
             
             logger.info(f"Step 3/4: Closing database connection...")
             self.db_service.close_connection(tenant_id, user_id=user_id, db=db)
@@ -33,6 +44,8 @@ class CleanupService:
             if db:
                 from app.models import QueryHistory
                 db.query(QueryHistory).filter(QueryHistory.tenant_id == tenant_id).delete()
+                if self.history_service:
+                    self.history_service.remove_tenant(db, tenant_id)
                 db.commit()
             
             logger.info(f"✅ Complete cleanup finished for tenant {tenant_id}")
@@ -0,0 +1,165 @@
+from array import array
+from collections.abc import Mapping
+from sys import intern
+from typing import Dict, Iterator, Optional
+
+
+def _interned(value) -> Optional[str]:
+    # intern() only takes exact str; dialects hand back str subclasses such as quoted_name
+    return intern(str(value)) if value is not None else None
+
+
+class CompactTable:
+    """
+    One table stored column-wise: parallel tuples of interned names and types plus a
+    flag byte per column. Type strings and common column names are shared by every
+    tenant in the worker instead of being repeated in per-column dicts.
+    """
+
+    NULLABLE = 1
+    PRIMARY_KEY = 2
+
+    __slots__ = ("column_names", "column_types", "column_flags", "column_frequencies", "relations", "indexes", "row_count")
+
+    def __init__(self, column_names, column_types, column_flags, column_frequencies, relations, indexes, row_count):
+        self.column_names = column_names
+        self.column_types = column_types
+        self.column_flags = column_flags
+        self.column_frequencies = column_frequencies
+        self.relations = relations
+        self.indexes = indexes
+        self.row_count = row_count
+
+    @classmethod
+    def from_dict(cls, table: dict) -> "CompactTable":
+        """Build from the extractor shape {'columns', 'relations', 'indexes', 'row_count'}"""
+        columns = table.get('columns', [])
+        flags = bytearray(len(columns))
+        frequencies = None
+        for i, column in enumerate(columns):
+            flags[i] = (cls.NULLABLE if column.get('nullable') else 0) | (cls.PRIMARY_KEY if column.get('primary_key') else 0)
+            if 'frequency' in column:
+                if frequencies is None:
+                    frequencies = array('f', [1.0] * len(columns))
+                frequencies[i] = column['frequency']
+        return cls(
+            column_names=tuple(_interned(column['name']) for column in columns),
+            column_types=tuple(_interned(column['type']) for column in columns),
+            column_flags=bytes(flags),
+            column_frequencies=frequencies,
+            relations=tuple(
+                (_interned(rel['column']), _interned(rel['references_table']), _interned(rel['references_column']))
+                for rel in table.get('relations', [])
+            ),
+            indexes=tuple(
+                (_interned(idx['name']), tuple(_interned(c) for c in idx['columns']), bool(idx['unique']))
+                for idx in table.get('indexes', [])
+            ),
+            row_count=table.get('row_count', -1)
+        )
+
+    def to_dict(self) -> dict:
+        """Full extractor shape (a fresh dict, safe for callers to modify)"""
+        columns = []
+        for i, name in enumerate(self.column_names):
+            flags = self.column_flags[i]
+            column = {
+                'name': name,
+                'type': self.column_types[i],
+                'nullable': bool(flags & self.NULLABLE),
+                'primary_key': bool(flags & self.PRIMARY_KEY)
+            }
+            if self.column_frequencies is not None:
+                column['frequency'] = round(self.column_frequencies[i], 3)
+            columns.append(column)
+        return {
+            'columns': columns,
+            'relations': [
+                {'column': column, 'references_table': ref_table, 'references_column': ref_column}
+                for column, ref_table, ref_column in self.relations
+            ],
+            'indexes': [
+                {'name': name, 'columns': list(index_columns), 'unique': unique}
+                for name, index_columns, unique in self.indexes
+            ],
+            'row_count': self.row_count
+        }
+
+    def simplified(self) -> dict:
+        """Prompt shape used by PromptBuilder and the validators"""
+        return {
+            'columns': {name: {'type': col_type} for name, col_type in zip(self.column_names, self.column_types)},
+            'relationships': [
+                {'column': column, 'references': {'table': ref_table, 'column': ref_column}}
+                for column, ref_table, ref_column in self.relations
+            ]
+        }
+
+
+class _TableView(Mapping):
+    """Read-only name -> dict projection of a CompactSchema's tables"""
+
+    __slots__ = ("_tables", "_project")
+
+    def __init__(self, tables: Dict[str, CompactTable], project):
+        self._tables = tables
+        self._project = project
+
+    def __getitem__(self, name: str) -> dict:
+        return self._project(self._tables[name])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tables)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __contains__(self, name) -> bool:
+        return name in self._tables
+
+
+class _SimplifiedView(Mapping):
+    """Read-only {'tables': ..., 'version': ...} prompt view of a CompactSchema"""
+
+    __slots__ = ("_items",)
+
+    def __init__(self, tables: _TableView, version: Optional[str]):
+        self._items = {"tables": tables, "version": version}
+
+    def __getitem__(self, key: str):
+        return self._items[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class CompactSchema:
+    """
+    A tenant's schema held once; `full` and `simplified` are projections of it,
+    built per table on access. Immutable after construction.
+    """
+
+    __slots__ = ("tables", "version", "full", "simplified")
+
+    def __init__(self, tables: Dict[str, CompactTable], version: Optional[str] = None):
+        self.tables = tables
+        self.version = version
+        # name -> {'columns': [...], 'relations': [...], 'indexes': [...], 'row_count'}
+        self.full = _TableView(tables, CompactTable.to_dict)
+        # {'tables': {name: {'columns': {...}, 'relationships': [...]}}, 'version'}
+        self.simplified = _SimplifiedView(_TableView(tables, CompactTable.simplified), version)
+
+    @classmethod
+    def from_dict(cls, schema: dict, version: Optional[str] = None) -> "CompactSchema":
+        return cls(compact_tables(schema), version)
+
+    def to_dict(self) -> dict:
+        return {name: table.to_dict() for name, table in self.tables.items()}
+
+
+def compact_tables(schema: dict) -> Dict[str, CompactTable]:
+    """Convert a full extractor schema {table: {...}} into compact tables"""
+    return {_interned(name): CompactTable.from_dict(table) for name, table in schema.items()}
@@ -0,0 +1,56 @@
+from typing import NamedTuple, Optional
+import logging
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionInfo(NamedTuple):
+    """Read-only snapshot of a TenantConnection row (password stays encrypted)"""
+    tenant_id: str
+    user_id: int
+    db_type: str
+    host: str
+    port: str
+    database_name: str
+    username: str
+    password: str
+    query_timeout_ms: Optional[int]
+
+    @classmethod
+    def from_record(cls, record) -> "ConnectionInfo":
+        return cls(
+            tenant_id=record.tenant_id,
+            user_id=record.user_id,
+            db_type=record.db_type,
+            host=record.host,
+            port=record.port,
+            database_name=record.database_name,
+            username=record.username,
+            password=record.password,
+            query_timeout_ms=record.query_timeout_ms
+        )
+
+
+class ConnectionMetadataCache(TTLCache):
+    """
+    In-process TTL cache of (tenant_id, user_id) -> ConnectionInfo.
+    Lets the ownership check and db-type lookup skip the system DB on repeat requests.
+    Entries written by other workers become visible after at most ttl_seconds.
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+
+    def get(self, tenant_id: str, user_id: int) -> Optional[ConnectionInfo]:
+        return super().get((tenant_id, user_id))
+
+    def put(self, info: ConnectionInfo):
+        super().put((info.tenant_id, info.user_id), info)
+
+    def invalidate(self, tenant_id: str, user_id: Optional[int] = None):
+        """Drop one owner's entry, or every entry for the tenant when user_id is None"""
+        if user_id is not None:
+            self.pop((tenant_id, user_id))
+            return
+        self.pop_where(lambda key: key[0] == tenant_id)
@@ -1,18 +1,75 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
+from config import settings
 
-# Using SQLite for local persistent storage of system data (users/connections)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./system_data.db"
+# System data (users, connections, history). SQLite by default; any SQLAlchemy URL
+# (e.g. postgresql+psycopg2://...) works with the same models.
+SQLALCHEMY_DATABASE_URL = settings.SYSTEM_DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def create_system_engine(url: str = SQLALCHEMY_DATABASE_URL) -> Engine:
+    """
+    SQLite gets WAL with synchronous=NORMAL, a busy timeout and mmap reads so
+    several workers can read while one writes; server databases get a bounded,
+    pre-pinged connection pool.
+    """
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        if ":memory:" not in url and url not in ("sqlite://", "sqlite:///"):
+            event.listen(engine, "connect", _tune_sqlite)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=settings.SYSTEM_DB_POOL_SIZE,
+        max_overflow=settings.SYSTEM_DB_MAX_OVERFLOW,
+        pool_timeout=settings.SYSTEM_DB_POOL_TIMEOUT,
+        pool_recycle=settings.SYSTEM_DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+def _tune_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+engine = create_system_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def init_db(bind: Engine = None):
+    """Create missing system tables, columns and indexes (run once per worker at startup)"""
+    from app import models  # noqa: F401 - registers the tables on Base
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    # create_all skips tables that already exist, so add columns and indexes introduced since
+    _add_missing_columns(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def _add_missing_columns(bind: Engine):
+    """ALTER TABLE ... ADD COLUMN for model columns an older database lacks (nullable ones only)"""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.primary_key:
+                raise RuntimeError(f"Cannot add required column {table.name}.{column.name} to an existing table")
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
 def get_db():
     db = SessionLocal()
     try:
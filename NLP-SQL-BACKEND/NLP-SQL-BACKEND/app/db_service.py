@@ -3,18 +3,41 @@ from sqlalchemy.orm import Session
 import pymongo
 from typing import Dict, Optional, List, Any
 import logging
+import threading
 from .models import TenantConnection
+from .engine_registry import TenantEngineRegistry
+from .connection_cache import ConnectionMetadataCache, ConnectionInfo
 from core.encryption import encrypt_data, decrypt_data
+from config import settings
+from app.tracing import traced, annotate
 
 logger = logging.getLogger(__name__)
 
 class DatabaseConnectionManager:
     """
     Manages database connections for multiple tenants with persistence.
+    Engines live in a bounded LRU registry; evicted tenants are restored on demand.
     """
     
-    def __init__(self):
-        self.connections: Dict[str, any] = {}
+    def __init__(
+        self,
+        registry: Optional[TenantEngineRegistry] = None,
+        metadata_cache: Optional[ConnectionMetadataCache] = None
+    ):
+        self.registry = registry or TenantEngineRegistry(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            max_tenants=settings.DB_MAX_TENANT_ENGINES,
+            idle_ttl_seconds=settings.DB_ENGINE_IDLE_TTL_SECONDS,
+            max_total_connections=settings.DB_GLOBAL_MAX_CONNECTIONS
+        )
+        self.metadata_cache = metadata_cache or ConnectionMetadataCache(
+            ttl_seconds=settings.CONNECTION_CACHE_TTL_SECONDS
+        )
+        # One restore per tenant at a time, so concurrent misses share an engine instead of replacing it
+        self._restore_locks: Dict[str, threading.Lock] = {}
+        self._restore_locks_guard = threading.Lock()
         logger.info("DatabaseConnectionManager initialized")
     
     def connect(self, tenant_id: str, credentials: dict, db: Session, user_id: int) -> bool:
@@ -28,40 +51,11 @@ class DatabaseConnectionManager:
             username = credentials['username']
             password = credentials['password']
             database = credentials.get('database', '')
+            query_timeout_ms = credentials.get('query_timeout_ms')
             
             # 1. Try to establish connection first
-            if db_type == 'mysql':
-                conn_str = f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
-                engine = create_engine(
-                    conn_str,
-                    pool_size=5,
-                    max_overflow=10,
-                    pool_pre_ping=True
-                )
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-            elif db_type == 'postgresql':
-                conn_str = f"postgresql://{username}:{password}@{host}:{port}/{database}"
-                engine = create_engine(
-                    conn_str,
-                    pool_size=5,
-                    max_overflow=10,
-                    pool_pre_ping=True
-                )
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-            elif db_type == 'mongodb':
-                # MongoDB connection string
-                if username and password:
-                    conn_str = f"mongodb://{username}:{password}@{host}:{port}/{database}"
-                else:
-                    conn_str = f"mongodb://{host}:{port}/{database}"
-                
-                engine = pymongo.MongoClient(conn_str, serverSelectionTimeoutMS=5000)
-                # Verify connection
-                engine.admin.command('ping')
-            else:
-                logger.error(f"Unsupported database type: {db_type}")
+            engine = self._open_engine(credentials)
+            if engine is None:
                 return False
             
             # 2. Persist to System DB (Upsert logic)
@@ -80,8 +74,10 @@ class DatabaseConnectionManager:
                 existing_conn.database_name = database
                 existing_conn.username = username
                 existing_conn.password = encrypted_password
+                existing_conn.query_timeout_ms = query_timeout_ms
+                conn_record = existing_conn
             else:
-                new_conn = TenantConnection(
+                conn_record = TenantConnection(
                     tenant_id=tenant_id,
                     user_id=user_id,
                     db_type=db_type,
@@ -89,14 +85,17 @@ class DatabaseConnectionManager:
                     port=port,
                     database_name=database,
                     username=username,
-                    password=encrypted_password
+                    password=encrypted_password,
+                    query_timeout_ms=query_timeout_ms
                 )
-                db.add(new_conn)
+                db.add(conn_record)
             
             db.commit()
             
-            # 3. Store in Memory
-            self.connections[tenant_id] = engine
+            # 3. Store in Memory (engine + ownership metadata)
+            self.metadata_cache.invalidate(tenant_id)
+            self.metadata_cache.put(ConnectionInfo.from_record(conn_record))
+            self.registry.put(tenant_id, engine, db_type)
             logger.info(f"✅ Tenant {tenant_id} connected and persisted for user {user_id}")
             return True
             
@@ -104,50 +103,140 @@ class DatabaseConnectionManager:
             logger.error(f"❌ Connection failed for tenant {tenant_id}: {e}")
             return False
     
+    def _open_engine(self, credentials: dict):
+        """Create and verify an engine/client from plain-text credentials"""
+        db_type = credentials['db_type']
+        host = credentials['host']
+        port = credentials['port']
+        username = credentials['username']
+        password = credentials['password']
+        database = credentials.get('database', '')
+        
+        if db_type == 'mysql':
+            conn_str = f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
+            engine = create_engine(conn_str, **self.registry.sql_engine_options())
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        elif db_type == 'postgresql':
+            conn_str = f"postgresql://{username}:{password}@{host}:{port}/{database}"
+            engine = create_engine(conn_str, **self.registry.sql_engine_options())
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        elif db_type == 'sqlite' and settings.ALLOW_SQLITE_TENANTS:
+            engine = create_engine(f"sqlite:///{database}", **self.registry.sql_engine_options())
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        elif db_type == 'mongodb':
+            # MongoDB connection string
+            if username and password:
+                conn_str = f"mongodb://{username}:{password}@{host}:{port}/{database}"
+            else:
+                conn_str = f"mongodb://{host}:{port}/{database}"
+            
+            engine = pymongo.MongoClient(
+                conn_str,
+                serverSelectionTimeoutMS=5000,
+                **self.registry.mongo_client_options()
+            )
+            # Verify connection
+            engine.admin.command('ping')
+        else:
+            logger.error(f"Unsupported database type: {db_type}")
+            return None
+        return engine
+    
+    @traced("DatabaseConnectionManager.get_connection_info")
+    def get_connection_info(self, tenant_id: str, user_id: int, db: Optional[Session]) -> Optional[ConnectionInfo]:
+        """
+        Connection metadata for a tenant owned by user_id (None if not owned).
+        Served from the metadata cache; the system DB is only read on a miss.
+        """
+        info = self.metadata_cache.get(tenant_id, user_id)
+        annotate({"tenant.id": tenant_id, "metadata.cached": info is not None})
+        if info is not None or db is None:
+            return info
+        
+        conn_record = db.query(TenantConnection).filter(
+            TenantConnection.tenant_id == tenant_id,
+            TenantConnection.user_id == user_id
+        ).first()
+        if not conn_record:
+            return None
+        
+        info = ConnectionInfo.from_record(conn_record)
+        self.metadata_cache.put(info)
+        return info
+    
+    @traced("DatabaseConnectionManager.get_engine")
     def get_engine(self, tenant_id: str, user_id: int, db: Session):
         """
         Get the database engine for a tenant. 
         REQUIRES user_id to verify ownership in system DB.
         """
         # 1. Check Memory Cache
-        # Note: We still check existence in DB to verify ownership even if in memory
+        # Note: We still verify ownership even if the engine is in memory
         # to prevent unauthorized access via UUID poaching.
         
-        conn_record = db.query(TenantConnection).filter(
-            TenantConnection.tenant_id == tenant_id,
-            TenantConnection.user_id == user_id
-        ).first()
+        conn_info = self.get_connection_info(tenant_id, user_id, db)
 
-        if not conn_record:
+        if not conn_info:
             logger.warning(f"🚫 Access denied for user {user_id} to tenant {tenant_id}")
             return None
 
         # 2. If in memory, return it
-        if tenant_id in self.connections:
-            return self.connections[tenant_id]
+        engine = self.registry.get(tenant_id)
+        annotate({"engine.pooled": engine is not None})
+        if engine is not None:
+            return engine
         
-        # 3. Restore connection if not in memory
-        logger.info(f"Restoring connection for tenant {tenant_id} (owner: {user_id})")
-        credentials = {
-            'db_type': conn_record.db_type,
-            'host': conn_record.host,
-            'port': conn_record.port,
-            'username': conn_record.username,
-            'password': decrypt_data(conn_record.password),
-            'database': conn_record.database_name
-        }
-        self.connect(tenant_id, credentials, db, user_id)
-        return self.connections.get(tenant_id)
+        # 3. Restore connection if not in memory (credentials are already persisted)
+        with self._restore_lock(tenant_id):
+            engine = self.registry.get(tenant_id)
+            if engine is not None:
+                # Restored by a concurrent request while this one waited
+                return engine
+            logger.info(f"Restoring connection for tenant {tenant_id} (owner: {user_id})")
+            credentials = {
+                'db_type': conn_info.db_type,
+                'host': conn_info.host,
+                'port': conn_info.port,
+                'username': conn_info.username,
+                'password': decrypt_data(conn_info.password),
+                'database': conn_info.database_name
+            }
+            try:
+                engine = self._open_engine(credentials)
+            except Exception as e:
+                logger.error(f"❌ Connection restore failed for tenant {tenant_id}: {e}")
+                return None
+            if engine is None:
+                return None
+            return self.registry.put(tenant_id, engine, conn_info.db_type)
+    
+    def _restore_lock(self, tenant_id: str) -> threading.Lock:
+        with self._restore_locks_guard:
+            return self._restore_locks.setdefault(tenant_id, threading.Lock())
+    
+    def set_query_timeout(self, tenant_id: str, user_id: int, timeout_ms: Optional[int], db: Session) -> bool:
+        """Update the per-tenant execution budget (None resets to the global default)"""
+        conn_record = db.query(TenantConnection).filter(
+            TenantConnection.tenant_id == tenant_id,
+            TenantConnection.user_id == user_id
+        ).first()
+        if not conn_record:
+            return False
+        conn_record.query_timeout_ms = timeout_ms
+        db.commit()
+        self.metadata_cache.invalidate(tenant_id)
+        logger.info(f"⏱️ Query budget for tenant {tenant_id} set to {timeout_ms or 'default'}ms")
+        return True
     
     def close_connection(self, tenant_id: str, user_id: Optional[int] = None, db: Optional[Session] = None):
         """Close database connection and optionally remove from persistence"""
-        if tenant_id in self.connections:
-            conn = self.connections[tenant_id]
-            if isinstance(conn, pymongo.MongoClient):
-                conn.close()
-            else:
-                conn.dispose()
-            del self.connections[tenant_id]
+        self.registry.remove(tenant_id)
+        self.metadata_cache.invalidate(tenant_id)
+        with self._restore_locks_guard:
+            self._restore_locks.pop(tenant_id, None)
             
         if db and user_id:
             db.query(TenantConnection).filter(
@@ -161,4 +250,8 @@ class DatabaseConnectionManager:
     
     def get_active_connections(self):
         """Return list of active tenant IDs in memory"""
-        return list(self.connections.keys())
+        return self.registry.tenant_ids()
+    
+    def get_pool_stats(self, tenant_id: str) -> Optional[dict]:
+        """Pool utilization and checkout wait metrics for a tenant (None if not pooled)"""
+        return self.registry.get_pool_stats(tenant_id)
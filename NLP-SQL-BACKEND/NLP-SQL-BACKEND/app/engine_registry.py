@@ -0,0 +1,288 @@
+from sqlalchemy.pool import QueuePool
+import pymongo
+from collections import OrderedDict
+from typing import Optional, List
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutStats:
+    """Checkout counters for one tenant pool"""
+
+    __slots__ = ("checkouts", "total_wait", "max_wait", "_lock")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait_seconds
+            if wait_seconds > self.max_wait:
+                self.max_wait = wait_seconds
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection"""
+
+    checkout_stats: Optional[CheckoutStats] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.checkout_stats is not None:
+                self.checkout_stats.record(time.perf_counter() - start)
+
+
+class _EngineEntry:
+    __slots__ = ("engine", "db_type", "capacity", "last_used", "stats")
+
+    def __init__(self, engine, db_type: str, capacity: int, stats: CheckoutStats):
+        self.engine = engine
+        self.db_type = db_type
+        self.capacity = capacity
+        self.last_used = time.monotonic()
+        self.stats = stats
+
+
+class TenantEngineRegistry:
+    """
+    LRU registry of tenant engines/clients.
+    Evicts idle tenants, caps the number of registered tenants and keeps the sum of
+    per-tenant pool capacities under a global connection budget.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: int = 30,
+        max_tenants: int = 200,
+        idle_ttl_seconds: int = 900,
+        max_total_connections: int = 500
+    ):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.max_tenants = max_tenants
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_total_connections = max_total_connections
+        self._entries: "OrderedDict[str, _EngineEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.evictions = 0
+
+    @property
+    def tenant_capacity(self) -> int:
+        """Maximum connections one tenant pool may open"""
+        return self.pool_size + self.max_overflow
+
+    def sql_engine_options(self) -> dict:
+        """Keyword arguments for create_engine so every tenant pool is sized from settings"""
+        return {
+            "poolclass": TimedQueuePool,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_pre_ping": True
+        }
+
+    def mongo_client_options(self) -> dict:
+        """Keyword arguments for MongoClient so its pool is bounded like the SQL pools"""
+        return {
+            "maxPoolSize": self.tenant_capacity,
+            "maxIdleTimeMS": self.idle_ttl_seconds * 1000,
+            "waitQueueTimeoutMS": self.pool_timeout * 1000
+        }
+
+    def get(self, tenant_id: str):
+        """Return the tenant engine and mark it most recently used"""
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is None:
+                return None
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(tenant_id)
+            return entry.engine
+
+    def peek(self, tenant_id: str):
+        """Return the tenant engine without touching its LRU position"""
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            return entry.engine if entry else None
+
+    def put(self, tenant_id: str, engine, db_type: str):
+        """Register an engine, evicting least recently used tenants to stay within budget"""
+        stats = CheckoutStats()
+        pool = getattr(engine, "pool", None)
+        if isinstance(pool, TimedQueuePool):
+            pool.checkout_stats = stats
+        entry = _EngineEntry(engine, db_type, self.tenant_capacity, stats)
+
+        evicted = []
+        with self._lock:
+            replaced = self._entries.pop(tenant_id, None)
+            if replaced is not None and replaced.engine is not engine:
+                evicted.append((tenant_id, replaced))
+            made_room = self._make_room(entry.capacity)
+            self.evictions += len(made_room)
+            evicted.extend(made_room)
+            self._entries[tenant_id] = entry
+
+        for evicted_id, evicted_entry in evicted:
+            self._dispose(evicted_id, evicted_entry)
+        return engine
+
+    def remove(self, tenant_id: str) -> bool:
+        """Drop a tenant and release its pool"""
+        with self._lock:
+            entry = self._entries.pop(tenant_id, None)
+        if entry is None:
+            return False
+        self._dispose(tenant_id, entry)
+        return True
+
+    def evict_idle(self) -> List[str]:
+        """Dispose pools that have not been used within idle_ttl_seconds"""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        evicted = []
+        with self._lock:
+            for tenant_id in list(self._entries.keys()):
+                entry = self._entries[tenant_id]
+                if entry.last_used < cutoff and not self._checked_out(entry):
+                    evicted.append((tenant_id, self._entries.pop(tenant_id)))
+            self.evictions += len(evicted)
+
+        for tenant_id, entry in evicted:
+            self._dispose(tenant_id, entry)
+        if evicted:
+            logger.info(f"🧹 Evicted {len(evicted)} idle tenant pools")
+        return [tenant_id for tenant_id, _ in evicted]
+
+    def tenant_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, tenant_id: str) -> bool:
+        with self._lock:
+            return tenant_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_pool_stats(self, tenant_id: str) -> Optional[dict]:
+        """Pool utilization and checkout wait times for one tenant"""
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+        if entry is None:
+            return None
+        return self._entry_stats(entry)
+
+    def get_stats(self) -> dict:
+        """Registry-wide totals (no tenant identifiers)"""
+        with self._lock:
+            entries = list(self._entries.values())
+        checked_out = sum(self._checked_out(entry) or 0 for entry in entries)
+        return {
+            "engines": len(entries),
+            "max_engines": self.max_tenants,
+            "reserved_connections": sum(entry.capacity for entry in entries),
+            "max_total_connections": self.max_total_connections,
+            "checked_out_connections": checked_out,
+            "evictions": self.evictions
+        }
+
+    def start_sweeper(self, interval_seconds: int = 60):
+        """Start a daemon thread that evicts idle tenant pools"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+
+        def sweep():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    logger.error(f"Idle pool sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=sweep, name="engine-idle-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def close_all(self):
+        """Dispose every pool (used on shutdown)"""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for tenant_id, entry in entries:
+            self._dispose(tenant_id, entry)
+
+    def _make_room(self, needed: int) -> list:
+        """Pop LRU entries until the new tenant fits (caller holds the lock)"""
+        evicted = []
+        reserved = sum(entry.capacity for entry in self._entries.values())
+
+        def over_budget():
+            return (len(self._entries) >= self.max_tenants or
+                    reserved + needed > self.max_total_connections)
+
+        # Prefer tenants with nothing checked out, then fall back to strict LRU.
+        # Disposing a busy engine is safe: checked-out connections close when returned.
+        for only_idle in (True, False):
+            for tenant_id in list(self._entries.keys()):
+                if not over_budget():
+                    return evicted
+                entry = self._entries[tenant_id]
+                if only_idle and self._checked_out(entry):
+                    continue
+                del self._entries[tenant_id]
+                reserved -= entry.capacity
+                evicted.append((tenant_id, entry))
+
+        if over_budget():
+            logger.warning("Tenant pool budget exceeded with no evictable engines left")
+        return evicted
+
+    def _checked_out(self, entry: _EngineEntry) -> Optional[int]:
+        pool = getattr(entry.engine, "pool", None)
+        if isinstance(pool, QueuePool):
+            return pool.checkedout()
+        return None
+
+    def _entry_stats(self, entry: _EngineEntry) -> dict:
+        checked_out = self._checked_out(entry)
+        stats = entry.stats
+        return {
+            "db_type": entry.db_type,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "capacity": entry.capacity,
+            "checked_out": checked_out,
+            "utilization_percentage": round(checked_out / entry.capacity * 100, 2) if checked_out is not None else None,
+            "checkouts": stats.checkouts,
+            "avg_checkout_wait_ms": round(stats.total_wait / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+            "max_checkout_wait_ms": round(stats.max_wait * 1000, 3),
+            "idle_seconds": round(time.monotonic() - entry.last_used, 1)
+        }
+
+    def _dispose(self, tenant_id: str, entry: _EngineEntry):
+        try:
+            if isinstance(entry.engine, pymongo.MongoClient):
+                entry.engine.close()
+            else:
+                entry.engine.dispose()
+        except Exception as e:
+            logger.warning(f"Failed to dispose pool for tenant {tenant_id}: {e}")
+        logger.info(f"🔌 Released pool for tenant {tenant_id}")
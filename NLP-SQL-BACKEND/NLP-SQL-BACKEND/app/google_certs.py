@@ -0,0 +1,150 @@
+from typing import Any, Callable, Mapping, Optional
+from google.oauth2 import id_token
+from google.auth.transport import requests as google_requests
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+MAX_AGE = re.compile(r"max-age=(\d+)", re.IGNORECASE)
+
+
+class _CertsResponse:
+    """google.auth transport Response carrying the cached certificate body"""
+
+    def __init__(self, data: bytes):
+        self.status = 200
+        self.headers = {}
+        self.data = data
+
+
+class GoogleCertCache:
+    """
+    Google's ID-token signing certificates, fetched once per Cache-Control max-age.
+    Near the end of that lifetime a background thread refreshes them while the
+    current set keeps serving; if a refresh fails the stale set is served (up to
+    max_stale_seconds) instead of failing logins. The instance is itself a
+    google.auth transport: it answers the certs URL from the cache and forwards
+    anything else, so id_token.verify_token runs unchanged.
+    """
+
+    def __init__(
+        self,
+        certs_url: str = GOOGLE_CERTS_URL,
+        transport: Optional[Callable] = None,
+        default_max_age: int = 3600,
+        refresh_ahead: float = 0.1,
+        max_stale_seconds: int = 86400,
+        retry_seconds: int = 60,
+        fetch_timeout: float = 5.0
+    ):
+        self.certs_url = certs_url
+        self._transport = transport
+        self.default_max_age = default_max_age
+        self.refresh_ahead = refresh_ahead
+        self.max_stale_seconds = max_stale_seconds
+        self.retry_seconds = retry_seconds
+        self.fetch_timeout = fetch_timeout
+        self._body: Optional[bytes] = None
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._stale_since: Optional[float] = None
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+        self.fetches = 0
+        self.failures = 0
+        self.stale_served = 0
+
+    @property
+    def transport(self) -> Callable:
+        if self._transport is None:
+            # One pooled HTTP session for every fetch
+            self._transport = google_requests.Request()
+        return self._transport
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if url == self.certs_url and method == "GET":
+            return _CertsResponse(self.get())
+        return self.transport(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+    def get(self) -> bytes:
+        """The certificate JSON body, refreshed according to its max-age"""
+        now = time.monotonic()
+        body, expires_at = self._body, self._expires_at
+        if body is not None and now < expires_at:
+            lifetime = expires_at - self._fetched_at
+            if now > expires_at - lifetime * self.refresh_ahead:
+                self.refresh_async()
+            return body
+
+        with self._fetch_lock:
+            # Another request may have refreshed while this one waited
+            if self._body is not None and time.monotonic() < self._expires_at:
+                return self._body
+            try:
+                return self._fetch()
+            except Exception as e:
+                self.failures += 1
+                now = time.monotonic()
+                stale_since = self._stale_since or self._expires_at
+                if self._body is not None and now - stale_since < self.max_stale_seconds:
+                    # Keep serving the old set and only retry the endpoint every retry_seconds
+                    self._stale_since = stale_since
+                    self._fetched_at, self._expires_at = now, now + self.retry_seconds
+                    self.stale_served += 1
+                    logger.warning(f"⚠️ Google certificate refresh failed, serving cached set: {e}")
+                    return self._body
+                raise
+
+    def refresh_async(self):
+        """Refresh in a background thread unless one is already running"""
+        with self._fetch_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True, name="google-certs-refresh").start()
+
+    def _refresh(self):
+        try:
+            with self._fetch_lock:
+                self._fetch()
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"⚠️ Background Google certificate refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _fetch(self) -> bytes:
+        """Fetch under _fetch_lock and store the body with its max-age"""
+        response = self.transport(self.certs_url, method="GET", timeout=self.fetch_timeout)
+        if response.status != 200:
+            raise RuntimeError(f"Certificate fetch returned HTTP {response.status}")
+        headers = {k.lower(): v for k, v in (response.headers or {}).items()}
+        match = MAX_AGE.search(headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        now = time.monotonic()
+        self._body, self._fetched_at, self._expires_at = response.data, now, now + max_age
+        self._stale_since = None
+        self.fetches += 1
+        logger.info(f"🔑 Google certificates refreshed (max-age {max_age}s)")
+        return self._body
+
+    def verify(self, token: str, audience: Optional[str] = None, clock_skew_in_seconds: int = 30) -> Mapping[str, Any]:
+        """Verify a Google ID token against the cached certificates"""
+        return id_token.verify_token(
+            token, self, audience=audience, certs_url=self.certs_url,
+            clock_skew_in_seconds=clock_skew_in_seconds
+        )
+
+    def get_stats(self) -> dict:
+        remaining = self._expires_at - time.monotonic() if self._body is not None else None
+        return {
+            "cached": self._body is not None,
+            "expires_in_seconds": round(remaining, 1) if remaining is not None else None,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "stale_served": self.stale_served
+        }
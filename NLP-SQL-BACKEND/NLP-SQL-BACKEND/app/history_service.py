@@ -0,0 +1,234 @@
+from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from hashlib import sha256
+from typing import Callable, Dict, List, Optional, Tuple
+import base64
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def question_key(question: str) -> str:
+    """Questions that differ only in case and spacing share a key"""
+    normalized = " ".join((question or "").lower().split())
+    return sha256(normalized.encode()).hexdigest()[:32]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for anything encode_cursor didn't produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+class HistoryService:
+    """
+    Query history reads and retention. Pages walk the (tenant_id, user_id,
+    created_at, id) index with a keyset cursor. A background job folds rows
+    older than retention_days into per-question counts (QuestionFrequency)
+    and deletes them, so the table stops growing and frequent questions stay
+    cheap to look up.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        retention_days: int = 90,
+        batch_size: int = 5000,
+        recent_window: int = 5000
+    ):
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.recent_window = recent_window
+        self._session_factory = session_factory
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.compacted = 0
+        self.last_compaction: Optional[str] = None
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def page(self, db: Session, tenant_id: str, user_id: int, limit: int = 20, cursor: Optional[str] = None):
+        """Newest-first history rows after cursor, and the cursor of the next page (None at the end)"""
+        from app.models import QueryHistory
+        query = db.query(QueryHistory).filter(
+            QueryHistory.tenant_id == tenant_id,
+            QueryHistory.user_id == user_id
+        )
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                QueryHistory.created_at < created_at,
+                and_(QueryHistory.created_at == created_at, QueryHistory.id < row_id)
+            ))
+        rows = query.order_by(QueryHistory.created_at.desc(), QueryHistory.id.desc()).limit(limit + 1).all()
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def frequent_questions(self, db: Session, tenant_id: str, limit: int = 10) -> List[dict]:
+        """
+        A tenant's most asked questions: compacted counts plus a GROUP BY over its
+        latest recent_window unexpired rows, so the cost does not grow with history
+        """
+        from app.models import QueryHistory, QuestionFrequency
+        counts: Dict[str, dict] = {}
+        for row in db.query(QuestionFrequency).filter(QuestionFrequency.tenant_id == tenant_id):
+            counts[row.question_key] = {"question": row.question, "sql": row.query_text,
+                                        "count": row.count, "last_asked_at": row.last_asked_at}
+        window = (
+            db.query(QueryHistory.question.label("question"), QueryHistory.created_at.label("created_at"))
+            .filter(QueryHistory.tenant_id == tenant_id)
+            .order_by(QueryHistory.created_at.desc())
+            .limit(self.recent_window)
+            .subquery()
+        )
+        recent = (
+            db.query(window.c.question, func.count(), func.max(window.c.created_at))
+            .group_by(window.c.question)
+        )
+        for question, count, last_asked_at in recent:
+            entry = counts.setdefault(question_key(question), {"question": question, "sql": None,
+                                                               "count": 0, "last_asked_at": None})
+            entry["count"] += count
+            if entry["last_asked_at"] is None or (last_asked_at and last_asked_at >= entry["last_asked_at"]):
+                entry.update(question=question, sql=None, last_asked_at=last_asked_at)
+
+        ranked = sorted(counts.values(), key=lambda e: (e["count"], e["last_asked_at"] or datetime.min), reverse=True)
+        top = ranked[:limit]
+        for entry in top:
+            if entry["sql"] is None:
+                # Latest SQL for the few questions returned, straight off the history index
+                entry["sql"] = (
+                    db.query(QueryHistory.query_text)
+                    .filter(QueryHistory.tenant_id == tenant_id, QueryHistory.question == entry["question"])
+                    .order_by(QueryHistory.created_at.desc(), QueryHistory.id.desc())
+                    .limit(1).scalar()
+                )
+        return [
+            {**entry, "last_asked_at": entry["last_asked_at"].isoformat() if entry["last_asked_at"] else None}
+            for entry in top
+        ]
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """Fold expired rows into QuestionFrequency, one batch per transaction; returns rows compacted"""
+        from app.models import QueryHistory, QuestionFrequency
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        total = 0
+        conflicts = 0
+        while not self._stop.is_set():
+            db = self._new_session()
+            try:
+                rows = (
+                    db.query(QueryHistory)
+                    .filter(QueryHistory.created_at < cutoff)
+                    .order_by(QueryHistory.created_at, QueryHistory.id)
+                    .limit(self.batch_size)
+                    # Another worker's compaction skips the rows this one holds (PostgreSQL)
+                    .with_for_update(skip_locked=True)
+                    .all()
+                )
+                if not rows:
+                    break
+
+                # Delete first: a batch only counts if this worker removed every row of it. FOR UPDATE
+                # does nothing on SQLite, where another worker may have compacted the same rows.
+                deleted = (
+                    db.query(QueryHistory)
+                    .filter(QueryHistory.id.in_([r.id for r in rows]))
+                    .delete(synchronize_session=False)
+                )
+                if deleted != len(rows):
+                    db.rollback()
+                    continue
+
+                groups: Dict[Tuple[str, str], List] = {}
+                for row in rows:
+                    groups.setdefault((row.tenant_id, question_key(row.question)), []).append(row)
+                existing = {
+                    (f.tenant_id, f.question_key): f
+                    for f in db.query(QuestionFrequency).filter(
+                        QuestionFrequency.tenant_id.in_({tenant for tenant, _ in groups}),
+                        QuestionFrequency.question_key.in_({key for _, key in groups})
+                    )
+                }
+                for (tenant_id, key), group in groups.items():
+                    latest = max(group, key=lambda r: (r.created_at, r.id))
+                    earliest = min(r.created_at for r in group)
+                    frequency = existing.get((tenant_id, key))
+                    if frequency is None:
+                        frequency = QuestionFrequency(tenant_id=tenant_id, question_key=key, count=0,
+                                                      first_asked_at=earliest, last_asked_at=latest.created_at)
+                        db.add(frequency)
+                    frequency.count += len(group)
+                    frequency.first_asked_at = min(frequency.first_asked_at or earliest, earliest)
+                    if frequency.last_asked_at is None or latest.created_at >= frequency.last_asked_at:
+                        frequency.last_asked_at = latest.created_at
+                        frequency.question = latest.question
+                        frequency.query_text = latest.query_text
+                        frequency.db_type = latest.db_type
+
+                db.commit()
+                total += len(rows)
+                conflicts = 0
+            except (OperationalError, IntegrityError):
+                # Another worker holds the write lock or inserted the same frequency row; retry the batch
+                db.rollback()
+                conflicts += 1
+                if conflicts > 5:
+                    raise
+                self._stop.wait(0.05 * conflicts)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+        if total:
+            logger.info(f"🗜️ Compacted {total} history rows older than {self.retention_days} days")
+        self.compacted += total
+        self.last_compaction = datetime.utcnow().isoformat()
+        return total
+
+    def remove_tenant(self, db: Session, tenant_id: str):
+        from app.models import QuestionFrequency
+        db.query(QuestionFrequency).filter(QuestionFrequency.tenant_id == tenant_id).delete()
+
+    def start(self, interval_seconds: int = 3600):
+        """Start a daemon thread that compacts expired history every interval_seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"History compaction failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="history-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "retention_days": self.retention_days,
+            "compacted": self.compacted,
+            "last_compaction": self.last_compaction
+        }
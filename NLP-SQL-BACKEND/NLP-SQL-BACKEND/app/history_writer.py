@@ -0,0 +1,147 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Callable, Optional
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """
+    Write-behind QueryHistory persistence. Requests enqueue rows; one background
+    thread inserts them in multi-row transactions of up to batch_size rows, at
+    least every flush_interval seconds. A full queue makes submit wait up to
+    enqueue_timeout_ms, then drops the row, so history never stalls a request
+    for long. stop() flushes whatever is still queued.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        enqueue_timeout_ms: int = 50
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout_ms = enqueue_timeout_ms
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._session_factory = session_factory
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, tenant_id: str, user_id: int, question: str, query_text: str, db_type: str) -> bool:
+        """Queue one history row; False if it was dropped because the queue stayed full"""
+        row = {
+            "tenant_id": tenant_id,
+            "user_id": user_id,
+            "question": question,
+            "query_text": query_text,
+            "db_type": db_type,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout_ms / 1000)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"⚠️ History queue full, dropped entry for tenant {tenant_id}")
+            return False
+
+    def start(self):
+        """Start the background writer thread"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush queued rows and stop the writer"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Anything submitted after the thread exited
+        self.flush()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> list:
+        """Block for the first row, then gather more until the batch fills or the interval ends"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                # On shutdown take what is already queued without waiting
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything queued right now on the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch: list):
+        from app.models import QueryHistory
+        db = self._new_session()
+        try:
+            db.execute(insert(QueryHistory), batch)
+            db.commit()
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            logger.error(f"Failed to save {len(batch)} history entries: {e}")
+        finally:
+            db.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
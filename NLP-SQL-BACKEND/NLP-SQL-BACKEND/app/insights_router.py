@@ -1,109 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 from app.database import get_db
 from app.auth_service import get_current_user
-from dependencies import get_db_service
-from app.models import TenantConnection, User
+from dependencies import get_chart_service, get_db_service, get_profile_service, get_history_service
+from app.query_executor import run_with_disconnect_cancel, QueryTimeoutError
+from app.chart_service import ConnectionNotFoundError, TableNotFoundError, ColumnNotFoundError
+from app.models import User
+from config import settings
 import logging
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/api/insights", tags=["Insights"])
 logger = logging.getLogger(__name__)
 
-class ChartDataRequest(BaseModel):
-    tenant_id: str
+class ChartSpec(BaseModel):
     table_name: str
     x_column: str
     y_column: str
     chart_type: str = "bar"
-    filters: Optional[Dict[str, Any]] = None
+    filters: Optional[Dict[str, Any]] = None # Not supported yet; a non-empty value is rejected with 400
+    aggregation: str = "auto" # auto | sum | avg | min | max | count | none (raw line, downsampled)
+    bucket: Optional[str] = "auto" # Time bucket for date axes: auto | minute | hour | day | week | month | year
+    max_points: Optional[int] = Field(default=None, gt=2)
+
+class ChartDataRequest(ChartSpec):
+    tenant_id: str
+
+class ChartBatchRequest(BaseModel):
+    tenant_id: str
+    charts: List[ChartSpec] = Field(min_length=1, max_length=settings.CHART_BATCH_MAX)
 
 @router.post("/chart-data")
 async def get_chart_data(
     request: ChartDataRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    db_service = Depends(get_db_service)
+    chart_service = Depends(get_chart_service)
 ):
     try:
-        tenant_id = request.tenant_id
-        table_name = request.table_name
-        x_column = request.x_column
-        y_column = request.y_column
-        chart_type = request.chart_type
-
-        # 1. Get connection record to determine DB type
-        conn_record = db.query(TenantConnection).filter(
-            TenantConnection.tenant_id == tenant_id,
-            TenantConnection.user_id == current_user.id
-        ).first()
-
-        if not conn_record:
-            raise HTTPException(status_code=404, detail="Database connection not found.")
-
-        # 2. Get engine/client
-        engine = db_service.get_engine(tenant_id, current_user.id, db)
-        if not engine:
-            raise HTTPException(status_code=401, detail="Failed to retrieve database connection.")
-
-        db_type = conn_record.db_type
-
-        # 3. Data Retrieval Logic
-        data = {"x": [], "y": []}
-
-        def safe_float(val):
-            if val is None: return 0.0
-            try:
-                return float(val)
-            except (ValueError, TypeError):
-                # If it's a date or category string, we can't plot it as the Y value in Line/Bar
-                # unless we are counting, but here we just return 1.0 or 0.0
-                return 0.0
-
-        if db_type in ['mysql', 'postgresql']:
-            # SQL Logic
-            with engine.connect() as conn:
-                if chart_type.lower() == 'pie':
-                    # For Pie, we usually want count of occurrences of X
-                    query = text(f"SELECT {x_column}, COUNT(*) as count FROM {table_name} GROUP BY {x_column}")
-                else:
-                    # For Line/Bar, we want X and Y
-                    query = text(f"SELECT {x_column}, {y_column} FROM {table_name} ORDER BY {x_column} ASC")
-                
-                result_proxy = conn.execute(query)
-                for row in result_proxy:
-                    row_dict = row._mapping
-                    data["x"].append(str(row_dict[x_column]))
-                    
-                    if chart_type.lower() == 'pie':
-                        data["y"].append(safe_float(row_dict.get('count')))
-                    else:
-                        data["y"].append(safe_float(row_dict.get(y_column)))
-
-        elif db_type == 'mongodb':
-            # MongoDB Logic
-            mongo_db = engine[conn_record.database_name or "test"]
-            collection = mongo_db[table_name]
+        # Runs off the event loop; the tenant query is cancelled if the client disconnects
+        return await run_with_disconnect_cancel(
+            http_request,
+            chart_service.get_chart_data,
+            request,
+            user_id=current_user.id,
+            db=db
+        )
 
-            if chart_type.lower() == 'pie':
-                pipeline = [
-                    {"$group": {"_id": f"${x_column}", "count": {"$sum": 1}}},
-                    {"$sort": {"count": -1}}
-                ]
-                cursor = collection.aggregate(pipeline)
-                for doc in cursor:
-                    data["x"].append(str(doc["_id"]))
-                    data["y"].append(safe_float(doc.get("count")))
-            else:
-                cursor = collection.find({}, {x_column: 1, y_column: 1, "_id": 0}).sort(x_column, 1)
-                for doc in cursor:
-                    data["x"].append(str(doc.get(x_column)))
-                    data["y"].append(safe_float(doc.get(y_column)))
+    except (ConnectionNotFoundError, TableNotFoundError, ColumnNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueryTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to fetch chart data: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return data
+@router.post("/chart-data/batch")
+async def get_chart_data_batch(
+    request: ChartBatchRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    chart_service = Depends(get_chart_service)
+):
+    """All charts of a dashboard in one round trip; each entry holds `data` or `error`"""
+    try:
+        return await run_with_disconnect_cancel(
+            http_request,
+            chart_service.get_chart_batch,
+            request.tenant_id,
+            request.charts,
+            user_id=current_user.id,
+            db=db
+        )
 
+    except ConnectionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
     except Exception as e:
-        logger.error(f"Failed to fetch chart data: {e}")
+        logger.error(f"Failed to fetch chart batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/suggestions/{tenant_id}")
+async def get_chart_suggestions(
+    tenant_id: str,
+    limit: int = 8,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    db_service = Depends(get_db_service),
+    profile_service = Depends(get_profile_service),
+    history_service = Depends(get_history_service)
+):
+    """
+    Chart specs ranked from the stored column profile, plus the tenant's most
+    asked questions (never queries the tenant database)
+    """
+    if not db_service.get_connection_info(tenant_id, current_user.id, db):
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    return {
+        "tenant_id": tenant_id,
+        "profile_status": profile_service.get_status(tenant_id),
+        "suggestions": profile_service.suggest_charts(tenant_id, limit=limit),
+        "frequent_questions": history_service.frequent_questions(db, tenant_id, limit=limit)
+    }
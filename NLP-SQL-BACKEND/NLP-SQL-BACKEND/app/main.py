@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from datetime import datetime
@@ -7,11 +8,12 @@ from app.tenant_router import router as tenant_router
 from app.query_router import router as query_router
 from app.auth_router import router as auth_router
 from app.insights_router import router as insights_router
-from app.database import engine, Base
-from app import models
-
-# Create system database tables
-Base.metadata.create_all(bind=engine)
+from app.database import init_db
+from app.metrics import metrics
+from app.tracing import tracer
+from app import models, auth_service
+from dependencies import db_service, schema_drift_watcher, rollup_manager, history_writer, history_service, span_exporter
+from config import settings
 
 # Setup logging
 logging.basicConfig(
@@ -36,6 +38,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_background_jobs():
+    """Create missing system tables, then start worker-local maintenance threads"""
+    init_db()
+    if settings.TRACING_ENABLED:
+        span_exporter.start()
+        tracer.configure(settings.TRACE_SAMPLE_RATE, span_exporter)
+    db_service.registry.start_sweeper(settings.DB_IDLE_SWEEP_INTERVAL_SECONDS)
+    history_writer.start()
+    history_service.start(settings.HISTORY_COMPACTION_INTERVAL_SECONDS)
+    if settings.SCHEMA_DRIFT_ENABLED:
+        schema_drift_watcher.start(settings.SCHEMA_DRIFT_TICK_SECONDS)
+    if settings.ROLLUPS_ENABLED:
+        rollup_manager.start(settings.ROLLUP_TICK_SECONDS)
+    if settings.GOOGLE_CLIENT_ID:
+        # Warm the certificate cache so the first Google login doesn't wait on it
+        auth_service.google_certs.refresh_async()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    """Stop maintenance threads and release tenant pools"""
+    schema_drift_watcher.stop()
+    rollup_manager.stop()
+    history_writer.stop()
+    history_service.stop()
+    db_service.registry.stop_sweeper()
+    db_service.registry.close_all()
+    if tracer.enabled:
+        tracer.configure(0.0, None)
+        span_exporter.stop()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request; continues the caller's trace when a traceparent header is sent"""
+    if not tracer.enabled or request.url.path == "/metrics":
+        return await call_next(request)
+    with tracer.span(
+        f"{request.method} {request.url.path}",
+        kind="server",
+        traceparent=request.headers.get("traceparent"),
+        **{"http.method": request.method, "http.target": request.url.path}
+    ) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if span.recording and route is not None:
+            # Name by route template so /api/schema/{tenant_id} is one operation
+            span.name = f"{request.method} {route.path}"
+        span.set_attribute("http.status_code", response.status_code)
+        if span.recording:
+            response.headers["traceparent"] = span.traceparent()
+    return response
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(tenant_router)
@@ -56,6 +110,9 @@ async def root():
             "GET /api/health - Health check",
             "GET /api/schema/{tenant_id} - View schema",
             "GET /api/cache/stats - Cache statistics",
+            "GET /api/pools/stats - Tenant pool statistics",
+            "GET /api/slow-queries/{tenant_id} - Slowest tenant queries with plans",
+            "GET /metrics - Prometheus metrics",
             "POST /api/insights/chart-data - Get chart data"
         ]
     }
@@ -63,4 +120,11 @@ async def root():
 @app.get("/api/health")
 async def api_health():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
\ No newline at end of file
+    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latencies, outcomes, cache and pool gauges in the Prometheus text format"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,246 @@
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import bisect
+import threading
+import time
+import logging
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans an in-memory cache hit up to a slow tenant query
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+GaugeValue = Union[float, Iterable[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (not cumulative), sum, count]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = self.header()
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback returning a number or (labels, value) pairs"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], GaugeValue], kind: str = "gauge"):
+        super().__init__(name, help_text)
+        self.read = read
+        # "counter" for running totals another component already keeps
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} could not be read: {e}")
+            return []
+        if value is None:
+            return []
+        if isinstance(value, (int, float)):
+            return self.header() + [f"{self.name} {_format_value(value)}"]
+        lines = self.header()
+        for labels, sample in value:
+            lines.append(f"{self.name}{_format_labels(labels.keys(), labels.values())} {_format_value(sample)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format. Tenant labels
+    go through tenant_label: the first max_tenant_labels tenants seen keep
+    their id, later ones are reported as "other" so series stay bounded.
+    """
+
+    def __init__(self, max_tenant_labels: int = 50):
+        self.max_tenant_labels = max_tenant_labels
+        self._tenants: set = set()
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_tenant_labels: int):
+        self.max_tenant_labels = max_tenant_labels
+
+    def tenant_label(self, tenant_id: Optional[str]) -> str:
+        if not tenant_id:
+            return ""
+        if tenant_id in self._tenants:
+            return tenant_id
+        with self._lock:
+            if len(self._tenants) < self.max_tenant_labels:
+                self._tenants.add(tenant_id)
+                return tenant_id
+        return "other"
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Gauge):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], GaugeValue], kind: str = "gauge") -> Gauge:
+        """Register (or replace) a metric read from read() on every scrape"""
+        return self._register(Gauge(name, help_text, read, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "nlpsql_stage_duration_seconds", "Time spent in each stage of answering a question", ("stage", "tenant")
+)
+ASK_TOTAL = metrics.counter(
+    "nlpsql_ask_total", "Questions answered, by outcome", ("outcome", "tenant")
+)
+CACHE_SECONDS = metrics.histogram(
+    "nlpsql_cache_operation_duration_seconds", "Result cache operations", ("operation", "result")
+)
+SCHEMA_SECONDS = metrics.histogram(
+    "nlpsql_schema_operation_duration_seconds", "Schema extraction and lookup", ("operation", "tenant")
+)
+
+
+class StageTimer:
+    """Times the stages of one request into STAGE_SECONDS, the request's own breakdown and a span per stage"""
+
+    def __init__(self, tenant_id: Optional[str] = None):
+        self.tenant = metrics.tenant_label(tenant_id)
+        self.timings: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"ask.{name}"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, stage=name, tenant=self.tenant)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown_ms(self) -> Dict[str, float]:
+        breakdown = {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
+        breakdown["total"] = round(self.elapsed() * 1000, 2)
+        return breakdown
+
+
+def stage(timer: Optional[StageTimer], name: str):
+    """timer.stage(name), or a no-op when the caller isn't timing stages"""
+    return timer.stage(name) if timer is not None else nullcontext()
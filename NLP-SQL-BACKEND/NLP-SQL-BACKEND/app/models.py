@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -29,11 +29,20 @@ class TenantConnection(Base):
     database_name = Column(String)
     username = Column(String)
     password = Column(String) # This should be encrypted!
+    query_timeout_ms = Column(Integer, nullable=True) # Falls back to settings.QUERY_TIMEOUT_MS
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
     owner = relationship("User", back_populates="connections")
 
+class RevokedToken(Base):
+    """Logged-out tokens; every worker refuses them until they would have expired anyway"""
+    __tablename__ = "revoked_tokens"
+
+    token_hash = Column(String, primary_key=True) # sha256 of the JWT
+    expires_at = Column(DateTime, index=True) # The token's exp; the row is useless after it
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class QueryHistory(Base):
     __tablename__ = "query_history"
 
@@ -46,3 +55,43 @@ class QueryHistory(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
+
+    __table_args__ = (
+        # Serves the per-user history page without sorting the tenant's rows
+        Index("ix_query_history_tenant_user_created", "tenant_id", "user_id", "created_at", "id"),
+        # The cross-tenant retention sweep, oldest first
+        Index("ix_query_history_created", "created_at", "id"),
+        # A tenant's most recent rows, for frequent questions
+        Index("ix_query_history_tenant_created", "tenant_id", "created_at"),
+    )
+
+class QuestionFrequency(Base):
+    """Compacted history: how often a tenant asked a question, kept after the rows expire"""
+    __tablename__ = "question_frequencies"
+
+    tenant_id = Column(String, primary_key=True)
+    question_key = Column(String, primary_key=True) # Hash of the normalized question
+    question = Column(String) # Most recent wording
+    query_text = Column(String) # Most recent SQL or MQL
+    db_type = Column(String)
+    count = Column(Integer, default=0)
+    first_asked_at = Column(DateTime)
+    last_asked_at = Column(DateTime)
+
+class TenantSchema(Base):
+    __tablename__ = "tenant_schemas"
+
+    tenant_id = Column(String, primary_key=True)
+    fingerprint = Column(String) # Content hash, used as the schema version in cache keys
+    schema = Column(JSON) # Full extracted schema
+    table_checksums = Column(JSON) # Cheap per-table catalog checksums for incremental refresh
+    extracted_at = Column(DateTime, default=datetime.utcnow)
+
+class TenantProfile(Base):
+    __tablename__ = "tenant_profiles"
+
+    tenant_id = Column(String, primary_key=True)
+    version = Column(String) # Content hash, part of the prompt cache key
+    schema_version = Column(String) # Schema fingerprint the profile was taken against
+    profile = Column(JSON) # Per-table column statistics
+    profiled_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,165 @@
+from bson import ObjectId, Decimal128
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from datetime import datetime
+from typing import Dict, List
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# BSON value -> type name shown in the schema and the LLM prompt
+BSON_TYPE_NAMES = {
+    str: "string",
+    bool: "bool",
+    int: "int",
+    float: "double",
+    datetime: "date",
+    ObjectId: "objectId",
+    Decimal128: "decimal",
+    bytes: "binData",
+    dict: "object",
+    list: "array",
+    type(None): "null",
+}
+
+
+class FieldStats:
+    """Observed types and document frequency for one dotted path"""
+
+    __slots__ = ("types", "element_types", "documents")
+
+    def __init__(self):
+        self.types = set()
+        self.element_types = set()
+        self.documents = 0
+
+
+class MongoSchemaInferrer:
+    """
+    Infers a collection's fields from a random `$sample` of documents.
+    Nested documents (including documents inside arrays) become dotted paths,
+    types seen across the sample are merged, and each field records how often
+    it appeared. Counts come from collection metadata and indexes from
+    index_information(); sampling is bounded by time_budget_ms per collection.
+    """
+
+    def __init__(self, sample_size: int = 100, time_budget_ms: int = 2000, max_depth: int = 5):
+        self.sample_size = sample_size
+        self.time_budget_ms = time_budget_ms
+        self.max_depth = max_depth
+
+    def infer(self, collection) -> dict:
+        """Table entry ({'columns', 'relations', 'indexes', 'row_count'}) for one collection"""
+        deadline = time.monotonic() + self.time_budget_ms / 1000
+        documents = self._sample(collection, deadline)
+
+        fields: Dict[str, FieldStats] = {}
+        for doc in documents:
+            seen = set()
+            self._walk(doc, "", 0, fields, seen)
+            for path in seen:
+                fields[path].documents += 1
+
+        sampled = len(documents)
+        logger.debug(f"Inferred {len(fields)} fields for {collection.name} from {sampled} sampled documents")
+        columns = [self._column(path, stats, sampled) for path, stats in sorted(fields.items(), key=self._field_order)]
+        return {
+            'columns': columns,
+            'relations': [],
+            'indexes': self._indexes(collection),
+            'row_count': self._row_count(collection)
+        }
+
+    def _sample(self, collection, deadline: float) -> List[dict]:
+        """Random sample, stopping early when the time budget runs out"""
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        documents = []
+        try:
+            cursor = collection.aggregate([{"$sample": {"size": self.sample_size}}], maxTimeMS=remaining_ms)
+            for doc in cursor:
+                documents.append(doc)
+                if time.monotonic() >= deadline:
+                    logger.info(f"Sampling budget reached for {collection.name} after {len(documents)} documents")
+                    break
+        except (ExecutionTimeout, OperationFailure) as e:
+            # Views and some deployments reject $sample; fall back to the first documents
+            logger.warning(f"$sample failed for {collection.name}, falling back to find(): {e}")
+            if not documents:
+                remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+                try:
+                    documents = list(collection.find().limit(self.sample_size).max_time_ms(remaining_ms))
+                except ExecutionTimeout:
+                    logger.warning(f"Sampling timed out for {collection.name}")
+        return documents
+
+    def _walk(self, value: dict, prefix: str, depth: int, fields: Dict[str, FieldStats], seen: set):
+        for key, child in value.items():
+            path = f"{prefix}{key}"
+            stats = fields.get(path)
+            if stats is None:
+                stats = fields[path] = FieldStats()
+            stats.types.add(self._type_name(child))
+            seen.add(path)
+
+            if depth >= self.max_depth:
+                continue
+            if isinstance(child, dict):
+                self._walk(child, f"{path}.", depth + 1, fields, seen)
+            elif isinstance(child, list):
+                for element in child:
+                    stats.element_types.add(self._type_name(element))
+                    # Dotted paths reach into arrays of documents, matching Mongo query syntax
+                    if isinstance(element, dict):
+                        self._walk(element, f"{path}.", depth + 1, fields, seen)
+
+    def _type_name(self, value) -> str:
+        name = BSON_TYPE_NAMES.get(type(value))
+        if name is None:
+            for bson_type, type_name in BSON_TYPE_NAMES.items():
+                if isinstance(value, bson_type):
+                    return type_name
+            return type(value).__name__
+        return name
+
+    def _column(self, path: str, stats: FieldStats, sampled: int) -> dict:
+        types = sorted(t for t in stats.types if t != "null")
+        if "array" in types and stats.element_types:
+            elements = "|".join(sorted(t for t in stats.element_types if t != "null")) or "null"
+            types = [f"array<{elements}>" if t == "array" else t for t in types]
+        frequency = round(stats.documents / sampled, 3) if sampled else 0.0
+        return {
+            'name': path,
+            'type': "|".join(types) or "null",
+            'nullable': "null" in stats.types or frequency < 1,
+            'primary_key': path == "_id",
+            'frequency': frequency
+        }
+
+    def _field_order(self, item):
+        # _id first, then parents before their children
+        path = item[0]
+        return (path != "_id", path.split("."))
+
+    def _indexes(self, collection) -> List[dict]:
+        try:
+            info = collection.index_information()
+        except Exception as e:
+            logger.warning(f"Could not read indexes for {collection.name}: {e}")
+            return []
+        indexes = []
+        for name, spec in info.items():
+            if name == "_id_":
+                continue
+            indexes.append({
+                'name': name,
+                'columns': [field for field, _ in spec.get("key", [])],
+                'unique': bool(spec.get("unique", False))
+            })
+        return indexes
+
+    def _row_count(self, collection) -> int:
+        """Count from collection metadata (no scan); -1 if unavailable"""
+        try:
+            return collection.estimated_document_count()
+        except Exception:
+            return -1
@@ -0,0 +1,329 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, List, Callable, Tuple
+import hashlib
+import json
+import time
+import logging
+from app.column_stats import profile_rows
+from app.chart_service import NUMERIC_TYPE, TEMPORAL_TYPE
+from app.query_executor import QueryCancelledError
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileService:
+    """
+    Per-column statistics for a tenant's tables: approximate distinct counts
+    (HyperLogLog), null fraction, min/max, top values and histograms, from one
+    sampled query per table. Profiling runs in the background under a time budget
+    and is persisted next to the schema snapshot, so chart suggestions and prompt
+    hints never query the tenant database themselves.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        db_service,
+        schema_service,
+        query_executor,
+        sample_rows: int = 5000,
+        time_budget_ms: int = 30000,
+        top_k: int = 5,
+        histogram_bins: int = 10,
+        max_concurrent_profiles: int = 2,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        self.db_service = db_service
+        self.schema_service = schema_service
+        self.query_executor = query_executor
+        self.sample_rows = sample_rows
+        self.time_budget_ms = time_budget_ms
+        self.top_k = top_k
+        self.histogram_bins = histogram_bins
+        self.profiles: Dict[str, dict] = {}
+        self.status: Dict[str, str] = {}
+        self._session_factory = session_factory
+        self._background = ThreadPoolExecutor(
+            max_workers=max_concurrent_profiles,
+            thread_name_prefix="column-profiling"
+        )
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def start_profiling(self, tenant_id: str, user_id: int) -> str:
+        """Queue a background profile (after any running schema extraction) and return its state"""
+        if self.status.get(tenant_id) in (self.PENDING, self.RUNNING):
+            return self.status[tenant_id]
+        self.status[tenant_id] = self.PENDING
+        self._background.submit(self._profile_in_background, tenant_id, user_id)
+        return self.PENDING
+
+    def _profile_in_background(self, tenant_id: str, user_id: int):
+        progress = self.schema_service.progress.get(tenant_id)
+        if progress is not None:
+            # Profiles are built from the extracted schema, so let extraction finish first
+            progress.done.wait(timeout=self.time_budget_ms / 1000)
+        db = self._new_session()
+        try:
+            self.profile_tenant(tenant_id, user_id, db)
+        except Exception as e:
+            self.status[tenant_id] = self.FAILED
+            logger.error(f"❌ Column profiling failed for tenant {tenant_id}: {e}")
+        finally:
+            db.close()
+
+    def profile_tenant(self, tenant_id: str, user_id: int, db: Session, cancel_token=None) -> Optional[dict]:
+        """Profile every table in the tenant's schema (blocks); tables past the time budget are skipped"""
+        self.status[tenant_id] = self.RUNNING
+        conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
+        engine = self.db_service.get_engine(tenant_id, user_id, db) if conn_record else None
+        schema = self.schema_service.get_schema(tenant_id)
+        if not engine or schema is None:
+            self.status[tenant_id] = self.FAILED
+            logger.warning(f"Cannot profile tenant {tenant_id}: no connection or schema")
+            return None
+
+        started = time.monotonic()
+        deadline = started + self.time_budget_ms / 1000
+        query_timeout_ms = self.query_executor.resolve_timeout_ms(conn_record)
+        tables, skipped = {}, []
+        for table_name in schema:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                skipped.append(table_name)
+                continue
+            table = schema[table_name]
+            columns = [column['name'] for column in table['columns']]
+            try:
+                rows = self._sample(
+                    engine, conn_record, tenant_id, table_name, columns, table.get('row_count', -1),
+                    min(remaining_ms, query_timeout_ms), cancel_token
+                )
+            except QueryCancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not profile {table_name} for tenant {tenant_id}: {e}")
+                skipped.append(table_name)
+                continue
+            tables[table_name] = profile_rows(rows, columns, self.top_k, self.histogram_bins)
+
+        profile = {
+            "version": self._fingerprint(tables),
+            "schema_version": self.schema_service.get_schema_version(tenant_id),
+            "profiled_at": datetime.utcnow().isoformat(),
+            "tables": tables,
+            "skipped": skipped
+        }
+        self.profiles[tenant_id] = profile
+        self._save_profile(tenant_id, profile)
+        self.status[tenant_id] = self.COMPLETE
+        logger.info(f"📊 Profiled {len(tables)} tables for tenant {tenant_id} in "
+                    f"{time.monotonic() - started:.1f}s ({len(skipped)} skipped)")
+        return profile
+
+    def _sample(self, engine, conn_record, tenant_id: str, table_name: str, columns: List[str],
+                row_count: int, timeout_ms: int, cancel_token) -> List[dict]:
+        if conn_record.db_type == 'mongodb':
+            return self.query_executor.execute_mongo(
+                engine, conn_record.database_name or "test", table_name,
+                [{"$sample": {"size": self.sample_rows}}],
+                tenant_id=tenant_id, timeout_ms=timeout_ms, cancel_token=cancel_token
+            )
+        return self.query_executor.execute_sql(
+            engine, self._sample_sql(engine, conn_record.db_type, table_name, columns, row_count),
+            conn_record.db_type,
+            tenant_id=tenant_id, timeout_ms=timeout_ms, cancel_token=cancel_token
+        )
+
+    def _sample_sql(self, engine, db_type: str, table_name: str, columns: List[str], row_count: int) -> str:
+        """One bounded query per table; large tables are sampled instead of read from the start"""
+        quote = engine.dialect.identifier_preparer.quote_identifier
+        select = ", ".join(quote(column) for column in columns)
+        source, where = quote(table_name), ""
+        # Oversample 2x: block sampling returns uneven row counts
+        fraction = self.sample_rows * 2 / row_count if row_count > 0 else 1.0
+        if fraction < 1:
+            if db_type == 'postgresql':
+                source += f" TABLESAMPLE SYSTEM ({fraction * 100:.4f})"
+            elif db_type == 'mysql':
+                where = f" WHERE RAND() < {fraction:.6f}"
+        return f"SELECT {select} FROM {source}{where} LIMIT {self.sample_rows}"
+
+    def _fingerprint(self, tables: dict) -> str:
+        return hashlib.sha256(json.dumps(tables, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def get_profile(self, tenant_id: str) -> Optional[dict]:
+        """Latest profile, loading the persisted one if this worker has none"""
+        profile = self.profiles.get(tenant_id)
+        if profile is None and self._load_profile(tenant_id):
+            profile = self.profiles.get(tenant_id)
+        return profile
+
+    def get_status(self, tenant_id: str) -> Optional[str]:
+        if tenant_id in self.status:
+            return self.status[tenant_id]
+        return self.COMPLETE if self.get_profile(tenant_id) else None
+
+    def invalidate(self, tenant_id: str, tables: List[str]):
+        """Drop profiles of tables whose definition changed (schema change listener)"""
+        profile = self.profiles.get(tenant_id)
+        if profile is None:
+            return
+        stale = [table for table in tables if table in profile["tables"]]
+        if not stale:
+            return
+        remaining = {name: stats for name, stats in profile["tables"].items() if name not in stale}
+        profile = {
+            **profile,
+            "version": self._fingerprint(remaining),
+            "schema_version": self.schema_service.get_schema_version(tenant_id),
+            "tables": remaining
+        }
+        self.profiles[tenant_id] = profile
+        self._save_profile(tenant_id, profile)
+
+    def remove_profile(self, tenant_id: str):
+        """Forget a tenant's profile when it disconnects"""
+        self.profiles.pop(tenant_id, None)
+        self.status.pop(tenant_id, None)
+        self._delete_profile(tenant_id)
+
+    def prompt_hints(self, tenant_id: str) -> Optional[Tuple[str, Dict[str, Dict[str, str]]]]:
+        """(profile version, {table: {column: hint}}) for the LLM prompt, or None without a profile"""
+        profile = self.get_profile(tenant_id)
+        if not profile:
+            return None
+        hints: Dict[str, Dict[str, str]] = {}
+        for table_name, table_profile in profile["tables"].items():
+            for column, stats in table_profile["columns"].items():
+                hint = self._hint(stats)
+                if hint:
+                    hints.setdefault(table_name, {})[column] = hint
+        return profile["version"], hints
+
+    def _hint(self, stats: dict) -> Optional[str]:
+        if stats["histogram"] is None and 0 < stats["distinct"] <= 20 and stats["top_values"]:
+            # Low-cardinality text: show the values the LLM should filter on
+            values = ", ".join(repr(value) for value, _ in stats["top_values"])
+            return f"values: {values}"
+        if stats["min"] is not None and stats["max"] is not None and stats["min"] != stats["max"]:
+            return f"range: {stats['min']} .. {stats['max']}"
+        return None
+
+    def suggest_charts(self, tenant_id: str, limit: int = 8) -> List[dict]:
+        """Chart specs (usable with /api/insights/chart-data) ranked from the stored profile"""
+        profile = self.get_profile(tenant_id)
+        schema = self.schema_service.get_schema(tenant_id)
+        if not profile or schema is None:
+            return []
+
+        suggestions = []
+        for table_name, table_profile in profile["tables"].items():
+            if table_name not in schema or not table_profile["sampled_rows"]:
+                continue
+            columns = {column['name']: column for column in schema[table_name]['columns']}
+            stats = table_profile["columns"]
+            usable = [name for name in stats if name in columns and stats[name]["null_fraction"] < 0.5]
+
+            measures = [
+                name for name in usable
+                if NUMERIC_TYPE.search(columns[name]['type']) and not self._is_identifier(columns[name])
+                and stats[name]["distinct"] > 1
+            ]
+            # Prefer the measure with the most spread
+            measures.sort(key=lambda name: -stats[name]["distinct"])
+            measure = measures[0] if measures else None
+
+            for name in usable:
+                column_type = columns[name]['type']
+                distinct = stats[name]["distinct"]
+                if TEMPORAL_TYPE.search(column_type) and distinct > 1:
+                    suggestions.append(self._suggestion(table_name, name, measure, "line", 3,
+                                                        f"{name} spans {stats[name]['min']} .. {stats[name]['max']}"))
+                elif not NUMERIC_TYPE.search(column_type) and 2 <= distinct <= 20:
+                    suggestions.append(self._suggestion(table_name, name, measure, "bar", 2,
+                                                        f"{name} has {distinct} distinct values"))
+                    if distinct <= 8:
+                        suggestions.append(self._suggestion(table_name, name, None, "pie", 1,
+                                                            f"share of rows per {name}"))
+
+        suggestions.sort(key=lambda suggestion: -suggestion.pop("_score"))
+        return suggestions[:limit]
+
+    def _suggestion(self, table_name: str, x_column: str, measure: Optional[str], chart_type: str, score: int, reason: str) -> dict:
+        return {
+            "table_name": table_name,
+            "x_column": x_column,
+            "y_column": measure or x_column,
+            "chart_type": chart_type,
+            "aggregation": "sum" if measure else "count",
+            "reason": reason,
+            "_score": score + (1 if measure else 0)
+        }
+
+    def _is_identifier(self, column: dict) -> bool:
+        name = column['name'].lower()
+        return column.get('primary_key') or name == "id" or name.endswith("_id")
+
+    def _save_profile(self, tenant_id: str, profile: dict):
+        from app.models import TenantProfile
+        session = None
+        try:
+            session = self._new_session()
+            session.merge(TenantProfile(
+                tenant_id=tenant_id,
+                version=profile["version"],
+                schema_version=profile["schema_version"],
+                profile=profile,
+                profiled_at=datetime.utcnow()
+            ))
+            session.commit()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            logger.warning(f"Failed to persist column profile for tenant {tenant_id}: {e}")
+        finally:
+            if session is not None:
+                session.close()
+
+    def _load_profile(self, tenant_id: str) -> bool:
+        from app.models import TenantProfile
+        session = None
+        try:
+            session = self._new_session()
+            row = session.get(TenantProfile, tenant_id)
+            if row is None or not row.profile:
+                return False
+            self.profiles[tenant_id] = row.profile
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load column profile for tenant {tenant_id}: {e}")
+            return False
+        finally:
+            if session is not None:
+                session.close()
+
+    def _delete_profile(self, tenant_id: str):
+        from app.models import TenantProfile
+        session = None
+        try:
+            session = self._new_session()
+            session.query(TenantProfile).filter(TenantProfile.tenant_id == tenant_id).delete()
+            session.commit()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            logger.warning(f"Failed to delete column profile for tenant {tenant_id}: {e}")
+        finally:
+            if session is not None:
+                session.close()
@@ -0,0 +1,285 @@
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+import pymongo
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from bson import ObjectId
+from datetime import datetime
+from typing import Dict, Optional, List, Any, Callable
+import asyncio
+import threading
+import uuid
+import logging
+from app.metrics import StageTimer, stage
+from app.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# Driver error codes that signal a statement was stopped server-side
+PG_QUERY_CANCELED = "57014"
+MYSQL_QUERY_TIMEOUT = 3024
+MYSQL_QUERY_INTERRUPTED = 1317
+MONGO_INTERRUPTED = 11601
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a tenant query exceeds its execution budget"""
+
+    def __init__(self, tenant_id: str, timeout_ms: int):
+        self.tenant_id = tenant_id
+        self.timeout_ms = timeout_ms
+        super().__init__(f"Query exceeded the execution budget of {timeout_ms}ms and was stopped.")
+
+
+class QueryCancelledError(Exception):
+    """Raised when a tenant query was cancelled because the client went away"""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation handle shared between the request and the worker thread.
+    The executor binds a callback that stops the server-side query.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callback: Optional[Callable[[], None]] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def bind(self, callback: Callable[[], None]):
+        """Register how to cancel the running query (fires immediately if already cancelled)"""
+        with self._lock:
+            self._callback = callback
+            fire = self._event.is_set()
+        if fire:
+            self._run_callback(callback)
+
+    def unbind(self):
+        with self._lock:
+            self._callback = None
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callback = self._callback
+        if callback:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f"Server-side cancel failed: {e}")
+
+
+class QueryExecutor:
+    """
+    Runs tenant queries under a per-tenant execution budget.
+    PostgreSQL uses statement_timeout, MySQL uses MAX_EXECUTION_TIME and MongoDB uses maxTimeMS.
+    """
+
+    def __init__(self, default_timeout_ms: int = 30000):
+        self.default_timeout_ms = default_timeout_ms
+        self.stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        logger.info("QueryExecutor initialized")
+
+    def resolve_timeout_ms(self, conn_record) -> int:
+        """Tenant override from the connection record, else the global default"""
+        timeout_ms = getattr(conn_record, "query_timeout_ms", None) if conn_record else None
+        return int(timeout_ms) if timeout_ms else self.default_timeout_ms
+
+    def execute_sql(
+        self,
+        engine,
+        sql: str,
+        db_type: str,
+        tenant_id: str,
+        timeout_ms: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict[str, Any]]:
+        """Execute a SELECT with a server-side timeout and return JSON-friendly rows"""
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        self._record(tenant_id, "executions", timeout_ms)
+        if cancel_token and cancel_token.cancelled:
+            self._record(tenant_id, "cancellations", timeout_ms)
+            raise QueryCancelledError("Query cancelled before execution.")
+
+        try:
+            with engine.connect() as conn:
+                if db_type == "postgresql":
+                    # SET LOCAL is scoped to the transaction, so the pooled connection stays clean
+                    conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+                elif db_type == "mysql":
+                    conn.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}"))
+
+                if cancel_token:
+                    cancel_token.bind(self._sql_cancel_callback(engine, conn, db_type))
+                try:
+                    with stage(timer, "tenant_query"):
+                        rows = conn.execute(text(sql)).fetchall()
+                        annotate({"db.system": db_type, "db.rows": len(rows)})
+                    with stage(timer, "row_conversion"):
+                        return [self._convert_row(row) for row in rows]
+                finally:
+                    if cancel_token:
+                        cancel_token.unbind()
+        except DBAPIError as e:
+            if self._is_sql_interrupt(e, db_type):
+                raise self._interrupted(tenant_id, timeout_ms, cancel_token) from e
+            raise
+
+    def execute_mongo(
+        self,
+        client: pymongo.MongoClient,
+        db_name: str,
+        collection_name: str,
+        pipeline: List[dict],
+        tenant_id: str,
+        timeout_ms: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict[str, Any]]:
+        """Run an aggregation pipeline with maxTimeMS and return JSON-friendly documents"""
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        self._record(tenant_id, "executions", timeout_ms)
+        if cancel_token and cancel_token.cancelled:
+            self._record(tenant_id, "cancellations", timeout_ms)
+            raise QueryCancelledError("Query cancelled before execution.")
+
+        # Tag the operation so it can be found and killed from another thread
+        comment = f"nlpsql:{tenant_id}:{uuid.uuid4().hex}"
+        if cancel_token:
+            cancel_token.bind(lambda: self._kill_mongo_op(client, comment))
+        try:
+            with stage(timer, "tenant_query"):
+                documents = list(client[db_name][collection_name].aggregate(
+                    pipeline,
+                    maxTimeMS=int(timeout_ms),
+                    comment=comment
+                ))
+                annotate({"db.system": "mongodb", "db.collection": collection_name, "db.rows": len(documents)})
+            with stage(timer, "row_conversion"):
+                return [self._convert_document(doc) for doc in documents]
+        except ExecutionTimeout as e:
+            raise self._interrupted(tenant_id, timeout_ms, cancel_token) from e
+        except OperationFailure as e:
+            if e.code == MONGO_INTERRUPTED:
+                raise self._interrupted(tenant_id, timeout_ms, cancel_token) from e
+            raise
+        finally:
+            if cancel_token:
+                cancel_token.unbind()
+
+    def get_tenant_stats(self, tenant_id: str) -> dict:
+        """Execution, timeout and cancellation counters for a tenant"""
+        with self._lock:
+            stats = dict(self.stats.get(tenant_id, {}))
+        stats.setdefault("executions", 0)
+        stats.setdefault("timeouts", 0)
+        stats.setdefault("cancellations", 0)
+        stats.setdefault("timeout_ms", self.default_timeout_ms)
+        return stats
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Counters for every tenant seen by this worker"""
+        with self._lock:
+            return {tenant_id: dict(stats) for tenant_id, stats in self.stats.items()}
+
+    def _record(self, tenant_id: str, counter: str, timeout_ms: int):
+        with self._lock:
+            stats = self.stats.setdefault(tenant_id, {
+                "executions": 0,
+                "timeouts": 0,
+                "cancellations": 0
+            })
+            stats[counter] += 1
+            stats["timeout_ms"] = timeout_ms
+
+    def _interrupted(self, tenant_id: str, timeout_ms: int, cancel_token: Optional[CancelToken]) -> Exception:
+        """Map a server-side interrupt to a timeout or a client cancellation"""
+        if cancel_token and cancel_token.cancelled:
+            self._record(tenant_id, "cancellations", timeout_ms)
+            logger.info(f"🛑 Query cancelled for tenant {tenant_id} (client disconnected)")
+            return QueryCancelledError("Query cancelled because the client disconnected.")
+        self._record(tenant_id, "timeouts", timeout_ms)
+        logger.warning(f"⏱️ Query timed out for tenant {tenant_id} after {timeout_ms}ms")
+        return QueryTimeoutError(tenant_id, timeout_ms)
+
+    def _is_sql_interrupt(self, error: DBAPIError, db_type: str) -> bool:
+        orig = getattr(error, "orig", None)
+        if db_type == "postgresql":
+            return getattr(orig, "pgcode", None) == PG_QUERY_CANCELED
+        if db_type == "mysql":
+            code = orig.args[0] if orig is not None and orig.args else None
+            return code in (MYSQL_QUERY_TIMEOUT, MYSQL_QUERY_INTERRUPTED)
+        return False
+
+    def _sql_cancel_callback(self, engine, conn, db_type: str) -> Callable[[], None]:
+        """Build a callback that stops the statement running on this connection"""
+        raw = getattr(getattr(conn, "connection", None), "dbapi_connection", None)
+        if raw is None:
+            return lambda: None
+
+        if db_type == "postgresql":
+            # psycopg2 sends a cancel request over a separate socket
+            return raw.cancel
+        if db_type == "mysql":
+            thread_id = raw.thread_id()
+
+            def kill_query():
+                with engine.connect() as killer:
+                    killer.execute(text(f"KILL QUERY {int(thread_id)}"))
+            return kill_query
+        return lambda: None
+
+    def _kill_mongo_op(self, client: pymongo.MongoClient, comment: str):
+        ops = client.admin.command({"currentOp": True, "command.comment": comment})
+        for op in ops.get("inprog", []):
+            client.admin.command("killOp", op=op["opid"])
+
+    def _convert_row(self, row) -> Dict[str, Any]:
+        row_dict = {}
+        for column, value in row._mapping.items():
+            if hasattr(value, 'isoformat'):
+                row_dict[column] = value.isoformat()
+            else:
+                row_dict[column] = value
+        return row_dict
+
+    def _convert_document(self, doc: dict) -> Dict[str, Any]:
+        # Clean up all fields for JSON serialization
+        clean_doc = {}
+        for k, v in doc.items():
+            if isinstance(v, ObjectId) or (hasattr(v, '__str__') and 'ObjectId' in str(type(v))):
+                clean_doc[k] = str(v)
+            elif isinstance(v, datetime):
+                clean_doc[k] = v.isoformat()
+            else:
+                clean_doc[k] = v
+        return clean_doc
+
+
+async def run_with_disconnect_cancel(http_request, func: Callable, *args, poll_interval: float = 0.5, **kwargs):
+    """
+    Run a blocking service call in the threadpool and cancel its query if the HTTP client goes away.
+    `func` must accept a `cancel_token` keyword argument.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    cancel_token = CancelToken()
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, cancel_token=cancel_token, **kwargs))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, cancelling running query")
+            cancel_token.cancel()
+            return await task
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from sqlalchemy import text
@@ -7,10 +8,15 @@ import time
 import re
 from typing import List, Dict, Any, Optional
 
-from dependencies import get_db_service, get_schema_service, get_cache_service, get_query_service
+from dependencies import (
+    get_db_service, get_schema_service, get_cache_service, get_query_service, get_query_executor,
+    get_schema_drift_watcher, get_profile_service, get_rollup_manager, get_history_service, get_slow_query_log
+)
+from app.query_executor import run_with_disconnect_cancel
 from app.database import get_db
 from app.auth_service import get_current_user
-from app.models import User, TenantConnection
+from app.models import User
+from config import settings
 
 router = APIRouter(prefix="/api", tags=["query"])
 logger = logging.getLogger(__name__)
@@ -18,27 +24,39 @@ logger = logging.getLogger(__name__)
 class AskRequest(BaseModel):
     tenant_id: str
     question: str
+    conversation_id: Optional[str] = None # Lets follow-ups refine the previous answer locally
+    include_timings: bool = False # Adds the per-stage latency breakdown to the response
 
 class AskResponse(BaseModel):
     answer: List[Dict[Any, Any]]
     sql: Optional[str]
     execution_time: str
     cache_hit: bool
+    timed_out: bool = False
+    local_followup: bool = False
+    source: Optional[str] = None # "rollup" when a materialized rollup answered
+    refreshed_at: Optional[str] = None # When that rollup was last refreshed (UTC)
     error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None # Milliseconds per stage, when requested
 
 @router.post("/ask", response_model=AskResponse)
 async def ask_question(
     request: AskRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     query_service=Depends(get_query_service)
 ):
     try:
-        result = query_service.ask(
+        # Runs off the event loop; the tenant query is cancelled if the client disconnects
+        result = await run_with_disconnect_cancel(
+            http_request,
+            query_service.ask,
             tenant_id=request.tenant_id, 
             question=request.question, 
             user_id=current_user.id,
-            db=db
+            db=db,
+            conversation_id=request.conversation_id
         )
         
         return AskResponse(
@@ -46,7 +64,12 @@ async def ask_question(
             sql=result.get("sql"),
             execution_time=result.get("execution_time", "0s"),
             cache_hit=result.get("cache_hit", False),
-            error=result.get("error")
+            timed_out=result.get("timed_out", False),
+            local_followup=result.get("local_followup", False),
+            source=result.get("source"),
+            refreshed_at=result.get("refreshed_at"),
+            error=result.get("error"),
+            timings=result.get("timings") if request.include_timings else None
         )
         
     except ValueError as e:
@@ -63,41 +86,108 @@ async def get_tenant_schema(
     db_service = Depends(get_db_service),
     schema_service = Depends(get_schema_service)
 ):
-    # 1. Try to get schema from cache
+    # 1. Only the tenant's owner may see it; then try memory, then the persisted snapshot
+    conn_record = db_service.get_connection_info(tenant_id, current_user.id, db)
+    if not conn_record:
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
     schema = schema_service.get_schema(tenant_id)
     
-    # 2. If not in memory (e.g. server restart), re-extract it
-    if schema is None:
+    # 2. If there is no snapshot either, re-extract it unless a background extraction is running
+    progress = schema_service.get_progress(tenant_id)
+    extraction_running = progress is not None and progress["state"] in ("pending", "running")
+    if schema is None and not extraction_running:
         logger.info(f"Schema not in memory for tenant {tenant_id}, re-extracting...")
         schema = schema_service.extract_and_store_schema(tenant_id, current_user.id, db)
+        progress = schema_service.get_progress(tenant_id)
     
-    # 3. Get connection metadata for UI context
-    conn_record = db.query(TenantConnection).filter(
-        TenantConnection.tenant_id == tenant_id,
-        TenantConnection.user_id == current_user.id
-    ).first()
-
     return {
         "tenant_id": tenant_id, 
         "schema": schema,
-        "db_type": conn_record.db_type if conn_record else None,
-        "database_name": conn_record.database_name if conn_record else None,
-        "host": conn_record.host if conn_record else None
+        "db_type": conn_record.db_type,
+        "database_name": conn_record.database_name,
+        "host": conn_record.host,
+        "schema_version": schema_service.get_schema_version(tenant_id),
+        "extraction": progress
+    }
+
+@router.post("/schema/{tenant_id}/refresh")
+async def refresh_tenant_schema(
+    tenant_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    schema_service = Depends(get_schema_service)
+):
+    """Re-inspect only the tables whose catalog checksum changed since the last snapshot"""
+    result = await run_in_threadpool(schema_service.refresh_schema, tenant_id, current_user.id, db)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    return {"tenant_id": tenant_id, **result}
+
+@router.post("/schema/{tenant_id}/profile")
+async def profile_tenant_schema(
+    tenant_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    db_service = Depends(get_db_service),
+    profile_service = Depends(get_profile_service)
+):
+    """Queue a background column profile of the tenant's tables"""
+    if not db_service.get_connection_info(tenant_id, current_user.id, db):
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    return {"tenant_id": tenant_id, "status": profile_service.start_profiling(tenant_id, current_user.id)}
+
+@router.get("/schema/{tenant_id}/profile")
+async def get_tenant_profile(
+    tenant_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    db_service = Depends(get_db_service),
+    profile_service = Depends(get_profile_service)
+):
+    """Column statistics from the latest profile"""
+    if not db_service.get_connection_info(tenant_id, current_user.id, db):
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    return {
+        "tenant_id": tenant_id,
+        "status": profile_service.get_status(tenant_id),
+        "profile": profile_service.get_profile(tenant_id)
     }
 
+@router.get("/schema-drift/stats")
+async def get_schema_drift_stats(
+    schema_drift_watcher=Depends(get_schema_drift_watcher)
+):
+    """Drift checks run by this worker and when each tenant is next due"""
+    return schema_drift_watcher.get_stats()
+
+@router.get("/rollups/stats")
+async def get_rollup_stats(
+    rollup_manager=Depends(get_rollup_manager)
+):
+    """Rollups materialized by this worker and how often they answered requests"""
+    return rollup_manager.get_stats()
+
 @router.get("/cache/stats")
 async def get_cache_stats(
     cache_service=Depends(get_cache_service)
 ):
     return cache_service.get_stats()
 
+@router.get("/pools/stats")
+async def get_pool_stats(
+    db_service=Depends(get_db_service)
+):
+    """Worker-wide tenant pool totals"""
+    return db_service.registry.get_stats()
+
 @router.get("/stats/{tenant_id}")
 async def get_tenant_stats(
     tenant_id: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     db_service = Depends(get_db_service),
-    cache_service=Depends(get_cache_service)
+    cache_service=Depends(get_cache_service),
+    query_executor=Depends(get_query_executor)
 ):
     """Get real-time statistics for a specific tenant"""
     # Verify ownership
@@ -105,26 +195,37 @@ async def get_tenant_stats(
     if not engine:
         raise HTTPException(status_code=404, detail="Tenant not found or access denied")
         
-    return cache_service.get_tenant_stats(tenant_id)
+    stats = cache_service.get_tenant_stats(tenant_id)
+    stats["query_budget"] = query_executor.get_tenant_stats(tenant_id)
+    stats["pool"] = db_service.get_pool_stats(tenant_id)
+    return stats
 
 @router.get("/history/{tenant_id}")
 async def get_tenant_history(
     tenant_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1, le=settings.HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    db_service = Depends(get_db_service)
+    db_service = Depends(get_db_service),
+    history_service = Depends(get_history_service)
 ):
-    """Get recent query history for a specific tenant from database"""
+    """
+    Get recent query history for a specific tenant from database, newest first.
+    The next page's cursor comes back in the X-Next-Cursor header.
+    """
     # Verify ownership
     engine = db_service.get_engine(tenant_id, user_id=current_user.id, db=db)
     if not engine:
         raise HTTPException(status_code=404, detail="Tenant not connected or access denied")
-        
-    from app.models import QueryHistory
-    history = db.query(QueryHistory).filter(
-        QueryHistory.tenant_id == tenant_id,
-        QueryHistory.user_id == current_user.id
-    ).order_by(QueryHistory.created_at.desc()).limit(20).all()
+
+    try:
+        history, next_cursor = history_service.page(db, tenant_id, current_user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     return [
         {
@@ -133,4 +234,24 @@ async def get_tenant_history(
             "sql": h.query_text,
             "timestamp": h.created_at.isoformat()
         } for h in history
-    ]
\ No newline at end of file
+    ]
+
+@router.get("/slow-queries/{tenant_id}")
+async def get_slow_queries(
+    tenant_id: str,
+    limit: int = Query(20, ge=1, le=settings.SLOW_QUERY_MAX_PER_TENANT),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    db_service = Depends(get_db_service),
+    slow_query_log = Depends(get_slow_query_log)
+):
+    """A tenant's slowest generated queries, worst first, with their captured plans"""
+    # Verify ownership
+    engine = db_service.get_engine(tenant_id, user_id=current_user.id, db=db)
+    if not engine:
+        raise HTTPException(status_code=404, detail="Tenant not connected or access denied")
+
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.worst(tenant_id, limit=limit)
+    }
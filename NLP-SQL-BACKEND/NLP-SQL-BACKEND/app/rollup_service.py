@@ -0,0 +1,584 @@
+from sqlalchemy.orm import Session
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional, List, Callable, NamedTuple, Tuple, Any, Iterator
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from app.chart_service import NUMERIC_TYPE
+
+logger = logging.getLogger(__name__)
+
+# Units a day-grain rollup can answer, as SQLite expressions over its ISO day key `g`
+ROLLUP_UNITS = {
+    "day": "g",
+    "week": "date(substr(g, 1, 10), 'weekday 0', '-6 days') || substr(g, 11)",
+    "month": "substr(g, 1, 8) || '01' || substr(g, 11)",
+    "year": "substr(g, 1, 5) || '01-01' || substr(g, 11)",
+}
+
+# Aggregate -> expression over the stored partials
+ROLLUP_VALUES = {
+    "count*": "SUM(n)",
+    "count": "SUM(ny)",
+    "sum": "SUM(s)",
+    "avg": "SUM(s) / SUM(ny)",
+    "min": "MIN(mn)",
+    "max": "MAX(mx)",
+}
+
+
+class RollupShape(NamedTuple):
+    """A repeated aggregate: rows of `table` grouped by `column` (as-is or per day), over `measure`"""
+    table: str
+    column: str
+    grain: str # "category" | "day"
+    measure: Optional[str] # None when only counted
+
+
+class AggregateQuery(NamedTuple):
+    """A single-table GROUP BY query with one aggregate, as recognised by parse_aggregate"""
+    table: str
+    column: str
+    unit: Optional[str] # None for a plain column group
+    function: str # key of ROLLUP_VALUES
+    measure: Optional[str]
+    group_key: str
+    value_key: str
+    group_first: bool
+    order: List[Tuple[str, bool]] # ("group" | "value", descending)
+    limit: Optional[int]
+
+
+IDENT = r'(?:\w+\.)?["`]?(\w+)["`]?'
+AGGREGATE_SQL = re.compile(
+    r"^select\s+(?P<select>.+?)\s+from\s+" + r'(?:\w+\.)?["`]?(?P<table>\w+)["`]?' +
+    r"(?:\s+(?:as\s+)?(?!group\b)\w+)?\s+group\s+by\s+(?P<group>.+?)"
+    r"(?:\s+order\s+by\s+(?P<order>.+?))?(?:\s+limit\s+(?P<limit>\d+))?$",
+    re.IGNORECASE
+)
+ALIASED = re.compile(r'^(?P<expr>.+?)(?:\s+as\s+["`]?(?P<alias>\w+)["`]?)?$', re.IGNORECASE)
+COLUMN = re.compile(rf"^{IDENT}$")
+DATE_TRUNC = re.compile(rf"^date_trunc\(\s*'(day|week|month|year)'\s*,\s*{IDENT}\s*\)$", re.IGNORECASE)
+MYSQL_DATE = re.compile(rf"^date\(\s*{IDENT}\s*\)$", re.IGNORECASE)
+AGGREGATE = re.compile(rf"^(count|sum|avg|min|max)\(\s*(?:(\*)|{IDENT})\s*\)$", re.IGNORECASE)
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def _same(a: str, b: str) -> bool:
+    return re.sub(r"\s+", "", a).lower() == re.sub(r"\s+", "", b).lower()
+
+
+def parse_aggregate(sql: str, db_type: str) -> Optional[AggregateQuery]:
+    """Recognise `SELECT group, AGG(measure) FROM t GROUP BY group [ORDER BY ..] [LIMIT n]`; None otherwise"""
+    match = AGGREGATE_SQL.match(sql.strip())
+    if not match:
+        return None
+    items = _split_top_level(match.group("select"))
+    if len(items) != 2:
+        return None
+
+    group, value = None, None
+    for position, item in enumerate(items, start=1):
+        aliased = ALIASED.match(item)
+        expr, alias = aliased.group("expr").strip(), aliased.group("alias")
+        aggregate = AGGREGATE.match(expr)
+        if aggregate:
+            function = aggregate.group(1).lower()
+            star = aggregate.group(2) is not None
+            if star and function != "count":
+                return None
+            default_key = function if db_type == "postgresql" else expr
+            value = (expr, alias, position, "count*" if star else function, None if star else aggregate.group(3), default_key)
+            continue
+        for pattern, unit in ((DATE_TRUNC, None), (MYSQL_DATE, "day"), (COLUMN, None)):
+            grouped = pattern.match(expr)
+            if not grouped:
+                continue
+            if pattern is DATE_TRUNC:
+                unit, column, default_key = grouped.group(1).lower(), grouped.group(2), "date_trunc"
+            elif pattern is MYSQL_DATE:
+                column, default_key = grouped.group(1), expr
+            else:
+                column, default_key = grouped.group(1), grouped.group(1)
+            group = (expr, alias, position, unit, column, default_key)
+            break
+    if group is None or value is None:
+        return None
+
+    def refers_to(term: str, item) -> bool:
+        expr, alias, position = item[0], item[1], item[2]
+        return term == str(position) or _same(term, expr) or (alias is not None and term.strip('"`').lower() == alias.lower())
+
+    if not refers_to(match.group("group"), group):
+        return None
+
+    order = []
+    for term in _split_top_level(match.group("order")) if match.group("order") else []:
+        parts = term.rsplit(None, 1)
+        descending = len(parts) == 2 and parts[1].lower() == "desc"
+        if len(parts) == 2 and parts[1].lower() in ("asc", "desc"):
+            term = parts[0]
+        if refers_to(term, group):
+            order.append(("group", descending))
+        elif refers_to(term, value):
+            order.append(("value", descending))
+        else:
+            return None
+
+    return AggregateQuery(
+        table=match.group("table"),
+        column=group[4],
+        unit=group[3],
+        function=value[3],
+        measure=value[4],
+        group_key=group[1] or group[5],
+        value_key=value[1] or value[5],
+        group_first=group[2] < value[2],
+        order=order,
+        limit=int(match.group("limit")) if match.group("limit") else None
+    )
+
+
+class RollupManager:
+    """
+    Opt-in pre-aggregation for the GROUP BY shapes a tenant repeats. Shapes are counted
+    from chart requests and QueryHistory; once one is seen min_hits times its partial
+    aggregates (count, non-null count, sum, min, max per group or per day) are
+    materialized into a per-tenant SQLite file and refreshed every refresh_seconds.
+    Matching charts and simple aggregate questions are then answered from the file.
+    """
+
+    UNITS = ROLLUP_UNITS
+
+    def __init__(
+        self,
+        db_service,
+        schema_service,
+        query_executor,
+        storage_dir: str = "./rollups",
+        min_hits: int = 5,
+        max_rollups_per_tenant: int = 20,
+        refresh_seconds: int = 3600,
+        max_rows: int = 100000,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        self.db_service = db_service
+        self.schema_service = schema_service
+        self.query_executor = query_executor
+        self.storage_dir = storage_dir
+        self.min_hits = min_hits
+        self.max_rollups_per_tenant = max_rollups_per_tenant
+        self.refresh_seconds = refresh_seconds
+        self.max_rows = max_rows
+        self._session_factory = session_factory
+        self.hits: Dict[str, Counter] = {} # tenant_id -> shape -> times requested
+        self.catalogs: Dict[str, Dict[RollupShape, dict]] = {} # tenant_id -> shape -> catalog row
+        self.too_large: Dict[str, set] = {} # shapes skipped for exceeding max_rows
+        self._history_cursor: Dict[str, int] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        # Guards the dicts above and the counters below; request threads and the refresher share them
+        self._state_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.served = 0
+        self.refreshes = 0
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    # Shape tracking
+
+    def record(self, tenant_id: str, shape: RollupShape):
+        with self._state_lock:
+            self.hits.setdefault(tenant_id, Counter())[shape] += 1
+
+    def shape_for(self, tenant_id: str, table: str, column: str, grain: str, measure: Optional[str]) -> Optional[RollupShape]:
+        """Shape with names resolved against the schema (case-insensitively), or None if unknown"""
+        schema = self.schema_service.get_schema(tenant_id)
+        if schema is None:
+            return None
+        tables = {name.lower(): name for name in schema}
+        table = tables.get(table.lower())
+        if table is None:
+            return None
+        columns = {c['name'].lower(): c['name'] for c in schema[table]['columns']}
+        column = columns.get(column.lower())
+        resolved_measure = columns.get(measure.lower()) if measure else None
+        if column is None or (measure and resolved_measure is None):
+            return None
+        return RollupShape(table, column, grain, resolved_measure)
+
+    def discover(self, tenant_id: str, db: Session, limit: int = 500):
+        """Count aggregate shapes in QueryHistory rows added since the last call"""
+        from app.models import QueryHistory
+        with self._state_lock:
+            cursor = self._history_cursor.get(tenant_id, 0)
+        rows = (
+            db.query(QueryHistory.id, QueryHistory.query_text, QueryHistory.db_type)
+            .filter(QueryHistory.tenant_id == tenant_id, QueryHistory.id > cursor)
+            .order_by(QueryHistory.id)
+            .limit(limit)
+            .all()
+        )
+        for row_id, query_text, db_type in rows:
+            with self._state_lock:
+                self._history_cursor[tenant_id] = max(row_id, self._history_cursor.get(tenant_id, 0))
+            query = parse_aggregate(query_text or "", db_type)
+            if query is None:
+                continue
+            shape = self.shape_for(tenant_id, query.table, query.column, "category" if query.unit is None else "day",
+                                   query.measure)
+            if shape is not None:
+                self.record(tenant_id, shape)
+
+    # Answering
+
+    def find(self, tenant_id: str, shape: RollupShape) -> Optional[dict]:
+        """Catalog row of a materialized rollup that can answer `shape`"""
+        catalog = self._catalog(tenant_id)
+        entry = catalog.get(shape)
+        if entry is None and shape.measure is None:
+            # Any rollup over the same grouping also carries the row count
+            entry = next((e for s, e in catalog.items() if s[:3] == shape[:3]), None)
+        return entry
+
+    def query(
+        self,
+        tenant_id: str,
+        entry: dict,
+        function: str,
+        unit: Optional[str] = None,
+        order: Optional[List[Tuple[str, bool]]] = None,
+        limit: Optional[int] = None,
+        skip_null_groups: bool = False
+    ) -> List[Tuple[Any, Any]]:
+        """(group, value) pairs recomputed from a rollup's partial aggregates"""
+        group = ROLLUP_UNITS[unit] if unit else "g"
+        sql = f'SELECT {group} AS gk, {ROLLUP_VALUES[function]} AS v FROM "{entry["table"]}"'
+        if skip_null_groups:
+            sql += " WHERE g IS NOT NULL"
+        sql += " GROUP BY gk"
+        if order:
+            sql += " ORDER BY " + ", ".join(f"{'gk' if key == 'group' else 'v'} {'DESC' if desc else 'ASC'}" for key, desc in order)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._connect(tenant_id) as conn:
+            rows = conn.execute(sql).fetchall()
+        with self._state_lock:
+            self.served += 1
+        return rows
+
+    def bounds(self, tenant_id: str, entry: dict) -> Tuple[Optional[str], Optional[str]]:
+        with self._connect(tenant_id) as conn:
+            return tuple(conn.execute(f'SELECT MIN(g), MAX(g) FROM "{entry["table"]}"').fetchone())
+
+    def answer_sql(self, tenant_id: str, sql: str, db_type: str) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        """(rows, rollup refreshed_at) for a simple aggregate question if a rollup covers it, else None"""
+        query = parse_aggregate(sql, db_type)
+        if query is None or (query.unit and query.unit not in ROLLUP_UNITS):
+            return None
+        shape = self.shape_for(tenant_id, query.table, query.column, "category" if query.unit is None else "day", query.measure)
+        entry = self.find(tenant_id, shape) if shape else None
+        if entry is None:
+            return None
+        try:
+            pairs = self.query(tenant_id, entry, query.function, query.unit, query.order, query.limit)
+        except sqlite3.Error as e:
+            logger.warning(f"Rollup {entry['table']} unreadable for tenant {tenant_id}, using the database: {e}")
+            return None
+        logger.info(f"📦 Answered aggregate for tenant {tenant_id} from rollup {entry['table']}")
+        refreshed_at = datetime.utcfromtimestamp(entry["refreshed_at"]).isoformat()
+        if query.group_first:
+            return [{query.group_key: g, query.value_key: v} for g, v in pairs], refreshed_at
+        return [{query.value_key: v, query.group_key: g} for g, v in pairs], refreshed_at
+
+    # Materialization
+
+    def refresh_tenant(self, tenant_id: str, user_id: int, db: Session, engine=None) -> List[RollupShape]:
+        """Discover shapes, then (re)build rollups that are popular enough and due; returns refreshed shapes"""
+        self.discover(tenant_id, db)
+        catalog = self._catalog(tenant_id)
+        with self._state_lock:
+            skipped = set(self.too_large.get(tenant_id, ()))
+            counts = self.hits.get(tenant_id, Counter()).most_common()
+        popular = [shape for shape, count in counts if count >= self.min_hits and shape not in skipped]
+        wanted = list(dict.fromkeys(list(catalog) + popular))[:self.max_rollups_per_tenant]
+        now = time.time()
+        due = [shape for shape in wanted if shape not in catalog or now - catalog[shape]["refreshed_at"] >= self.refresh_seconds]
+        if not due:
+            return []
+
+        conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
+        engine = engine or self.db_service.get_engine(tenant_id, user_id, db)
+        if not conn_record or not engine:
+            return []
+        refreshed = []
+        for shape in due:
+            try:
+                if self._materialize(tenant_id, conn_record, engine, shape):
+                    refreshed.append(shape)
+            except Exception as e:
+                logger.warning(f"Rollup refresh failed for tenant {tenant_id} {shape}: {e}")
+        return refreshed
+
+    def _materialize(self, tenant_id: str, conn_record, engine, shape: RollupShape) -> bool:
+        schema = self.schema_service.get_schema(tenant_id)
+        if schema is None or shape.table not in schema:
+            return False
+        types = {c['name']: c['type'] for c in schema[shape.table]['columns']}
+        numeric = bool(shape.measure and NUMERIC_TYPE.search(types.get(shape.measure, "")))
+        timeout_ms = self.query_executor.resolve_timeout_ms(conn_record)
+
+        if conn_record.db_type == 'mongodb':
+            rows = self.query_executor.execute_mongo(
+                engine, conn_record.database_name or "test", shape.table,
+                self._source_pipeline(shape, numeric),
+                tenant_id=tenant_id, timeout_ms=timeout_ms
+            )
+            rows = [{**row, "g": row.get("_id")} for row in rows]
+        else:
+            rows = self.query_executor.execute_sql(
+                engine, self._source_sql(engine, conn_record.db_type, shape, numeric), conn_record.db_type,
+                tenant_id=tenant_id, timeout_ms=timeout_ms
+            )
+
+        if len(rows) > self.max_rows:
+            # Too many groups to be worth keeping; don't try this shape again
+            with self._state_lock:
+                self.too_large.setdefault(tenant_id, set()).add(shape)
+            self._drop(tenant_id, [shape])
+            logger.info(f"Rollup {shape} for tenant {tenant_id} exceeds {self.max_rows} groups, skipped")
+            return False
+
+        self._write(tenant_id, shape, rows)
+        with self._state_lock:
+            self.refreshes += 1
+        logger.info(f"📦 Refreshed rollup {shape.table}.{shape.column} ({shape.grain}) for tenant {tenant_id}: {len(rows)} groups")
+        return True
+
+    def _source_sql(self, engine, db_type: str, shape: RollupShape, numeric: bool) -> str:
+        quote = engine.dialect.identifier_preparer.quote_identifier
+        column = quote(shape.column)
+        if shape.grain == "day":
+            group = f"date_trunc('day', {column})" if db_type == 'postgresql' else f"DATE({column})"
+        else:
+            group = column
+        measure = quote(shape.measure) if shape.measure else None
+        return (
+            f"SELECT {group} AS g, COUNT(*) AS n, "
+            f"{f'COUNT({measure})' if measure else 'COUNT(*)'} AS ny, "
+            f"{f'SUM({measure})' if numeric else 'NULL'} AS s, "
+            f"{f'MIN({measure})' if measure else 'NULL'} AS mn, "
+            f"{f'MAX({measure})' if measure else 'NULL'} AS mx "
+            f"FROM {quote(shape.table)} GROUP BY {group} LIMIT {self.max_rows + 1}"
+        )
+
+    def _source_pipeline(self, shape: RollupShape, numeric: bool) -> List[dict]:
+        group = f"${shape.column}"
+        if shape.grain == "day":
+            group = {"$dateTrunc": {"date": group, "unit": "day"}}
+        measure = f"${shape.measure}" if shape.measure else None
+        return [
+            {"$group": {
+                "_id": group,
+                "n": {"$sum": 1},
+                "ny": {"$sum": {"$cond": [{"$gt": [measure, None]}, 1, 0]}} if measure else {"$sum": 1},
+                "s": {"$sum": measure} if numeric else {"$first": None},
+                "mn": {"$min": measure} if measure else {"$first": None},
+                "mx": {"$max": measure} if measure else {"$first": None}
+            }},
+            {"$limit": self.max_rows + 1}
+        ]
+
+    # Storage
+
+    def _path(self, tenant_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{re.sub(r'[^A-Za-z0-9_-]', '_', tenant_id)}.db")
+
+    @contextmanager
+    def _connect(self, tenant_id: str) -> Iterator[sqlite3.Connection]:
+        os.makedirs(self.storage_dir, exist_ok=True)
+        conn = sqlite3.connect(self._path(tenant_id), timeout=10, isolation_level=None)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollup_catalog (name TEXT PRIMARY KEY, source_table TEXT, source_column TEXT, "
+                "grain TEXT, measure TEXT, refreshed_at REAL, row_count INTEGER)"
+            )
+            yield conn
+        finally:
+            conn.close()
+
+    def _lock(self, tenant_id: str) -> threading.Lock:
+        with self._state_lock:
+            return self._locks.setdefault(tenant_id, threading.Lock())
+
+    def _table_name(self, shape: RollupShape) -> str:
+        return "r_" + hashlib.sha1(repr(tuple(shape)).encode()).hexdigest()[:16]
+
+    def _catalog(self, tenant_id: str) -> Dict[RollupShape, dict]:
+        """Snapshot of the tenant's catalog, read from its file on first use"""
+        with self._state_lock:
+            catalog = self.catalogs.get(tenant_id)
+            if catalog is not None:
+                return dict(catalog)
+        loaded = {}
+        if os.path.exists(self._path(tenant_id)):
+            # Rollups built by another worker (or before a restart)
+            with self._connect(tenant_id) as conn:
+                for name, table, column, grain, measure, refreshed_at, row_count in conn.execute(
+                    "SELECT name, source_table, source_column, grain, measure, refreshed_at, row_count FROM rollup_catalog"
+                ):
+                    loaded[RollupShape(table, column, grain, measure)] = {
+                        "table": name, "refreshed_at": refreshed_at, "rows": row_count
+                    }
+        with self._state_lock:
+            return dict(self.catalogs.setdefault(tenant_id, loaded))
+
+    def _write(self, tenant_id: str, shape: RollupShape, rows: List[dict]):
+        name = self._table_name(shape)
+        values = [tuple(_sqlite_value(row.get(key)) for key in ("g", "n", "ny", "s", "mn", "mx")) for row in rows]
+        refreshed_at = time.time()
+        with self._lock(tenant_id), self._connect(tenant_id) as conn:
+            # Build aside and swap in one transaction so readers never see a half-written rollup
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f'DROP TABLE IF EXISTS "{name}_new"')
+                conn.execute(f'CREATE TABLE "{name}_new" (g, n INTEGER, ny INTEGER, s REAL, mn, mx)')
+                conn.executemany(f'INSERT INTO "{name}_new" VALUES (?, ?, ?, ?, ?, ?)', values)
+                conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                conn.execute(f'ALTER TABLE "{name}_new" RENAME TO "{name}"')
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_catalog VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, shape.table, shape.column, shape.grain, shape.measure, refreshed_at, len(values))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._catalog(tenant_id)
+        with self._state_lock:
+            self.catalogs.setdefault(tenant_id, {})[shape] = {"table": name, "refreshed_at": refreshed_at, "rows": len(values)}
+
+    def _drop(self, tenant_id: str, shapes: List[RollupShape]):
+        self._catalog(tenant_id)
+        with self._state_lock:
+            catalog = self.catalogs.get(tenant_id, {})
+            names = [catalog.pop(shape)["table"] for shape in shapes if shape in catalog]
+        if not names:
+            return
+        with self._lock(tenant_id), self._connect(tenant_id) as conn:
+            for name in names:
+                conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                conn.execute("DELETE FROM rollup_catalog WHERE name = ?", (name,))
+
+    def invalidate(self, tenant_id: str, tables: List[str]):
+        """Drop rollups over tables whose definition changed (schema change listener)"""
+        changed = {table.lower() for table in tables}
+        self._drop(tenant_id, [shape for shape in self._catalog(tenant_id) if shape.table.lower() in changed])
+
+    def remove_tenant(self, tenant_id: str):
+        """Forget everything for a disconnected tenant, including its rollup file"""
+        with self._state_lock:
+            self.hits.pop(tenant_id, None)
+            self.catalogs.pop(tenant_id, None)
+            self.too_large.pop(tenant_id, None)
+            self._history_cursor.pop(tenant_id, None)
+        with self._lock(tenant_id):
+            try:
+                os.remove(self._path(tenant_id))
+            except FileNotFoundError:
+                pass
+        with self._state_lock:
+            self._locks.pop(tenant_id, None)
+
+    # Scheduling
+
+    def run_once(self) -> Dict[str, List[RollupShape]]:
+        """Refresh rollups for every tenant with a live engine in this worker"""
+        tenants = self.db_service.get_active_connections()
+        if not tenants:
+            return {}
+
+        from app.models import TenantConnection
+        results = {}
+        db = self._new_session()
+        try:
+            owners = dict(
+                db.query(TenantConnection.tenant_id, TenantConnection.user_id)
+                .filter(TenantConnection.tenant_id.in_(tenants))
+                .all()
+            )
+            for tenant_id in tenants:
+                # peek() leaves LRU order alone so refreshes never keep an idle pool alive
+                engine = self.db_service.registry.peek(tenant_id)
+                if engine is None or tenant_id not in owners:
+                    continue
+                try:
+                    results[tenant_id] = self.refresh_tenant(tenant_id, owners[tenant_id], db, engine=engine)
+                except Exception as e:
+                    logger.error(f"Rollup pass failed for tenant {tenant_id}: {e}")
+        finally:
+            db.close()
+        return results
+
+    def start(self, tick_seconds: int = 60):
+        """Start a daemon thread that refreshes due rollups every tick_seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def refresh():
+            while not self._stop.wait(tick_seconds):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Rollup refresh pass failed: {e}")
+
+        self._thread = threading.Thread(target=refresh, name="rollup-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        with self._state_lock:
+            return {
+                "tenants": len(self.catalogs),
+                "rollups": sum(len(catalog) for catalog in self.catalogs.values()),
+                "tracked_shapes": sum(len(hits) for hits in self.hits.values()),
+                "refreshes": self.refreshes,
+                "served": self.served
+            }
+
+
+def _sqlite_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
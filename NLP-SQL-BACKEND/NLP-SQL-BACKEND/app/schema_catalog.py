@@ -0,0 +1,224 @@
+from sqlalchemy import text, bindparam
+from typing import Dict, Optional, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogExtractor:
+    """
+    Pulls a whole schema from the system catalog in a handful of queries.
+    Produces the same per-table shape as the inspector path in SchemaExtractor:
+    {table: {'columns', 'relations', 'indexes', 'row_count'}}.
+    Row counts come from planner statistics, never from COUNT(*).
+    """
+
+    TABLES_SQL = ""
+    COLUMNS_SQL = ""
+    FOREIGN_KEYS_SQL = ""
+    INDEXES_SQL = ""
+    CHECKSUM_SQL = ""
+    # Column that each query filters on when only some tables are requested
+    TABLE_FILTER_COLUMN: Dict[str, str] = {}
+
+    def table_checksums(self, conn) -> Dict[str, str]:
+        """Per-table checksum of the catalog definition, computed server-side in one query"""
+        return {row[0]: row[1] for row in self._run(conn, "CHECKSUM_SQL", None)}
+
+    def list_tables(self, conn) -> Dict[str, int]:
+        """Table name -> estimated row count (-1 when the planner has no estimate)"""
+        rows = self._run(conn, "TABLES_SQL", None)
+        return {row[0]: self._row_estimate(row[1]) for row in rows}
+
+    def extract(self, conn, tables: Optional[List[str]] = None, estimates: Optional[Dict[str, int]] = None) -> dict:
+        """
+        Extract columns, foreign keys and indexes for all (or the given) tables.
+        Pass `estimates` from a previous list_tables() call to skip re-listing.
+        """
+        if estimates is None:
+            estimates = self.list_tables(conn)
+        if tables is not None:
+            wanted = set(tables)
+            estimates = {name: count for name, count in estimates.items() if name in wanted}
+        schema = {
+            name: {'columns': [], 'relations': [], 'indexes': [], 'row_count': count}
+            for name, count in estimates.items()
+        }
+        table_filter = list(schema.keys()) if tables is not None else None
+        if table_filter == []:
+            return schema
+
+        for row in self._run(conn, "COLUMNS_SQL", table_filter):
+            table = schema.get(row[0])
+            if table is not None:
+                table['columns'].append({
+                    'name': row[1],
+                    'type': row[2],
+                    'nullable': bool(row[3]),
+                    'primary_key': bool(row[4])
+                })
+
+        for row in self._run(conn, "FOREIGN_KEYS_SQL", table_filter):
+            table = schema.get(row[0])
+            if table is not None:
+                table['relations'].append({
+                    'column': row[1],
+                    'references_table': row[2],
+                    'references_column': row[3]
+                })
+
+        indexes: Dict[tuple, dict] = {}
+        for row in self._run(conn, "INDEXES_SQL", table_filter):
+            table = schema.get(row[0])
+            if table is None:
+                continue
+            key = (row[0], row[1])
+            if key not in indexes:
+                indexes[key] = {'name': row[1], 'columns': [], 'unique': bool(row[2])}
+                table['indexes'].append(indexes[key])
+            indexes[key]['columns'].append(row[3])
+
+        return schema
+
+    def _run(self, conn, query_name: str, tables: Optional[List[str]]):
+        sql = getattr(self, query_name)
+        if tables is None:
+            return conn.execute(text(sql)).fetchall()
+        column = self.TABLE_FILTER_COLUMN[query_name]
+        statement = text(self._with_filter(sql, column)).bindparams(bindparam("tables", expanding=True))
+        return conn.execute(statement, {"tables": tables}).fetchall()
+
+    def _with_filter(self, sql: str, column: str) -> str:
+        """Insert `AND column IN (...)` before the trailing GROUP BY / ORDER BY, if any"""
+        upper = sql.upper()
+        cut = len(sql)
+        for clause in (" GROUP BY ", " ORDER BY "):
+            pos = upper.find(clause)
+            if pos != -1:
+                cut = min(cut, pos)
+        return f"{sql[:cut]} AND {column} IN :tables{sql[cut:]}"
+
+    def _row_estimate(self, value) -> int:
+        if value is None:
+            return -1
+        value = int(value)
+        return value if value >= 0 else -1
+
+
+class PostgresCatalogExtractor(CatalogExtractor):
+    """pg_catalog queries scoped to current_schema(); counts from pg_class.reltuples"""
+
+    TABLES_SQL = (
+        "SELECT c.relname, c.reltuples FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')"
+    )
+    COLUMNS_SQL = (
+        "SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull, "
+        "COALESCE(pk.indisprimary, false) "
+        "FROM pg_attribute a "
+        "JOIN pg_class c ON c.oid = a.attrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "LEFT JOIN pg_index pk ON pk.indrelid = c.oid AND pk.indisprimary AND a.attnum = ANY(pk.indkey::int2[]) "
+        "WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') "
+        "AND a.attnum > 0 AND NOT a.attisdropped "
+        "ORDER BY c.relname, a.attnum"
+    )
+    FOREIGN_KEYS_SQL = (
+        "SELECT cl.relname, att.attname, rcl.relname, ratt.attname "
+        "FROM pg_constraint con "
+        "JOIN pg_class cl ON cl.oid = con.conrelid "
+        "JOIN pg_namespace n ON n.oid = cl.relnamespace "
+        "JOIN pg_class rcl ON rcl.oid = con.confrelid "
+        "JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1] "
+        "JOIN pg_attribute ratt ON ratt.attrelid = con.confrelid AND ratt.attnum = con.confkey[1] "
+        "WHERE con.contype = 'f' AND n.nspname = current_schema() "
+        "ORDER BY cl.relname, con.conname"
+    )
+    INDEXES_SQL = (
+        "SELECT t.relname, i.relname, ix.indisunique, a.attname "
+        "FROM pg_index ix "
+        "JOIN pg_class t ON t.oid = ix.indrelid "
+        "JOIN pg_class i ON i.oid = ix.indexrelid "
+        "JOIN pg_namespace n ON n.oid = t.relnamespace "
+        "CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord) "
+        "JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum "
+        "WHERE n.nspname = current_schema() AND NOT ix.indisprimary "
+        "ORDER BY t.relname, i.relname, k.ord"
+    )
+    CHECKSUM_SQL = (
+        "SELECT c.relname, md5("
+        "COALESCE((SELECT string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text, ',' ORDER BY a.attnum) "
+        "FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped), '') || '|' || "
+        "COALESCE((SELECT string_agg(con.conname || ':' || con.contype, ',' ORDER BY con.conname) "
+        "FROM pg_constraint con WHERE con.conrelid = c.oid), '') || '|' || "
+        "COALESCE((SELECT string_agg(i.relname, ',' ORDER BY i.relname) "
+        "FROM pg_index ix JOIN pg_class i ON i.oid = ix.indexrelid WHERE ix.indrelid = c.oid), '')) "
+        "FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')"
+    )
+    TABLE_FILTER_COLUMN = {
+        "TABLES_SQL": "c.relname",
+        "COLUMNS_SQL": "c.relname",
+        "FOREIGN_KEYS_SQL": "cl.relname",
+        "INDEXES_SQL": "t.relname"
+    }
+
+
+class MySQLCatalogExtractor(CatalogExtractor):
+    """information_schema queries scoped to DATABASE(); counts from tables.table_rows"""
+
+    TABLES_SQL = (
+        "SELECT table_name, table_rows FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'"
+    )
+    COLUMNS_SQL = (
+        "SELECT table_name, column_name, column_type, is_nullable = 'YES', column_key = 'PRI' "
+        "FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() "
+        "ORDER BY table_name, ordinal_position"
+    )
+    FOREIGN_KEYS_SQL = (
+        "SELECT table_name, column_name, referenced_table_name, referenced_column_name "
+        "FROM information_schema.key_column_usage "
+        "WHERE table_schema = DATABASE() AND referenced_table_name IS NOT NULL AND ordinal_position = 1 "
+        "ORDER BY table_name, constraint_name"
+    )
+    INDEXES_SQL = (
+        "SELECT table_name, index_name, non_unique = 0, column_name "
+        "FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND index_name <> 'PRIMARY' "
+        "ORDER BY table_name, index_name, seq_in_index"
+    )
+    # XOR of a 64-bit hash per column and per index entry: no GROUP_CONCAT, so no silent
+    # truncation at group_concat_max_len on wide tables; positions keep reorders visible
+    CHECKSUM_SQL = (
+        "SELECT c.table_name, MD5(CONCAT_WS(':', COUNT(*), "
+        "BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS(':', c.ordinal_position, c.column_name, c.column_type, "
+        "c.is_nullable, c.column_key)), 16), 16, 10) AS UNSIGNED)), "
+        "(SELECT BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS(':', s.index_name, s.seq_in_index, s.column_name, "
+        "s.non_unique)), 16), 16, 10) AS UNSIGNED)) FROM information_schema.statistics s "
+        "WHERE s.table_schema = c.table_schema AND s.table_name = c.table_name))) "
+        "FROM information_schema.columns c "
+        "WHERE c.table_schema = DATABASE() "
+        "GROUP BY c.table_name, c.table_schema"
+    )
+    TABLE_FILTER_COLUMN = {
+        "TABLES_SQL": "table_name",
+        "COLUMNS_SQL": "table_name",
+        "FOREIGN_KEYS_SQL": "table_name",
+        "INDEXES_SQL": "table_name"
+    }
+
+
+CATALOG_EXTRACTORS = {
+    "postgresql": PostgresCatalogExtractor,
+    "mysql": MySQLCatalogExtractor,
+}
+
+
+def get_catalog_extractor(dialect_name: str) -> Optional[CatalogExtractor]:
+    """Bulk extractor for a SQLAlchemy dialect, or None to use the inspector fallback"""
+    extractor_cls = CATALOG_EXTRACTORS.get(dialect_name)
+    return extractor_cls() if extractor_cls else None
@@ -0,0 +1,145 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Optional, List, Callable, Tuple
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaDriftWatcher:
+    """
+    Detects schema drift for tenants with a live engine in this worker.
+    Each tenant is checked on its own jittered schedule by comparing cheap per-table
+    catalog checksums; only drifted tables are re-inspected, and listeners on the
+    schema service invalidate whatever depended on them. Tenants whose schema stays
+    stable back off up to max_interval_seconds.
+    """
+
+    def __init__(
+        self,
+        db_service,
+        schema_service,
+        interval_seconds: int = 300,
+        max_interval_seconds: int = 3600,
+        jitter: float = 0.2,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        self.db_service = db_service
+        self.schema_service = schema_service
+        self.interval_seconds = interval_seconds
+        self.max_interval_seconds = max(max_interval_seconds, interval_seconds)
+        self.jitter = jitter
+        self._session_factory = session_factory
+        self._schedule: Dict[str, Tuple[float, float]] = {} # tenant_id -> (next_due, current_interval)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.checks = 0
+        self.drifts = 0
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _jittered(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def due_tenants(self, now: Optional[float] = None) -> List[str]:
+        """Active tenants whose next check is due (newly seen tenants are scheduled, not checked)"""
+        now = time.monotonic() if now is None else now
+        active = [t for t in self.db_service.get_active_connections() if self.schema_service.get_schema_version(t)]
+        for tenant_id in set(self._schedule) - set(active):
+            del self._schedule[tenant_id]
+
+        due = []
+        for tenant_id in active:
+            entry = self._schedule.get(tenant_id)
+            if entry is None:
+                # Spread first checks over one interval so tenants connected together don't check together
+                self._schedule[tenant_id] = (now + random.uniform(0, self.interval_seconds), self.interval_seconds)
+            elif entry[0] <= now:
+                due.append(tenant_id)
+        return due
+
+    def check_tenant(self, tenant_id: str, user_id: int, db: Session) -> Optional[dict]:
+        """Compare checksums for one tenant and refresh drifted tables"""
+        # peek() leaves LRU order alone so drift checks never keep an idle pool alive
+        engine = self.db_service.registry.peek(tenant_id)
+        if engine is None:
+            self._schedule.pop(tenant_id, None)
+            return None
+
+        self.checks += 1
+        result = self.schema_service.refresh_schema(tenant_id, user_id, db, engine=engine, allow_full=False)
+        drifted = bool(result and (result["changed"] or result["removed"]))
+        _, interval = self._schedule.get(tenant_id, (0.0, self.interval_seconds))
+        if drifted:
+            self.drifts += 1
+            interval = self.interval_seconds
+            logger.info(f"🔀 Schema drift for tenant {tenant_id}: changed={result['changed']} removed={result['removed']}")
+        else:
+            interval = min(interval * 2, self.max_interval_seconds)
+        self._schedule[tenant_id] = (time.monotonic() + self._jittered(interval), interval)
+        return result
+
+    def run_once(self) -> Dict[str, Optional[dict]]:
+        """Check every due tenant once"""
+        due = self.due_tenants()
+        if not due:
+            return {}
+
+        from app.models import TenantConnection
+        results = {}
+        db = self._new_session()
+        try:
+            owners = dict(
+                db.query(TenantConnection.tenant_id, TenantConnection.user_id)
+                .filter(TenantConnection.tenant_id.in_(due))
+                .all()
+            )
+            for tenant_id in due:
+                if tenant_id not in owners:
+                    self._schedule.pop(tenant_id, None)
+                    continue
+                try:
+                    results[tenant_id] = self.check_tenant(tenant_id, owners[tenant_id], db)
+                except Exception as e:
+                    logger.error(f"Schema drift check failed for tenant {tenant_id}: {e}")
+                    _, interval = self._schedule.get(tenant_id, (0.0, self.interval_seconds))
+                    self._schedule[tenant_id] = (time.monotonic() + self._jittered(interval), interval)
+        finally:
+            db.close()
+        return results
+
+    def start(self, tick_seconds: int = 15):
+        """Start a daemon thread that checks due tenants every tick_seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(tick_seconds):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Schema drift pass failed: {e}")
+
+        self._thread = threading.Thread(target=watch, name="schema-drift-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        schedule = list(self._schedule.values())
+        return {
+            "tenants_scheduled": len(schedule),
+            "checks": self.checks,
+            "drifts": self.drifts,
+            "next_check_in_seconds": round(max(0.0, min(due for due, _ in schedule) - now), 1) if schedule else None,
+            "backed_off_tenants": sum(1 for _, interval in schedule if interval > self.interval_seconds)
+        }
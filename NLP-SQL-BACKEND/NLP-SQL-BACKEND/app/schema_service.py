@@ -1,166 +1,606 @@
 from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 import pymongo
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Optional, List, Callable, Tuple, Mapping
+import hashlib
+import json
+import re
+import threading
+import time
 import logging
+from app.schema_catalog import get_catalog_extractor
+from app.mongo_schema import MongoSchemaInferrer
+from app.compact_schema import CompactSchema, CompactTable, compact_tables
+from app.metrics import metrics, SCHEMA_SECONDS
+from app.tracing import traced, annotate
 
 logger = logging.getLogger(__name__)
 
+class ExtractionProgress:
+    """
+    Tracks one tenant's schema extraction so callers can poll it or wait on it
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETE = "complete"
+    FAILED = "failed"
+    
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.state = self.PENDING
+        self.table_names: List[str] = []
+        self.extracted_tables = set()
+        self.failed_tables: List[str] = []
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.done = threading.Event()
+    
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+    
+    def start(self, table_names: List[str]):
+        self.table_names = list(table_names)
+        self.state = self.RUNNING
+    
+    def finish(self, error: Optional[str] = None):
+        self.state = self.FAILED if error else self.COMPLETE
+        self.error = error
+        self.finished_at = datetime.utcnow()
+        self.done.set()
+    
+    def to_dict(self) -> dict:
+        return {
+            "tenant_id": self.tenant_id,
+            "state": self.state,
+            "tables_total": len(self.table_names) if self.state != self.PENDING else None,
+            "tables_extracted": len(self.extracted_tables),
+            "failed_tables": list(self.failed_tables),
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
 class SchemaExtractor:
     """
     Extracts database schema (tables, columns, relationships)
+    Tables (or Mongo collections) are extracted in parallel chunks and published
+    as they complete, so a partial schema is usable before extraction finishes.
+    Finished schemas are persisted as versioned snapshots in the system DB, so any
+    worker can load them lazily instead of re-extracting after a restart.
     """
     
-    def __init__(self, db_service):
+    def __init__(
+        self,
+        db_service,
+        max_workers: int = 4,
+        chunk_size: int = 50,
+        max_concurrent_extractions: int = 4,
+        partial_wait_seconds: float = 10.0,
+        snapshot_check_seconds: float = 5.0,
+        session_factory: Optional[Callable[[], Session]] = None,
+        mongo_inferrer: Optional[MongoSchemaInferrer] = None
+    ):
         self.db_service = db_service
-        self.schemas: Dict[str, dict] = {}
+        self.mongo_inferrer = mongo_inferrer or MongoSchemaInferrer()
+        self.schemas: Dict[str, CompactSchema] = {}
+        self.versions: Dict[str, str] = {} # tenant_id -> snapshot fingerprint
+        self.checksums: Dict[str, Dict[str, str]] = {} # tenant_id -> per-table catalog checksums
+        self.progress: Dict[str, ExtractionProgress] = {}
+        self._session_factory = session_factory
+        self._change_listeners: List[Callable[[str, List[str]], None]] = []
+        self._refresh_lock = threading.Lock()
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.partial_wait_seconds = partial_wait_seconds
+        self.snapshot_check_seconds = snapshot_check_seconds
+        self._snapshot_checked: Dict[str, float] = {} # tenant_id -> monotonic time of the last fingerprint check
+        self._background = ThreadPoolExecutor(
+            max_workers=max_concurrent_extractions,
+            thread_name_prefix="schema-extraction"
+        )
         logger.info("SchemaExtractor initialized")
     
-    def extract_and_store_schema(self, tenant_id: str, user_id: int, db: Session) -> Optional[dict]:
-        """Extract complete schema from tenant's database"""
+    def start_extraction(self, tenant_id: str, user_id: int) -> ExtractionProgress:
+        """Queue a background extraction and return its progress handle immediately"""
+        progress = ExtractionProgress(tenant_id)
+        self.progress[tenant_id] = progress
+        self._background.submit(self._extract_in_background, tenant_id, user_id, progress)
+        return progress
+    
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+    
+    @traced("SchemaExtractor.extract")
+    def _extract_in_background(self, tenant_id: str, user_id: int, progress: ExtractionProgress):
+        # The request session is closed by the time this runs, so use our own
+        db = self._new_session()
+        try:
+            with SCHEMA_SECONDS.time(operation="extract", tenant=metrics.tenant_label(tenant_id)):
+                self._extract(tenant_id, user_id, db, progress)
+        finally:
+            db.close()
+    
+    @traced("SchemaExtractor.extract")
+    def extract_and_store_schema(self, tenant_id: str, user_id: int, db: Session) -> Optional[Mapping]:
+        """Extract complete schema from tenant's database (blocks until done)"""
+        progress = ExtractionProgress(tenant_id)
+        self.progress[tenant_id] = progress
+        with SCHEMA_SECONDS.time(operation="extract", tenant=metrics.tenant_label(tenant_id)):
+            return self._extract(tenant_id, user_id, db, progress)
+    
+    def _extract(self, tenant_id: str, user_id: int, db: Session, progress: ExtractionProgress) -> Optional[Mapping]:
+        progress.started_at = datetime.utcnow()
         try:
             engine = self.db_service.get_engine(tenant_id, user_id=user_id, db=db)
             if not engine:
                 logger.error(f"No engine found for tenant {tenant_id} (user {user_id})")
+                progress.finish(error="Connection not found")
                 return None
             
-            if isinstance(engine, pymongo.MongoClient):
-                schema = self._extract_mongodb_schema(engine, tenant_id, db, user_id)
-            else:
-                inspector = inspect(engine)
-                schema = {}
-                tables = inspector.get_table_names()
-                logger.info(f"Found {len(tables)} tables for tenant {tenant_id}")
-                
-                for table_name in tables:
-                    columns = []
-                    for column in inspector.get_columns(table_name):
-                        columns.append({
-                            'name': column['name'],
-                            'type': str(column['type']),
-                            'nullable': column['nullable'],
-                            'primary_key': column.get('primary_key', False)
-                        })
-                    
-                    relations = []
-                    for fk in inspector.get_foreign_keys(table_name):
-                        relations.append({
-                            'column': fk['constrained_columns'][0],
-                            'references_table': fk['referred_table'],
-                            'references_column': fk['referred_columns'][0]
-                        })
-                    
-                    indexes = []
-                    for idx in inspector.get_indexes(table_name):
-                        indexes.append({
-                            'name': idx['name'],
-                            'columns': idx['column_names'],
-                            'unique': idx['unique']
-                        })
-                    
-                    schema[table_name] = {
-                        'columns': columns,
-                        'relations': relations,
-                        'indexes': indexes,
-                        'row_count': self._get_row_count(engine, table_name)
-                    }
+            chunks, run_chunk = self._plan(engine, tenant_id, db, user_id)
             
-            self.schemas[tenant_id] = schema
-            simplified = self._create_simplified_schema(schema)
-            self.schemas[f"{tenant_id}_simple"] = simplified
+            # Publish tables as they land only on first extraction; a re-extraction swaps at the end
+            publish_partial = self.schemas.get(tenant_id) is None
+            progress.start([name for chunk in chunks for name in chunk])
             
-            logger.info(f"✅ Schema extracted for tenant {tenant_id}")
-            return schema
+            def on_chunk(tables: Dict[str, CompactTable]):
+                if publish_partial and self.progress.get(tenant_id) is progress:
+                    self._store(tenant_id, tables)
+            
+            tables = self._fan_out(tenant_id, chunks, run_chunk, progress, on_chunk)
+            if progress.table_names and not tables:
+                raise RuntimeError("No tables could be extracted")
+            
+            if self.progress.get(tenant_id) is not progress:
+                # Tenant was disconnected (or re-extracted) while we were running
+                progress.finish(error="Superseded")
+                return None
+            
+            checksums = self._table_checksums(engine, tenant_id, db, user_id)
+            compact = self._publish(tenant_id, tables, checksums)
+            progress.finish()
+            
+            annotate({"tenant.id": tenant_id, "schema.tables": len(tables)})
+            logger.info(f"✅ Schema extracted for tenant {tenant_id} (version {compact.version})")
+            return compact.full
             
         except Exception as e:
             logger.error(f"Schema extraction failed: {e}")
+            progress.finish(error=str(e))
             return None
+    
+    def _fan_out(
+        self,
+        tenant_id: str,
+        chunks: List[List[str]],
+        run_chunk: Callable[[List[str]], dict],
+        progress: Optional[ExtractionProgress] = None,
+        on_chunk: Optional[Callable[[Dict[str, CompactTable]], None]] = None
+    ) -> Dict[str, CompactTable]:
+        """Run chunks on a bounded per-tenant pool, compacting and merging results as each completes"""
+        tables: Dict[str, CompactTable] = {}
+        if not chunks:
+            return tables
+        
+        workers = max(1, min(self.max_workers, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"schema-{tenant_id[:8]}") as pool:
+            futures = {pool.submit(run_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    part = future.result()
+                except Exception as e:
+                    logger.error(f"Schema chunk failed for tenant {tenant_id} ({len(chunk)} tables): {e}")
+                    if progress:
+                        progress.failed_tables.extend(chunk)
+                    continue
+                
+                tables.update(compact_tables(part))
+                if progress:
+                    progress.extracted_tables.update(part.keys())
+                if on_chunk:
+                    on_chunk(tables)
+        return tables
+    
+    def _store(self, tenant_id: str, tables: Dict[str, CompactTable], version: Optional[str] = None) -> CompactSchema:
+        # Publish a fresh, read-only schema so readers never see one that is still being filled;
+        # the full and simplified forms are both views of it
+        compact = CompactSchema(dict(tables), version)
+        self.schemas[tenant_id] = compact
+        return compact
+    
+    def _publish(self, tenant_id: str, tables: Dict[str, CompactTable], checksums: Optional[Dict[str, str]]) -> CompactSchema:
+        """Publish a complete schema under its fingerprint and persist the snapshot"""
+        schema = {name: table.to_dict() for name, table in tables.items()}
+        version = self._fingerprint(schema)
+        compact = self._store(tenant_id, tables, version)
+        self._save_snapshot(tenant_id, schema, checksums, version)
+        return compact
+    
+    def add_change_listener(self, listener: Callable[[str, List[str]], None]):
+        """Call listener(tenant_id, tables) whenever a refresh changes or removes tables"""
+        self._change_listeners.append(listener)
+    
+    def _notify_change(self, tenant_id: str, tables: List[str]):
+        for listener in self._change_listeners:
+            try:
+                listener(tenant_id, tables)
+            except Exception as e:
+                logger.error(f"Schema change listener failed for tenant {tenant_id}: {e}")
+    
+    @traced("SchemaExtractor.refresh")
+    def refresh_schema(
+        self,
+        tenant_id: str,
+        user_id: int,
+        db: Session,
+        engine=None,
+        allow_full: bool = True
+    ) -> Optional[dict]:
+        """
+        Bring a tenant's schema up to date by comparing cheap per-table catalog checksums
+        and re-inspecting only the tables that changed. Falls back to a full extraction
+        when there is no snapshot or the database has no cheap checksum (unless allow_full is False).
+        Returns {'mode', 'changed', 'removed', 'version'} or None if the tenant is unavailable.
+        """
+        if engine is None:
+            engine = self.db_service.get_engine(tenant_id, user_id=user_id, db=db)
+        if not engine:
+            return None
+        
+        with self._refresh_lock, SCHEMA_SECONDS.time(operation="refresh", tenant=metrics.tenant_label(tenant_id)):
+            result = self._refresh(tenant_id, user_id, db, engine, allow_full)
+        if result and (result["changed"] or result["removed"]):
+            self._notify_change(tenant_id, result["changed"] + result["removed"])
+        return result
+    
+    def _refresh(self, tenant_id: str, user_id: int, db: Session, engine, allow_full: bool) -> Optional[dict]:
+        progress = self.progress.get(tenant_id)
+        if progress is not None and not progress.finished:
+            return {"mode": "running", "changed": [], "removed": [], "version": self.versions.get(tenant_id)}
+        
+        current = self.get_schema(tenant_id)
+        current_tables = self.schemas[tenant_id].tables if current is not None else {}
+        stored = self.checksums.get(tenant_id) or {}
+        checksums = self._table_checksums(engine, tenant_id, db, user_id)
+        
+        if current is None or not checksums or not stored:
+            if not allow_full:
+                return {"mode": "skipped", "changed": [], "removed": [], "version": self.versions.get(tenant_id)}
+            schema = self.extract_and_store_schema(tenant_id, user_id, db)
+            if schema is None:
+                return None
+            changed, removed = self._diff_tables(current or {}, schema)
+            return {"mode": "full", "changed": changed, "removed": removed, "version": self.versions.get(tenant_id)}
+        
+        changed = sorted(name for name, checksum in checksums.items() if stored.get(name) != checksum)
+        removed = sorted(set(stored) - set(checksums))
+        if not changed and not removed:
+            return {"mode": "incremental", "changed": [], "removed": [], "version": self.versions.get(tenant_id)}
+        
+        chunks, run_chunk = self._plan(engine, tenant_id, db, user_id, only=set(changed))
+        part = self._fan_out(tenant_id, chunks, run_chunk)
+        
+        dropped = set(removed) | set(part)
+        tables = {name: table for name, table in current_tables.items() if name not in dropped}
+        tables.update(part)
+        
+        # Tables that failed to re-inspect keep their old entry and lose their checksum, so the next refresh retries them
+        checksums = {name: checksum for name, checksum in checksums.items() if name in part or name not in changed}
+        
+        self._publish(tenant_id, tables, checksums)
+        logger.info(f"🔄 Schema refreshed for tenant {tenant_id}: {len(changed)} changed, {len(removed)} removed")
+        return {"mode": "incremental", "changed": changed, "removed": removed, "version": self.versions.get(tenant_id)}
+    
+    def _diff_tables(self, old: Mapping, new: Mapping) -> Tuple[List[str], List[str]]:
+        """(changed_or_added, removed) table names between two full schemas"""
+        changed = sorted(name for name in new if name not in old or self._table_hash(old[name]) != self._table_hash(new[name]))
+        removed = sorted(set(old) - set(new))
+        return changed, removed
+    
+    def _table_hash(self, table: dict) -> str:
+        """Content hash of a table's structure (row counts are volatile and excluded)"""
+        # Sampled field frequencies vary between runs and are not structure
+        columns = [{k: v for k, v in column.items() if k != 'frequency'} for column in table.get('columns', [])]
+        payload = {'columns': columns, 'relations': table.get('relations'), 'indexes': table.get('indexes')}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def _fingerprint(self, schema: dict) -> str:
+        """Content fingerprint of a whole schema, used as the schema version"""
+        digest = hashlib.sha256()
+        for name in sorted(schema):
+            digest.update(name.encode())
+            digest.update(self._table_hash(schema[name]).encode())
+        return digest.hexdigest()[:16]
+    
+    def _table_checksums(self, engine, tenant_id: str, db: Session, user_id: int) -> Optional[Dict[str, str]]:
+        """Cheap per-table checksums from the catalog, or None when the database has none"""
+        try:
+            if isinstance(engine, pymongo.MongoClient):
+                # Collections have no field catalog; index definitions are the cheap signal
+                conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
+                mongo_db = engine[conn_record.database_name or "test"]
+                checksums = {}
+                for name in mongo_db.list_collection_names():
+                    if name.startswith("system."):
+                        continue
+                    indexes = mongo_db[name].index_information()
+                    payload = json.dumps({key: value.get("key") for key, value in indexes.items()}, sort_keys=True, default=str)
+                    checksums[name] = hashlib.md5(payload.encode()).hexdigest()
+                return checksums
             
-    def _extract_mongodb_schema(self, client: pymongo.MongoClient, tenant_id: str, db: Session, user_id: int) -> dict:
-        """Extract schema from MongoDB collections"""
-        from app.models import TenantConnection
-        conn_record = db.query(TenantConnection).filter(
-            TenantConnection.tenant_id == tenant_id,
-            TenantConnection.user_id == user_id
-        ).first()
+            extractor = get_catalog_extractor(engine.dialect.name)
+            if extractor is None:
+                return None
+            with engine.connect() as conn:
+                return extractor.table_checksums(conn)
+        except Exception as e:
+            logger.warning(f"Could not compute catalog checksums for tenant {tenant_id}: {e}")
+            return None
+    
+    def _save_snapshot(self, tenant_id: str, schema: dict, checksums: Optional[Dict[str, str]], fingerprint: str):
+        """Persist the schema snapshot so other workers (and restarts) can load it"""
+        from app.models import TenantSchema
+        self.versions[tenant_id] = fingerprint
+        self.checksums[tenant_id] = checksums or {}
+        session = None
+        try:
+            session = self._new_session()
+            session.merge(TenantSchema(
+                tenant_id=tenant_id,
+                fingerprint=fingerprint,
+                schema=schema,
+                table_checksums=checksums or {},
+                extracted_at=datetime.utcnow()
+            ))
+            session.commit()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            logger.warning(f"Failed to persist schema snapshot for tenant {tenant_id}: {e}")
+        finally:
+            if session is not None:
+                session.close()
+    
+    def _load_snapshot(self, tenant_id: str) -> bool:
+        """Load a persisted snapshot into memory; False if there is none"""
+        from app.models import TenantSchema
+        session = None
+        try:
+            session = self._new_session()
+            row = session.get(TenantSchema, tenant_id)
+            if row is None or not row.schema:
+                return False
+            self._store(tenant_id, compact_tables(row.schema), row.fingerprint)
+            self.versions[tenant_id] = row.fingerprint
+            self.checksums[tenant_id] = row.table_checksums or {}
+            logger.info(f"📦 Loaded schema snapshot for tenant {tenant_id} (version {row.fingerprint}, "
+                        f"extracted {row.extracted_at})")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load schema snapshot for tenant {tenant_id}: {e}")
+            return False
+        finally:
+            if session is not None:
+                session.close()
+    
+    def _snapshot_changed(self, tenant_id: str) -> bool:
+        """Whether another worker stored a different snapshot (checked at most every snapshot_check_seconds)"""
+        version = self.versions.get(tenant_id)
+        progress = self.progress.get(tenant_id)
+        if version is None or (progress is not None and not progress.finished):
+            return False
+        now = time.monotonic()
+        if now - self._snapshot_checked.get(tenant_id, float("-inf")) < self.snapshot_check_seconds:
+            return False
+        self._snapshot_checked[tenant_id] = now
+        from app.models import TenantSchema
+        session = None
+        try:
+            session = self._new_session()
+            stored = session.query(TenantSchema.fingerprint).filter(TenantSchema.tenant_id == tenant_id).scalar()
+            return stored is not None and stored != version
+        except Exception as e:
+            logger.warning(f"Failed to check schema snapshot for tenant {tenant_id}: {e}")
+            return False
+        finally:
+            if session is not None:
+                session.close()
+    
+    def _delete_snapshot(self, tenant_id: str):
+        from app.models import TenantSchema
+        session = None
+        try:
+            session = self._new_session()
+            session.query(TenantSchema).filter(TenantSchema.tenant_id == tenant_id).delete()
+            session.commit()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            logger.warning(f"Failed to delete schema snapshot for tenant {tenant_id}: {e}")
+        finally:
+            if session is not None:
+                session.close()
+    
+    def _chunked(self, names: List[str], size: int) -> List[List[str]]:
+        return [names[i:i + size] for i in range(0, len(names), size)]
+    
+    def _plan(self, engine, tenant_id: str, db: Session, user_id: int, only: Optional[set] = None):
+        if isinstance(engine, pymongo.MongoClient):
+            return self._plan_mongodb(engine, tenant_id, db, user_id, only)
+        return self._plan_sql(engine, tenant_id, only)
+    
+    def _plan_sql(self, engine, tenant_id: str, only: Optional[set] = None) -> Tuple[List[List[str]], Callable[[List[str]], dict]]:
+        """Split SQL tables (optionally only `only`) into chunks for the catalog extractor, or the inspector as a fallback"""
+        extractor = get_catalog_extractor(engine.dialect.name)
+        if extractor:
+            try:
+                with engine.connect() as conn:
+                    estimates = extractor.list_tables(conn)
+                if only is not None:
+                    estimates = {name: count for name, count in estimates.items() if name in only}
+                logger.info(f"Found {len(estimates)} tables for tenant {tenant_id} (catalog)")
+                
+                def run_catalog_chunk(chunk: List[str]) -> dict:
+                    try:
+                        with engine.connect() as conn:
+                            return extractor.extract(conn, tables=chunk, estimates=estimates)
+                    except Exception as e:
+                        logger.warning(f"Catalog extraction failed for tenant {tenant_id}, using inspector: {e}")
+                        return self._inspect_tables(engine, chunk)
+                
+                return self._chunked(sorted(estimates), self.chunk_size), run_catalog_chunk
+            except Exception as e:
+                logger.warning(f"Catalog extraction failed for tenant {tenant_id}, using inspector: {e}")
+        
+        tables = inspect(engine).get_table_names()
+        if only is not None:
+            tables = [name for name in tables if name in only]
+        logger.info(f"Found {len(tables)} tables for tenant {tenant_id}")
+        # Inspector calls are per table, so use smaller chunks to spread them across workers
+        size = max(1, min(self.chunk_size, -(-len(tables) // self.max_workers))) if tables else 1
+        return self._chunked(tables, size), lambda chunk: self._inspect_tables(engine, chunk)
+    
+    def _plan_mongodb(self, client: pymongo.MongoClient, tenant_id: str, db: Session, user_id: int, only: Optional[set] = None):
+        """One work unit per collection"""
+        conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
         
         db_name = conn_record.database_name or "test"
         mongo_db = client[db_name]
         
-        schema = {}
-        collections = mongo_db.list_collection_names()
+        # Skip system collections
+        collections = [c for c in mongo_db.list_collection_names() if not c.startswith("system.")]
+        if only is not None:
+            collections = [c for c in collections if c in only]
         logger.info(f"Found {len(collections)} collections in MongoDB {db_name}")
         
-        for coll_name in collections:
-            # Skip system collections
-            if coll_name.startswith("system."):
-                continue
-                
-            collection = mongo_db[coll_name]
-            # Sample a few documents to get fields
-            sample_docs = list(collection.find().limit(5))
+        def run_collection(chunk: List[str]) -> dict:
+            return {name: self.mongo_inferrer.infer(mongo_db[name]) for name in chunk}
+        
+        return self._chunked(collections, 1), run_collection
+    
+    def _inspect_tables(self, engine, tables: List[str]) -> dict:
+        """Generic per-table extraction through the SQLAlchemy inspector"""
+        # Inspectors cache per instance and are not shared between worker threads
+        inspector = inspect(engine)
+        schema = {}
+        
+        for table_name in tables:
+            columns = []
+            for column in inspector.get_columns(table_name):
+                columns.append({
+                    'name': column['name'],
+                    'type': str(column['type']),
+                    'nullable': column['nullable'],
+                    'primary_key': column.get('primary_key', False)
+                })
             
-            fields = {}
-            for doc in sample_docs:
-                for key, value in doc.items():
-                    if key not in fields:
-                        fields[key] = {
-                            'name': key,
-                            'type': type(value).__name__,
-                            'nullable': True,
-                            'primary_key': key == "_id"
-                        }
+            relations = []
+            for fk in inspector.get_foreign_keys(table_name):
+                relations.append({
+                    'column': fk['constrained_columns'][0],
+                    'references_table': fk['referred_table'],
+                    'references_column': fk['referred_columns'][0]
+                })
+            
+            indexes = []
+            for idx in inspector.get_indexes(table_name):
+                indexes.append({
+                    'name': idx['name'],
+                    'columns': idx['column_names'],
+                    'unique': idx['unique']
+                })
             
-            schema[coll_name] = {
-                'columns': list(fields.values()),
-                'relations': [],
-                'indexes': [], # We could extract indexes if needed
-                'row_count': collection.count_documents({})
+            schema[table_name] = {
+                'columns': columns,
+                'relations': relations,
+                'indexes': indexes,
+                'row_count': self._get_row_count(engine, table_name)
             }
         return schema
     
     def _get_row_count(self, engine, table_name: str) -> int:
-        """Get approximate row count for a table"""
+        """Get row count for a table (inspector fallback only; catalog extractors use planner stats)"""
         try:
+            quoted = engine.dialect.identifier_preparer.quote(table_name)
             with engine.connect() as conn:
-                result = conn.execute(text(f"SELECT COUNT(*) FROM {table_name}"))
+                result = conn.execute(text(f"SELECT COUNT(*) FROM {quoted}"))
                 return result.scalar()
-        except:
+        except Exception:
             return -1
     
-    def _create_simplified_schema(self, full_schema: dict) -> dict:
-        """Create a version for LLM prompts compatible with PromptBuilder"""
-        tables = {}
-        for table_name, table_info in full_schema.items():
-            columns = {}
-            for col in table_info['columns']:
-                columns[col['name']] = {'type': col['type']}
-            
-            relationships = []
-            for rel in table_info['relations']:
-                relationships.append({
-                    'column': rel['column'],
-                    'references': {
-                        'table': rel['references_table'],
-                        'column': rel['references_column']
-                    }
-                })
-            
-            tables[table_name] = {
-                'columns': columns,
-                'relationships': relationships
-            }
-        return {"tables": tables}
+    def get_schema(self, tenant_id: str, simplified: bool = False) -> Optional[Mapping]:
+        """
+        Read-only view of a tenant's schema (full or prompt-simplified), loading the
+        persisted snapshot if this worker has none or another worker has stored a newer one.
+        Callers check that the requester owns the tenant first.
+        """
+        compact = self.schemas.get(tenant_id)
+        if (compact is None or self._snapshot_changed(tenant_id)) and self._load_snapshot(tenant_id):
+            compact = self.schemas.get(tenant_id)
+        if compact is None:
+            return None
+        return compact.simplified if simplified else compact.full
+    
+    def get_schema_version(self, tenant_id: str) -> Optional[str]:
+        """Fingerprint of the tenant's current schema (None while a first extraction is partial)"""
+        if self._snapshot_changed(tenant_id):
+            self._load_snapshot(tenant_id)
+        return self.versions.get(tenant_id)
+    
+    def get_progress(self, tenant_id: str) -> Optional[dict]:
+        """Extraction status for a tenant (None if never extracted in this worker)"""
+        progress = self.progress.get(tenant_id)
+        return progress.to_dict() if progress else None
+    
+    @traced("SchemaExtractor.get_schema_for_question")
+    def get_schema_for_question(self, tenant_id: str, question: str) -> Optional[dict]:
+        """
+        Simplified schema for answering `question`.
+        While extraction is running, returns as soon as every table the question
+        mentions is available; otherwise waits (bounded) for extraction to finish.
+        """
+        progress = self.progress.get(tenant_id)
+        if progress is None or progress.finished:
+            return self.get_schema(tenant_id, simplified=True)
+        
+        needed = self._tables_mentioned(progress.table_names, question)
+        deadline = time.monotonic() + self.partial_wait_seconds
+        while not progress.finished:
+            if needed and needed <= progress.extracted_tables:
+                logger.info(f"Answering with partial schema for tenant {tenant_id} "
+                            f"({len(progress.extracted_tables)}/{len(progress.table_names)} tables)")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            progress.done.wait(min(remaining, 0.1))
+        return self.get_schema(tenant_id, simplified=True)
     
-    def get_schema(self, tenant_id: str, simplified: bool = False) -> Optional[dict]:
-        """Get schema for a tenant"""
-        key = f"{tenant_id}_simple" if simplified else tenant_id
-        return self.schemas.get(key)
+    def _tables_mentioned(self, table_names: List[str], question: str) -> set:
+        """Tables whose name (or a singular / spaced form of it) appears in the question"""
+        words = " " + " ".join(re.findall(r"[a-z0-9]+", question.lower())) + " "
+        mentioned = set()
+        for name in table_names:
+            base = name.lower().replace("_", " ")
+            forms = {base, base.rstrip("s"), base + "s"}
+            if any(form and f" {form} " in words for form in forms):
+                mentioned.add(name)
+        return mentioned
     
     def remove_schema(self, tenant_id: str):
         """Remove schema when tenant disconnects"""
-        if tenant_id in self.schemas:
-            del self.schemas[tenant_id]
-        if f"{tenant_id}_simple" in self.schemas:
-            del self.schemas[f"{tenant_id}_simple"]
+        self.progress.pop(tenant_id, None)
+        self.versions.pop(tenant_id, None)
+        self.checksums.pop(tenant_id, None)
+        self._snapshot_checked.pop(tenant_id, None)
+        self._delete_snapshot(tenant_id)
+        self.schemas.pop(tenant_id, None)
         logger.info(f"Schema removed for tenant {tenant_id}")
\ No newline at end of file
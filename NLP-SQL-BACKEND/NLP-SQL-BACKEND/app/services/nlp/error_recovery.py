@@ -1,3 +1,5 @@
+from typing import Optional
+
 class ErrorRecoveryService:
     """
     Handles one-time LLM retry when SQL execution fails.
@@ -7,12 +9,21 @@ class ErrorRecoveryService:
         self.llm_client = llm_client
         self.prompt_builder = prompt_builder
 
-    def attempt_repair(self, schema: dict, question: str, failed_sql: str, db_error: str) -> str:
+    def attempt_repair(
+        self,
+        schema: dict,
+        question: str,
+        failed_sql: str,
+        db_error: str,
+        cache_key: Optional[tuple] = None,
+        column_hints: Optional[dict] = None
+    ) -> str:
         """
         Sends failed SQL and DB error back to LLM to generate corrected SQL.
+        Reuses the schema text already rendered for cache_key.
         """
 
-        schema_text = self.prompt_builder._format_schema(schema)
+        schema_text = self.prompt_builder.format_schema(schema, cache_key, column_hints)
         repair_prompt = f"""
 You previously generated the following SQL query:
 
@@ -0,0 +1,377 @@
+import json
+import logging
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Any, Tuple
+
+from app.services.nlp.sql_validator import SQLValidator
+
+logger = logging.getLogger(__name__)
+
+RESULT_TABLE = "previous_result"
+
+# A refinement usually opens with one of these or points back at the last answer
+FOLLOWUP_CUE = re.compile(
+    r"^(?:now|then|and|also|but|ok(?:ay)?|only|just|sort|order|group|filter|limit|top|bottom|instead|exclude)\b"
+    r"|\b(?:that|those|these|them|same)\b",
+    re.IGNORECASE
+)
+# An explicit pointer at the last answer ("of those", "that result"); a bare "that" is usually a relative pronoun
+BACK_REFERENCE = re.compile(
+    r"\b(?:those|these|them|the same|previous|above)\b"
+    r"|\b(?:of|from|in|among|for|by)\s+(?:that|it)\b|\bthat\s+(?:result|list|table|answer|data)\b",
+    re.IGNORECASE
+)
+
+# Words a rule-based refinement may contain besides column names, values and numbers
+FILLER = {
+    "a", "about", "again", "all", "also", "an", "and", "are", "be", "but", "by", "can", "data", "for", "from",
+    "in", "is", "it", "just", "keep", "me", "now", "of", "ok", "okay", "on", "only", "please", "result",
+    "results", "rows", "same", "show", "that", "the", "them", "then", "these", "those", "to", "instead",
+    "with", "year", "where", "equals", "sort", "sorted", "order", "ordered", "rank", "ranked", "group",
+    "grouped", "filter", "filtered", "limit", "top", "first", "bottom", "desc", "descending", "asc",
+    "ascending", "highest", "lowest", "largest", "smallest", "biggest", "most", "least", "excluding",
+    "except", "without", "exclude", "during", "up"
+}
+DESCENDING = {"desc", "descending", "highest", "largest", "biggest", "most"}
+ASCENDING = {"asc", "ascending", "lowest", "smallest", "least"}
+NEGATIONS = {"excluding", "except", "without", "exclude"}
+FILTER_WORDS = {"only", "just", "where", "for", "in", "during"} | NEGATIONS
+YEAR = re.compile(r"^(19|20)\d\d$")
+ISO_DATE = re.compile(r"^\d{4}-\d{2}")
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def column_types(rows: List[Dict[str, Any]]) -> Dict[str, str]:
+    """SQLite column types for a result set, in first-seen column order"""
+    types: Dict[str, str] = {}
+    for row in rows:
+        for column, value in row.items():
+            seen = types.get(column)
+            if value is None or seen == "TEXT":
+                types.setdefault(column, None)
+                continue
+            if isinstance(value, (bool, int)):
+                kind = "INTEGER"
+            elif isinstance(value, (float, Decimal)):
+                kind = "REAL"
+            else:
+                kind = "TEXT"
+            if seen is None or kind == "TEXT":
+                types[column] = kind
+            elif seen != kind:
+                types[column] = "REAL"
+    return {column: kind or "TEXT" for column, kind in types.items()}
+
+
+def refers_to_previous(question: str, types: Dict[str, str]) -> bool:
+    """Whether the question points back at the last result or names one of its columns"""
+    if BACK_REFERENCE.search(question):
+        return True
+    words = " " + " ".join(re.findall(r"[a-z0-9]+", question.lower())) + " "
+    return any(
+        f" {name} " in words
+        for name in (" ".join(re.findall(r"[a-z0-9]+", column.lower())) for column in types) if name
+    )
+
+
+def _cell(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+class FollowUpPlanner:
+    """Rule-based translation of a refinement into SQL over the previous result"""
+
+    def __init__(self, rows: List[Dict[str, Any]], types: Dict[str, str]):
+        self.types = types
+        self.names = {self._norm(column): column for column in types}
+        self.values: Dict[str, Tuple[str, Any]] = {}
+        self.date_columns = []
+        self.year_columns = []
+        for column, kind in types.items():
+            if kind == "TEXT":
+                sample = [row.get(column) for row in rows[:50] if row.get(column) is not None]
+                if sample and all(ISO_DATE.match(str(value)) for value in sample):
+                    self.date_columns.append(column)
+                    continue
+                distinct = {str(row.get(column)) for row in rows if row.get(column) is not None}
+                if len(distinct) <= 1000:
+                    for value in distinct:
+                        self.values.setdefault(value.lower(), (column, value))
+            elif kind == "INTEGER" and "year" in column.lower():
+                self.year_columns.append(column)
+
+    @staticmethod
+    def _norm(text: str) -> str:
+        return re.sub(r"[\s_]+", "_", text.strip().lower())
+
+    def _match(self, words: List[str], start: int, lookup: dict) -> Tuple[Optional[Any], int]:
+        """Longest 1-3 word phrase at `start` found in lookup (plural 's' tolerated)"""
+        for size in (3, 2, 1):
+            if start + size > len(words):
+                continue
+            phrase = words[start:start + size]
+            for key in (" ".join(phrase), "_".join(phrase)):
+                for candidate in (key, key[:-1] if key.endswith("s") else None):
+                    if candidate and candidate in lookup:
+                        return lookup[candidate], size
+        return None, 0
+
+    def plan(self, question: str) -> Optional[str]:
+        words = re.findall(r"[\w\-']+", question.lower())
+        used = [False] * len(words)
+        filters, group, sort, descending, limit = [], None, None, None, None
+
+        for i, word in enumerate(words):
+            if used[i]:
+                continue
+            if word in ("group", "grouped", "sort", "sorted", "order", "ordered", "rank", "ranked"):
+                by = next((j for j in range(i + 1, min(i + 4, len(words))) if words[j] == "by"), None)
+                if by is None:
+                    continue
+                column, size = self._match(words, by + 1, self.names)
+                if column is None:
+                    return None
+                for j in range(i, by + 1 + size):
+                    used[j] = True
+                if word.startswith("group"):
+                    group = column
+                else:
+                    sort = column
+            elif word in ("top", "first", "bottom", "limit") and i + 1 < len(words):
+                count = words[i + 2] if words[i + 1] == "to" and i + 2 < len(words) else words[i + 1]
+                if count.isdigit():
+                    limit = int(count)
+                    if word == "bottom":
+                        descending = False
+                    elif word == "top" and descending is None:
+                        descending = True
+                    at = words.index(count, i)
+                    used[i] = used[at] = True
+                    # "top 5 by amount"
+                    if at + 2 < len(words) and words[at + 1] == "by":
+                        column, size = self._match(words, at + 2, self.names)
+                        if column is not None:
+                            sort = column
+                            for j in range(at + 1, at + 2 + size):
+                                used[j] = True
+            elif YEAR.match(word) and i > 0 and words[i - 1] in FILTER_WORDS | {"year"}:
+                if self.date_columns:
+                    filters.append(f"substr({quote(self.date_columns[0])}, 1, 4) = {literal(word)}")
+                elif self.year_columns:
+                    filters.append(f"{quote(self.year_columns[0])} = {int(word)}")
+                else:
+                    return None
+                used[i] = True
+            elif word in FILTER_WORDS and i + 1 < len(words):
+                start = i + 1
+                if words[start] in ("the", "where") and start + 1 < len(words):
+                    start += 1
+                # "where region is east" names the column before the value
+                column, size = self._match(words, start, self.names)
+                if column is not None and start + size + 1 < len(words) and words[start + size] in ("is", "=", "equals"):
+                    start += size + 1
+                match, size = self._match(words, start, self.values)
+                if match is None:
+                    continue
+                column, value = match
+                operator = "<>" if word in NEGATIONS else "="
+                filters.append(f"{quote(column)} {operator} {literal(value)}")
+                for j in range(i, start + size):
+                    used[j] = True
+
+        for i, word in enumerate(words):
+            if used[i]:
+                continue
+            if word in DESCENDING:
+                descending = True
+            elif word in ASCENDING:
+                descending = False
+            elif word not in FILLER:
+                # An unexplained word may ask for something the previous result doesn't have
+                return None
+        if not (filters or group or sort or limit):
+            return None
+
+        select, output = "*", list(self.types)
+        if group is not None:
+            measures = [
+                column for column, kind in self.types.items()
+                if kind in ("INTEGER", "REAL") and column != group
+                and column.lower() != "id" and not column.lower().endswith("_id") and column not in self.year_columns
+            ]
+            if measures:
+                select = ", ".join([quote(group)] + [f"SUM({quote(m)}) AS {quote(m)}" for m in measures])
+                output = [group] + measures
+            else:
+                select = f"{quote(group)}, COUNT(*) AS count"
+                output = [group, "count"]
+        if sort is None and limit is not None and descending is not None:
+            # "top 5" ranks by the first measure
+            sort = next((c for c in output if self.types.get(c) in ("INTEGER", "REAL") and c != group), None)
+        if sort is not None and sort not in output:
+            return None
+
+        sql = f"SELECT {select} FROM {RESULT_TABLE}"
+        if filters:
+            sql += " WHERE " + " AND ".join(filters)
+        if group is not None:
+            sql += f" GROUP BY {quote(group)}"
+        if sort is not None:
+            sql += f" ORDER BY {quote(sort)}" + (" DESC" if descending else "")
+        if limit is not None:
+            sql += f" LIMIT {limit}"
+        return sql
+
+
+class FollowUpService:
+    """
+    Answers refinements of a conversation's previous answer ("only for 2024",
+    "sort by amount", "group that by region") from the cached result, in an
+    in-memory SQLite table, without the LLM round trip or a tenant query.
+    """
+
+    def __init__(
+        self,
+        cache_service,
+        llm_client=None,
+        sql_validator: Optional[SQLValidator] = None,
+        max_rows: int = 10000,
+        ttl: int = 1800,
+        timeout_ms: int = 2000,
+        use_llm: bool = True
+    ):
+        self.cache_service = cache_service
+        self.llm_client = llm_client
+        self.sql_validator = sql_validator or SQLValidator()
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.timeout_ms = timeout_ms
+        self.use_llm = use_llm
+        self.answered = {"rules": 0, "llm": 0}
+        self.passed = 0
+
+    @staticmethod
+    def _key(user_id: int, conversation_id: str) -> str:
+        return f"conversation:{user_id}:{conversation_id}"
+
+    def remember(self, tenant_id: str, user_id: int, conversation_id: str, question: str, sql: Optional[str], rows: list):
+        """Keep the latest result of a conversation for its follow-ups"""
+        if not isinstance(rows, list) or len(rows) > self.max_rows:
+            return
+        self.cache_service.cache_result(
+            tenant_id, self._key(user_id, conversation_id),
+            {"question": question, "sql": sql, "rows": rows},
+            ttl=self.ttl, record_history=False
+        )
+
+    def answer(self, tenant_id: str, user_id: int, conversation_id: str, question: str) -> Optional[Dict[str, Any]]:
+        """The follow-up's rows and local SQL, or None when it needs the tenant database"""
+        previous = self.cache_service.get_cached_result(tenant_id, self._key(user_id, conversation_id))
+        if not previous or not previous.get("rows"):
+            return None
+        rows = previous["rows"]
+        types = column_types(rows)
+
+        sql, source = FollowUpPlanner(rows, types).plan(question), "rules"
+        if (sql is None and self.use_llm and self.llm_client and FOLLOWUP_CUE.search(question.strip())
+                and refers_to_previous(question, types)):
+            sql, source = self._ask_llm(previous["question"], types, rows, question), "llm"
+        if sql is None:
+            self.passed += 1
+            return None
+
+        try:
+            answer = self.run(rows, types, sql)
+        except (sqlite3.Error, TimeoutError) as e:
+            logger.warning(f"Local follow-up failed for tenant {tenant_id}, using the database: {e}")
+            self.passed += 1
+            return None
+
+        self.answered[source] += 1
+        logger.info(f"💬 Follow-up answered locally ({source}) for tenant {tenant_id}")
+        self.remember(tenant_id, user_id, conversation_id, question, sql, answer)
+        return {"answer": answer, "sql": sql}
+
+    def run(self, rows: List[Dict[str, Any]], types: Dict[str, str], sql: str) -> List[Dict[str, Any]]:
+        """Load rows into an in-memory table and run sql over it within the time budget"""
+        conn = sqlite3.connect(":memory:")
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        try:
+            columns = list(types)
+            conn.execute(
+                f"CREATE TABLE {RESULT_TABLE} ({', '.join(f'{quote(c)} {types[c]}' for c in columns)})"
+            )
+            conn.executemany(
+                f"INSERT INTO {RESULT_TABLE} VALUES ({', '.join('?' for _ in columns)})",
+                ([_cell(row.get(c)) for c in columns] for row in rows)
+            )
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                cursor = conn.execute(sql)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Local follow-up exceeded {self.timeout_ms}ms") from e
+                raise
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, values)) for values in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def _ask_llm(self, previous_question: str, types: Dict[str, str], rows: list, question: str) -> Optional[str]:
+        """SQL over the previous result when the LLM judges it sufficient, else None"""
+        column_lines = "\n".join(f"  - {c} ({t})" for c, t in types.items())
+        sample = "\n".join(json.dumps({c: _cell(row.get(c)) for c in types}, default=str) for row in rows[:3])
+        prompt = f"""
+You previously answered this question:
+{previous_question}
+
+Its result is stored in a SQLite table named {RESULT_TABLE} with these columns:
+{column_lines}
+
+First rows:
+{sample}
+
+If the new question can be answered from {RESULT_TABLE} alone, return ONE SQLite SELECT query over {RESULT_TABLE}.
+Otherwise return exactly: NEW_QUERY
+
+STRICT RULES:
+- Use ONLY the {RESULT_TABLE} table and the columns listed above.
+- Return ONLY raw SQL or NEW_QUERY.
+- No explanations.
+- No markdown.
+
+NEW QUESTION:
+{question}
+""".strip()
+        try:
+            output = self.llm_client.generate(prompt)
+            if not output.lower().startswith("select"):
+                return None
+            return self.sql_validator.validate(output, {"tables": {RESULT_TABLE: {}}})
+        except Exception as e:
+            logger.warning(f"Follow-up classification skipped: {e}")
+            return None
+
+    def get_stats(self) -> dict:
+        return {"answered_locally": dict(self.answered), "sent_to_database": self.passed}
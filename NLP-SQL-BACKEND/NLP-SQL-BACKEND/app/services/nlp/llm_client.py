@@ -1,5 +1,6 @@
 import requests
 import re
+from app.tracing import traced, annotate
 
 
 class LLMClient:
@@ -13,6 +14,7 @@ class LLMClient:
         self.base_url = base_url
         self.provider = provider
 
+    @traced("LLMClient.generate")
     def generate(self, prompt: str) -> str:
         """
         Sends prompt to the LLM provider and returns cleaned SQL output.
@@ -46,7 +48,16 @@ class LLMClient:
             if response.status_code != 200:
                 raise RuntimeError(f"LLM request failed: {response.text}")
 
-            result = response.json().get("response", "")
+            body = response.json()
+            result = body.get("response", "")
+            annotate({
+                "llm.provider": self.provider,
+                "llm.model": self.model,
+                "llm.prompt_chars": len(full_prompt),
+                "llm.prompt_tokens": body.get("prompt_eval_count"),
+                "llm.completion_tokens": body.get("eval_count"),
+                "llm.response_chars": len(result)
+            })
             return self._clean_output(result)
         except requests.exceptions.RequestException as e:
             raise RuntimeError(f"Failed to connect to Ollama: {str(e)}")
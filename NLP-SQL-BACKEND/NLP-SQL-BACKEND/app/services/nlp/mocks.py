@@ -24,6 +24,9 @@ class MockDBService:
     def get_engine(self, tenant_id):
         return MockEngine()
 
+    def get_connection_info(self, tenant_id, user_id=None, db=None):
+        return None
+
 class MockSchemaService:
     def get_schema(self, tenant_id):
         return {
@@ -43,14 +46,20 @@ class MockSchemaService:
             }
         }
 
+    def get_schema_for_question(self, tenant_id, question):
+        return self.get_schema(tenant_id)
+
+    def get_schema_version(self, tenant_id):
+        return "1"
+
 class MockCacheService:
     def __init__(self):
         self.data = {}
 
-    def get_cached_result(self, tenant_id, sql):
-        key = f"{tenant_id}:{sql}"
+    def get_cached_result(self, tenant_id, sql, schema_version=None):
+        key = f"{tenant_id}:{schema_version}:{sql}"
         return self.data.get(key)
 
-    def cache_result(self, tenant_id, sql, value):
-        key = f"{tenant_id}:{sql}"
+    def cache_result(self, tenant_id, sql, value, ttl=300, schema_version=None, tables=None, record_history=True):
+        key = f"{tenant_id}:{schema_version}:{sql}"
         self.data[key] = value
@@ -1,15 +1,98 @@
 import re
+import threading
+from collections import OrderedDict
+from typing import Mapping, Optional, Tuple
+
+# Marks where the question goes in a cached prompt template
+QUESTION_SLOT = "\x00QUESTION\x00"
 
 class PromptBuilder:
+    """
+    Renders LLM prompts. When the caller passes a cache_key (tenant, schema version,
+    pruning selection, profile version), the schema text and the prompt around the
+    question are rendered once and reused, so each request only splices in its question.
+    Optional column_hints ({table: {column: text}}) are appended to column lines.
+    """
+
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._schema_texts: "OrderedDict[tuple, str]" = OrderedDict()
+        self._templates: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-    def build(self, schema: dict, question: str) -> str:
+    def build(
+        self,
+        schema: dict,
+        question: str,
+        db_type: Optional[str] = None,
+        cache_key: Optional[tuple] = None,
+        column_hints: Optional[Mapping] = None
+    ) -> str:
         """
         Builds a strict, schema-aware, and dialect-specific instruction 
         prompt for the LLM.
         """
-        schema_text = self._format_schema(schema)
-        db_type = schema.get("db_type", "SQL")
+        db_type = db_type or schema.get("db_type", "SQL")
+        if cache_key is None:
+            return self._render(self._format_schema(schema, column_hints), db_type, question)
+
+        template_key = cache_key + (db_type,)
+        template = self._cache_get(self._templates, template_key)
+        if template is None:
+            schema_text = self.format_schema(schema, cache_key, column_hints)
+            head, tail = self._render(schema_text, db_type, QUESTION_SLOT).split(QUESTION_SLOT)
+            template = (head, tail)
+            self._cache_put(self._templates, template_key, template)
+        head, tail = template
+        return (head + question + tail).rstrip()
+
+    def format_schema(self, schema: dict, cache_key: Optional[tuple] = None, column_hints: Optional[Mapping] = None) -> str:
+        """Schema text for prompts, memoized per cache_key when one is given"""
+        if cache_key is None:
+            return self._format_schema(schema, column_hints)
+        schema_text = self._cache_get(self._schema_texts, cache_key)
+        if schema_text is None:
+            schema_text = self._format_schema(schema, column_hints)
+            self._cache_put(self._schema_texts, cache_key, schema_text)
+        return schema_text
+
+    def invalidate(self, tenant_id: str, *args):
+        """Drop cached prompts for a tenant (cache keys start with the tenant id)"""
+        with self._lock:
+            for cache in (self._schema_texts, self._templates):
+                for key in [k for k in cache if k[0] == tenant_id]:
+                    del cache[key]
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cached_schemas": len(self._schema_texts),
+            "cached_templates": len(self._templates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percentage": round((self.hits / total * 100) if total > 0 else 0, 2)
+        }
+
+    def _cache_get(self, cache: OrderedDict, key: tuple):
+        with self._lock:
+            value = cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _cache_put(self, cache: OrderedDict, key: tuple, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
 
+    def _render(self, schema_text: str, db_type: str, question: str) -> str:
         if db_type == "mongodb":
             prompt = f"""
 You generate MongoDB aggregation pipelines for a MongoDB database.
@@ -57,7 +140,7 @@ USER QUESTION:
 """
         return prompt.strip()
 
-    def _format_schema(self, schema: dict) -> str:
+    def _format_schema(self, schema: dict, column_hints: Optional[Mapping] = None) -> str:
         """
         Converts the schema dictionary into an LLM-friendly readable string
         using list accumulation for performance.
@@ -70,9 +153,11 @@ USER QUESTION:
             lines.append("Columns:")
 
             columns = table_data.get("columns", {})
+            hints = (column_hints or {}).get(table_name, {})
             for column_name, column_data in columns.items():
                 col_type = column_data.get("type", "unknown")
-                lines.append(f"  - {column_name} ({col_type})")
+                hint = hints.get(column_name)
+                lines.append(f"  - {column_name} ({col_type}) {hint}" if hint else f"  - {column_name} ({col_type})")
 
             relationships = table_data.get("relationships", [])
             if relationships:
@@ -1,7 +1,5 @@
-import time
 import logging
 import json
-from datetime import datetime
 from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
 
@@ -10,8 +8,9 @@ from app.services.nlp.llm_client import LLMClient
 from app.services.nlp.sql_validator import SQLValidator
 from app.services.nlp.mql_validator import MQLValidator
 from app.services.nlp.error_recovery import ErrorRecoveryService
-import pymongo
-from bson import ObjectId
+from app.query_executor import QueryExecutor, QueryTimeoutError, QueryCancelledError, CancelToken
+from app.metrics import StageTimer, ASK_TOTAL
+from app.tracing import traced, annotate, current_span
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -32,7 +31,13 @@ class QueryService:
         prompt_builder: Optional[PromptBuilder] = None,
         sql_validator: Optional[SQLValidator] = None,
         mql_validator: Optional[MQLValidator] = None,
-        error_recovery: Optional[ErrorRecoveryService] = None
+        error_recovery: Optional[ErrorRecoveryService] = None,
+        query_executor: Optional[QueryExecutor] = None,
+        profile_service=None,
+        rollup_manager=None,
+        followup_service=None,
+        history_writer=None,
+        slow_query_log=None
     ):
         self.db_service = db_service
         self.schema_service = schema_service
@@ -45,84 +50,135 @@ class QueryService:
             self.llm_client,
             self.prompt_builder
         )
+        self.query_executor = query_executor or QueryExecutor()
+        self.profile_service = profile_service
+        self.rollup_manager = rollup_manager
+        self.followup_service = followup_service
+        self.history_writer = history_writer
+        self.slow_query_log = slow_query_log
 
-    def ask(self, tenant_id: str, question: str, user_id: int, db: Optional[Session] = None) -> Dict[str, Any]:
+    @traced("QueryService.ask")
+    def ask(
+        self,
+        tenant_id: str,
+        question: str,
+        user_id: int,
+        db: Optional[Session] = None,
+        cancel_token: Optional[CancelToken] = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Executes the full NLP-to-Database workflow for a tenant.
         Supports both SQL (PostgreSQL/MySQL) and NoSQL (MongoDB).
+        The tenant query runs under the tenant's execution budget and stops when cancel_token fires.
+        Within a conversation, refinements of the previous answer are answered from its cached rows.
+        Each stage is timed; the per-stage breakdown is returned under "timings" (milliseconds).
         """
-        start_time = time.time()
+        timer = StageTimer(tenant_id)
+        annotate({"tenant.id": tenant_id, "question.chars": len(question), "conversation": bool(conversation_id)})
+
+        # Determine DB type (cached connection metadata, no system DB read on repeat requests)
+        with timer.stage("connection_lookup"):
+            conn_record = self.db_service.get_connection_info(tenant_id, user_id, db)
+        # Ownership comes first: schemas, cached results and follow-ups are all per tenant
+        if not conn_record:
+            ASK_TOTAL.inc(outcome="access_denied", tenant=timer.tenant)
+            raise ValueError(f"Access denied or connection not found for tenant {tenant_id}")
+        db_type = conn_record.db_type
+
+        # 0. Follow-ups that only refine the previous answer never reach the LLM or the tenant database
+        if conversation_id and self.followup_service is not None:
+            with timer.stage("followup"):
+                local = self.followup_service.answer(tenant_id, user_id, conversation_id, question)
+            if local is not None:
+                with timer.stage("history"):
+                    # The tenant's db_type: rollup discovery and frequency folding read history per tenant dialect
+                    self._save_history(db, tenant_id, user_id, question, local["sql"], db_type)
+                return self._finish(timer, "local_followup", {
+                    "answer": local["answer"],
+                    "sql": local["sql"],
+                    "cache_hit": False,
+                    "local_followup": True
+                })
         
-        # 1. Retrieve Schema
-        schema = self.schema_service.get_schema(tenant_id, simplified=True)
+        # 1. Retrieve Schema (may be partial while extraction is still running)
+        with timer.stage("schema"):
+            schema = self.schema_service.get_schema_for_question(tenant_id, question)
         if not schema:
+            ASK_TOTAL.inc(outcome="no_schema", tenant=timer.tenant)
             raise ValueError(f"No schema found for tenant {tenant_id}")
 
-        # Determine DB type
-        from app.models import TenantConnection
-        conn_record = db.query(TenantConnection).filter(TenantConnection.tenant_id == tenant_id).first()
-        db_type = conn_record.db_type if conn_record else "postgresql"
-        schema["db_type"] = db_type
-
-        # 2. Build Prompt
-        prompt = self.prompt_builder.build(schema, question)
+        # 2. Build Prompt (schema snapshots are shared and read-only; db_type travels separately)
+        # A partial schema has no version yet, so its prompt is rendered fresh each time
+        # Column profiles add value hints; their version keeps cached prompts in step with them
+        schema_version = schema.get("version")
+        with timer.stage("prompt"):
+            hints = self.profile_service.prompt_hints(tenant_id) if self.profile_service else None
+            profile_version, column_hints = hints if hints else (None, None)
+            prompt_key = (tenant_id, schema_version, None, profile_version) if schema_version else None
+            prompt = self.prompt_builder.build(
+                schema, question, db_type=db_type, cache_key=prompt_key, column_hints=column_hints
+            )
 
         # 3. Generate Raw Query
         try:
-            raw_query = self.llm_client.generate(prompt)
+            with timer.stage("llm"):
+                raw_query = self.llm_client.generate(prompt)
         except Exception as e:
             logger.error(f"LLM Generation failed: {str(e)}")
-            execution_time = f"{time.time() - start_time:.2f}s"
-            return {
+            return self._finish(timer, "llm_error", {
                 "answer": [],
                 "sql": None,
                 "error": str(e),
-                "cache_hit": False,
-                "execution_time": execution_time
-            }
+                "cache_hit": False
+            })
 
         # 4. Validate Query
         try:
-            if db_type == "mongodb":
-                validated_query = self.mql_validator.validate(raw_query, schema)
-            else:
-                validated_query = self.sql_validator.validate(raw_query, schema)
+            with timer.stage("validation"):
+                if db_type == "mongodb":
+                    validated_query = self.mql_validator.validate(raw_query, schema)
+                else:
+                    validated_query = self.sql_validator.validate(raw_query, schema)
         except ValueError as e:
             logger.error(f"Validation failed: {str(e)}")
-            execution_time = f"{time.time() - start_time:.2f}s"
-            return {
+            return self._finish(timer, "invalid_query", {
                 "answer": [],
                 "sql": raw_query,
                 "error": str(e),
-                "cache_hit": False,
-                "execution_time": execution_time
-            }
+                "cache_hit": False
+            })
 
         # 5. Check Cache
         normalized_cache_key = str(validated_query).lower().strip()
-        cached_result = self.cache_service.get_cached_result(tenant_id, normalized_cache_key)
+        with timer.stage("cache_lookup"):
+            cached_result = self.cache_service.get_cached_result(
+                tenant_id, normalized_cache_key, schema_version=schema_version
+            )
         
         if cached_result is not None:
             logger.info(f"Cache hit for tenant {tenant_id}")
-            execution_time = f"{time.time() - start_time:.2f}s"
-            return {
+            cached_query = str(validated_query) if db_type == "mongodb" else validated_query
+            self._remember(tenant_id, user_id, conversation_id, question, cached_query, cached_result)
+            return self._finish(timer, "cache_hit", {
                 "answer": cached_result,
-                "sql": str(validated_query) if db_type == "mongodb" else validated_query,
-                "cache_hit": True,
-                "execution_time": execution_time
-            }
+                "sql": cached_query,
+                "cache_hit": True
+            })
 
         # 6. Execute Query
         logger.info(f"Executing {db_type} for tenant {tenant_id}")
+        timeout_ms = self.query_executor.resolve_timeout_ms(conn_record)
+        rollup_refreshed_at = None
         try:
-            engine = self.db_service.get_engine(tenant_id, user_id=user_id, db=db)
+            with timer.stage("engine"):
+                engine = self.db_service.get_engine(tenant_id, user_id=user_id, db=db)
             if not engine:
                 raise ValueError(f"Access denied or connection not found for tenant {tenant_id}")
             
             if db_type == "mongodb":
                 # MongoDB Execution logic
                 db_name = conn_record.database_name or "test"
-                mongo_db = engine[db_name]
                 
                 # Use collection and pipeline from the validated LLM response
                 collection_name = validated_query.get("collection")
@@ -131,101 +187,161 @@ class QueryService:
                 if not collection_name:
                     raise ValueError("No collection was specified for the query.")
                 
-                cursor = mongo_db[collection_name].aggregate(pipeline)
-                result = []
-                for doc in cursor:
-                    # Clean up all fields for JSON serialization
-                    clean_doc = {}
-                    for k, v in doc.items():
-                        if isinstance(v, ObjectId) or (hasattr(v, '__str__') and 'ObjectId' in str(type(v))):
-                            clean_doc[k] = str(v)
-                        elif isinstance(v, datetime):
-                            clean_doc[k] = v.isoformat()
-                        else:
-                            clean_doc[k] = v
-                    result.append(clean_doc)
+                result = self.query_executor.execute_mongo(
+                    engine, db_name, collection_name, pipeline,
+                    tenant_id=tenant_id,
+                    timeout_ms=timeout_ms,
+                    cancel_token=cancel_token,
+                    timer=timer
+                )
+                self._log_slow(tenant_id, db_type, engine, validated_query, timer.timings.get("tenant_query"),
+                               len(result), conn_record)
                 final_query_str = f"db.{collection_name}.aggregate({json.dumps(pipeline, default=str)})"
+                tables_read = [collection_name]
             else:
-                # SQL Execution logic
-                from sqlalchemy import text
-                with engine.connect() as conn:
-                    result_proxy = conn.execute(text(validated_query))
-                    result = []
-                    for row in result_proxy:
-                        row_dict = {}
-                        for column, value in row._mapping.items():
-                            if hasattr(value, 'isoformat'):
-                                row_dict[column] = value.isoformat()
-                            else:
-                                row_dict[column] = value
-                        result.append(row_dict)
+                # SQL Execution logic; simple aggregates covered by a rollup skip the tenant database
+                result = None
+                if self.rollup_manager is not None:
+                    with timer.stage("rollup"):
+                        served = self.rollup_manager.answer_sql(tenant_id, validated_query, db_type)
+                    if served is not None:
+                        result, rollup_refreshed_at = served
+                if result is None:
+                    result = self.query_executor.execute_sql(
+                        engine, validated_query, db_type,
+                        tenant_id=tenant_id,
+                        timeout_ms=timeout_ms,
+                        cancel_token=cancel_token,
+                        timer=timer
+                    )
+                    self._log_slow(tenant_id, db_type, engine, validated_query, timer.timings.get("tenant_query"),
+                                   len(result), conn_record)
                 final_query_str = validated_query
+                tables_read = self.sql_validator.referenced_tables(validated_query)
 
+        except (QueryTimeoutError, QueryCancelledError) as e:
+            # A slow or abandoned query is not a syntax problem, so don't spend an LLM repair on it
+            if isinstance(e, QueryTimeoutError):
+                self._log_slow(tenant_id, db_type, engine, validated_query, timer.timings.get("tenant_query"),
+                               0, conn_record, timed_out=True)
+            return self._finish(timer, "timeout" if isinstance(e, QueryTimeoutError) else "cancelled", {
+                "answer": [],
+                "sql": str(validated_query),
+                "error": str(e),
+                "cache_hit": False,
+                "timed_out": isinstance(e, QueryTimeoutError)
+            })
         except Exception as e:
             if db_type == "mongodb":
                 logger.error(f"MongoDB Execution failed: {str(e)}")
+                ASK_TOTAL.inc(outcome="failed", tenant=timer.tenant)
                 raise e
                 
             logger.warning(f"SQL Execution failed, attempting repair: {str(e)}")
             try:
                 # Attempt Repair
-                repaired_sql = self.error_recovery.attempt_repair(
-                    schema=schema,
-                    question=question,
-                    failed_sql=validated_query,
-                    db_error=str(e)
-                )
-                repaired_sql = self.sql_validator.validate(repaired_sql, schema)
-
-                with engine.connect() as conn:
-                    result_proxy = conn.execute(text(repaired_sql))
-                    result = []
-                    for row in result_proxy:
-                        row_dict = {}
-                        for column, value in row._mapping.items():
-                            if hasattr(value, 'isoformat'):
-                                row_dict[column] = value.isoformat()
-                            else:
-                                row_dict[column] = value
-                        result.append(row_dict)
+                with timer.stage("repair_llm"):
+                    repaired_sql = self.error_recovery.attempt_repair(
+                        schema=schema,
+                        question=question,
+                        failed_sql=validated_query,
+                        db_error=str(e),
+                        cache_key=prompt_key,
+                        column_hints=column_hints
+                    )
+                with timer.stage("repair_validation"):
+                    repaired_sql = self.sql_validator.validate(repaired_sql, schema)
+
+                with timer.stage("repair_execution"):
+                    result = self.query_executor.execute_sql(
+                        engine, repaired_sql, db_type,
+                        tenant_id=tenant_id,
+                        timeout_ms=timeout_ms,
+                        cancel_token=cancel_token
+                    )
+                self._log_slow(tenant_id, db_type, engine, repaired_sql, timer.timings.get("repair_execution"),
+                               len(result), conn_record)
                 final_query_str = repaired_sql 
+                tables_read = self.sql_validator.referenced_tables(repaired_sql)
 
             except Exception as repair_error:
                 logger.error(f"Repair attempt failed: {str(repair_error)}")
-                execution_time = f"{time.time() - start_time:.2f}s"
-                return {
+                return self._finish(timer, "repair_failed", {
                     "answer": [],
                     "sql": str(validated_query),
                     "error": str(repair_error),
                     "cache_hit": False,
-                    "execution_time": execution_time
-                }
+                    "timed_out": isinstance(repair_error, QueryTimeoutError)
+                })
         
-        # 7. Store in Cache
-        self.cache_service.cache_result(tenant_id, normalized_cache_key, result)
-
-        # 8. Store in Session History (Database)
-        if db:
-            from app.models import QueryHistory
-            try:
-                history_entry = QueryHistory(
-                    tenant_id=tenant_id,
-                    user_id=user_id,
-                    question=question,
-                    query_text=final_query_str,
-                    db_type=db_type
+        # 7. Store in Cache; rollup answers are read locally each time so their refreshed_at stays true
+        if rollup_refreshed_at is None:
+            with timer.stage("cache_store"):
+                self.cache_service.cache_result(
+                    tenant_id, normalized_cache_key, result,
+                    schema_version=schema_version,
+                    tables=tables_read
                 )
-                db.add(history_entry)
-                db.commit()
-                logger.info(f"📜 History saved to DB for tenant {tenant_id}")
-            except Exception as e:
-                db.rollback()
-                logger.error(f"Failed to save history to DB: {e}")
-
-        execution_time = f"{time.time() - start_time:.2f}s"
-        return {
+
+        # 8. Store in Session History (Database) and keep the rows for follow-ups
+        with timer.stage("history"):
+            self._save_history(db, tenant_id, user_id, question, final_query_str, db_type)
+        self._remember(tenant_id, user_id, conversation_id, question, final_query_str, result)
+
+        response = {
             "answer": result,
             "sql": final_query_str,
-            "cache_hit": False,
-            "execution_time": execution_time
+            "cache_hit": False
         }
+        if rollup_refreshed_at is not None:
+            response.update(source="rollup", refreshed_at=rollup_refreshed_at)
+        return self._finish(timer, "answered", response)
+
+    def _finish(self, timer: StageTimer, outcome: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        ASK_TOTAL.inc(outcome=outcome, tenant=timer.tenant)
+        span = current_span()
+        if span.recording:
+            answer = response.get("answer") or []
+            span.set_attributes({
+                "ask.outcome": outcome,
+                "cache.hit": bool(response.get("cache_hit")),
+                "result.rows": len(answer),
+                "result.bytes": len(json.dumps(answer, default=str))
+            })
+        response["execution_time"] = f"{timer.elapsed():.2f}s"
+        response["timings"] = timer.breakdown_ms()
+        return response
+
+    def _log_slow(self, tenant_id, db_type, engine, query, seconds, rows, conn_record, timed_out=False):
+        if self.slow_query_log is None or seconds is None:
+            return
+        database = conn_record.database_name if conn_record else None
+        self.slow_query_log.observe(tenant_id, db_type, engine, query, seconds * 1000, rows,
+                                    timed_out=timed_out, database=database)
+
+    def _remember(self, tenant_id, user_id, conversation_id, question, query, rows):
+        if conversation_id and self.followup_service is not None:
+            self.followup_service.remember(tenant_id, user_id, conversation_id, question, query, rows)
+
+    def _save_history(self, db: Optional[Session], tenant_id: str, user_id: int, question: str, query_text: str, db_type: str):
+        if self.history_writer is not None and self.history_writer.running:
+            # Written behind in batches, off the request path
+            self.history_writer.submit(tenant_id, user_id, question, query_text, db_type)
+            return
+        if not db:
+            return
+        from app.models import QueryHistory
+        try:
+            history_entry = QueryHistory(
+                tenant_id=tenant_id,
+                user_id=user_id,
+                question=question,
+                query_text=query_text,
+                db_type=db_type
+            )
+            db.add(history_entry)
+            db.commit()
+            logger.info(f"📜 History saved to DB for tenant {tenant_id}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to save history to DB: {e}")
@@ -62,18 +62,20 @@ class SQLValidator:
         Ensures all referenced tables exist in the provided schema.
         Supports schema-qualified tables (e.g., public.orders).
         """
-        # Improved regex to handle schema qualifications
-        pattern = r"(?:from|join)\s+([a-zA-Z_][a-zA-Z0-9_\.]*)"
-        matches = re.findall(pattern, sql.lower())
-
         allowed_tables = set(schema.get("tables", {}).keys())
 
-        for match in matches:
-            # Extract table name from schema-qualified string (e.g., 'public.orders' -> 'orders')
-            table = match.split(".")[-1]
+        for table in self.referenced_tables(sql):
             if table not in allowed_tables:
                 raise ValueError(f"Unknown table referenced: {table}")
 
+    def referenced_tables(self, sql: str) -> list:
+        """Table names after FROM/JOIN, with any schema qualification stripped"""
+        # Improved regex to handle schema qualifications
+        pattern = r"(?:from|join)\s+([a-zA-Z_][a-zA-Z0-9_\.]*)"
+        matches = re.findall(pattern, sql.lower())
+        # Extract table name from schema-qualified string (e.g., 'public.orders' -> 'orders')
+        return list(dict.fromkeys(match.split(".")[-1] for match in matches))
+
     def _enforce_limit(self, sql: str) -> str:
         """Ensures a LIMIT clause is present using regex for accuracy."""
         if not re.search(r"\blimit\b", sql.lower()):
@@ -0,0 +1,202 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from hashlib import sha256
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional
+import json
+import re
+import threading
+import logging
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = metrics.counter(
+    "nlpsql_slow_queries_total", "Tenant queries over the slow-query threshold", ("db_type", "tenant")
+)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def query_text(query) -> str:
+    """SQL as is; a validated Mongo query ({collection, pipeline}) as its aggregate call"""
+    if isinstance(query, dict):
+        return f"db.{query.get('collection')}.aggregate({json.dumps(query.get('pipeline'), default=str)})"
+    return str(query)
+
+
+def fingerprint(statement: str) -> str:
+    """Queries that differ only in literals and spacing share a fingerprint"""
+    shape = " ".join(_LITERALS.sub("?", statement.lower()).split())
+    return sha256(shape.encode()).hexdigest()[:16]
+
+
+class SlowQuery:
+    """One query shape's slow executions for a tenant"""
+
+    def __init__(self, key: str, db_type: str, query: str):
+        self.fingerprint = key
+        self.db_type = db_type
+        self.query = query
+        self.count = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_rows = 0
+        self.last_seen: Optional[datetime] = None
+        self.plan: Any = None
+        self.plan_error: Optional[str] = None
+
+    def record(self, query: str, duration_ms: float, rows: int, timed_out: bool):
+        self.count += 1
+        self.timeouts += int(timed_out)
+        self.total_ms += duration_ms
+        if duration_ms >= self.max_ms:
+            # Keep the literals of the slowest run
+            self.max_ms = duration_ms
+            self.query = query
+        self.last_rows = rows
+        self.last_seen = datetime.utcnow()
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "db_type": self.db_type,
+            "query": self.query,
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "max_ms": round(self.max_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "last_rows": self.last_rows,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "plan": self.plan,
+            "plan_error": self.plan_error
+        }
+
+
+class SlowQueryLog:
+    """
+    Bounded per-tenant log of tenant queries slower than threshold_ms, grouped
+    by query shape. A shape's plan is captured once, in the background, with
+    EXPLAIN (never ANALYZE, so the slow query is not run again) or Mongo's
+    explain at queryPlanner verbosity. When a tenant's log is full, the
+    fastest shape makes room for a slower one.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = 1000,
+        max_per_tenant: int = 50,
+        explain: bool = True,
+        explain_timeout_ms: int = 5000,
+        max_pending_explains: int = 100
+    ):
+        self.threshold_ms = threshold_ms
+        self.max_per_tenant = max_per_tenant
+        self.explain = explain
+        self.explain_timeout_ms = explain_timeout_ms
+        self.max_pending_explains = max_pending_explains
+        self.entries: Dict[str, Dict[str, SlowQuery]] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self.logged = 0
+        self.evicted = 0
+        self.explained = 0
+
+    def observe(
+        self,
+        tenant_id: str,
+        db_type: str,
+        engine,
+        query,
+        duration_ms: float,
+        rows: int,
+        timed_out: bool = False,
+        database: Optional[str] = None
+    ) -> bool:
+        """Log the execution if it was slow (or timed out); returns whether it was logged"""
+        if duration_ms < self.threshold_ms and not timed_out:
+            return False
+        statement = query_text(query)
+        key = fingerprint(statement)
+        with self._lock:
+            tenant_entries = self.entries.setdefault(tenant_id, {})
+            entry = tenant_entries.get(key)
+            is_new = entry is None
+            if is_new:
+                if len(tenant_entries) >= self.max_per_tenant:
+                    fastest = min(tenant_entries.values(), key=lambda e: e.max_ms)
+                    if fastest.max_ms >= duration_ms:
+                        return False
+                    del tenant_entries[fastest.fingerprint]
+                    self.evicted += 1
+                entry = tenant_entries[key] = SlowQuery(key, db_type, statement)
+            entry.record(statement, duration_ms, rows, timed_out)
+            self.logged += 1
+            schedule = is_new and self.explain and engine is not None and self._pending < self.max_pending_explains
+            if schedule:
+                self._pending += 1
+
+        SLOW_QUERIES.inc(db_type=db_type, tenant=metrics.tenant_label(tenant_id))
+        logger.warning(f"🐢 Slow {db_type} query for tenant {tenant_id}: {duration_ms:.0f}ms, {rows} rows")
+        if schedule:
+            self._background.submit(self._capture_plan, entry, db_type, engine, query, database)
+        return True
+
+    def worst(self, tenant_id: str, limit: int = 20) -> List[dict]:
+        """A tenant's slowest query shapes, worst first"""
+        with self._lock:
+            entries = list(self.entries.get(tenant_id, {}).values())
+        entries.sort(key=lambda e: (e.max_ms, e.count), reverse=True)
+        return [entry.to_dict() for entry in entries[:limit]]
+
+    def remove_tenant(self, tenant_id: str):
+        with self._lock:
+            self.entries.pop(tenant_id, None)
+
+    def _capture_plan(self, entry: SlowQuery, db_type: str, engine, query, database: Optional[str]):
+        try:
+            if db_type == "mongodb":
+                entry.plan = self.explain_mongo(engine, database or "test", query)
+            else:
+                entry.plan = self.explain_sql(engine, db_type, str(query))
+            self.explained += 1
+        except Exception as e:
+            entry.plan_error = str(e)
+            logger.warning(f"EXPLAIN failed for slow {db_type} query: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def explain_sql(self, engine, db_type: str, sql: str):
+        with engine.connect() as conn:
+            if db_type == "postgresql":
+                conn.execute(text(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}"))
+                return conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if db_type == "mysql":
+                return json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}")).scalar())
+            if db_type == "sqlite":
+                return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        raise ValueError(f"EXPLAIN is not supported for {db_type}")
+
+    def explain_mongo(self, client, database: str, query: dict):
+        plan = client[database].command(
+            {"explain": {"aggregate": query["collection"], "pipeline": query["pipeline"], "cursor": {}},
+             "verbosity": "queryPlanner"},
+            maxTimeMS=int(self.explain_timeout_ms)
+        )
+        # ObjectIds and timestamps in the plan become strings
+        return json.loads(json.dumps(plan, default=str))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold_ms,
+                "tenants": len(self.entries),
+                "entries": sum(len(entries) for entries in self.entries.values()),
+                "logged": self.logged,
+                "evicted": self.evicted,
+                "explained": self.explained,
+                "pending_explains": self._pending
+            }
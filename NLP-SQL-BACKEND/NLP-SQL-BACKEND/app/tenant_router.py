@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
+from typing import Optional
 import uuid
 import logging
 import time
 
-from dependencies import get_db_service, get_schema_service, get_cleanup_service
+from dependencies import get_db_service, get_schema_service, get_cleanup_service, get_profile_service
+from config import settings
 from app.database import get_db
 from app.auth_service import get_current_user
 from app.models import User
@@ -20,23 +22,29 @@ class DBConnectRequest(BaseModel):
     username: str
     password: str
     database: str
+    query_timeout_ms: Optional[int] = Field(default=None, gt=0)
 
 class DBConnectResponse(BaseModel):
     tenant_id: str
     status: str
+    schema_status: str = "complete"
     message: str = ""
 
 class DisconnectResponse(BaseModel):
     status: str
     message: str = ""
 
+class QueryBudgetRequest(BaseModel):
+    query_timeout_ms: Optional[int] = Field(default=None, gt=0)
+
 @router.post("/connect-db", response_model=DBConnectResponse)
 async def connect_database(
     request: DBConnectRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     db_service=Depends(get_db_service),
-    schema_service=Depends(get_schema_service)
+    schema_service=Depends(get_schema_service),
+    profile_service=Depends(get_profile_service)
 ):
     """Connect to a database and prepare for queries"""
     try:
@@ -56,26 +64,18 @@ async def connect_database(
                 detail="Database connection failed. Check credentials and try again."
             )
         
-        schema = schema_service.extract_and_store_schema(
-            tenant_id=tenant_id, 
-            user_id=current_user.id, 
-            db=db
-        )
-        
-        if not schema:
-            db_service.close_connection(tenant_id, user_id=current_user.id, db=db)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not extract database schema. Check permissions."
-            )
-        
-        table_count = len(schema)
-        logger.info(f"✅ Tenant {tenant_id} connected with {table_count} tables")
+        # Extract the schema in the background; /api/schema-status reports progress
+        progress = schema_service.start_extraction(tenant_id=tenant_id, user_id=current_user.id)
+        if settings.COLUMN_PROFILING_ENABLED:
+            # Queued behind the extraction; profiles feed chart suggestions and prompt hints
+            profile_service.start_profiling(tenant_id=tenant_id, user_id=current_user.id)
+        logger.info(f"✅ Tenant {tenant_id} connected, schema extraction queued")
         
         return DBConnectResponse(
             tenant_id=tenant_id,
             status="connected",
-            message=f"Connected to {request.db_type} database with {table_count} tables"
+            schema_status=progress.state,
+            message=f"Connected to {request.db_type} database. Schema extraction in progress."
         )
         
     except HTTPException:
@@ -124,10 +124,45 @@ async def check_tenant_health(
             "tenant_id": tenant_id
         }
 
+@router.get("/schema-status/{tenant_id}")
+async def get_schema_status(
+    tenant_id: str,
+    db: Session = Depends(get_db),
+    db_service=Depends(get_db_service),
+    schema_service=Depends(get_schema_service),
+    current_user: User = Depends(get_current_user)
+):
+    """Schema extraction progress for a tenant (tables extracted so far)"""
+    if not db_service.get_connection_info(tenant_id, current_user.id, db):
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    
+    progress = schema_service.get_progress(tenant_id)
+    if progress is None:
+        schema = schema_service.get_schema(tenant_id)
+        state = "complete" if schema is not None else "not_started"
+        return {"tenant_id": tenant_id, "state": state, "tables_total": len(schema) if schema else None,
+                "tables_extracted": len(schema) if schema else 0}
+    return progress
+
+@router.put("/query-budget/{tenant_id}")
+async def set_query_budget(
+    tenant_id: str,
+    request: QueryBudgetRequest,
+    db: Session = Depends(get_db),
+    db_service=Depends(get_db_service),
+    current_user: User = Depends(get_current_user)
+):
+    """Set the per-tenant query execution budget (null resets to the server default)"""
+    updated = db_service.set_query_timeout(tenant_id, current_user.id, request.query_timeout_ms, db)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Tenant not found or access denied")
+    return {"tenant_id": tenant_id, "query_timeout_ms": request.query_timeout_ms}
+
 @router.delete("/disconnect/{tenant_id}", response_model=DisconnectResponse)
 async def disconnect_database(
     tenant_id: str,
     db: Session = Depends(get_db),
+    db_service=Depends(get_db_service),
     cleanup_service=Depends(get_cleanup_service),
     current_user: User = Depends(get_current_user)
 ):
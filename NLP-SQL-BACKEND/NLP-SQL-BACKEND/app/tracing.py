@@ -0,0 +1,308 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+import json
+import queue
+import random
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP enum values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed operation. Unsampled spans carry ids for propagation but record nothing."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "sampled",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, kind: str = "internal"):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def recording(self) -> bool:
+        return self.sampled
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled and value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()]
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class _RemoteParent:
+    """Caller's span from an incoming traceparent header"""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class _NoopSpan:
+    recording = False
+    sampled = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("nlpsql_current_span", default=None)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[_RemoteParent]:
+    match = TRACEPARENT.match((header or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return _RemoteParent(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+class BatchSpanExporter:
+    """
+    Queues finished spans and writes them from a background thread in OTLP/JSON
+    (one ExportTraceServiceRequest per batch): appended as a line to path, or
+    POSTed to an OTLP/HTTP collector url. A full queue drops spans rather than
+    blocking the request.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        url: Optional[str] = None,
+        service_name: str = "nlp-sql-backend",
+        batch_size: int = 512,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+        timeout: float = 5.0
+    ):
+        self.path = path
+        self.url = url
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def payload(self, spans: List[Span]) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "nlpsql"}, "spans": [span.to_otlp() for span in spans]}]
+        }]}
+
+    def _write(self, spans: List[Span]):
+        body = self.payload(spans)
+        try:
+            with self._write_lock:
+                if self.url:
+                    import requests
+                    requests.post(self.url, json=body, timeout=self.timeout).raise_for_status()
+                else:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(body, default=str) + "\n")
+            self.exported += len(spans)
+        except Exception as e:
+            self.failed += len(spans)
+            logger.error(f"Span export failed ({len(spans)} spans): {e}")
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                batch: List[Span] = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._stop.is_set():
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, 0.25)))
+                    except queue.Empty:
+                        continue
+                if batch:
+                    self._write(batch)
+
+        self._thread = threading.Thread(target=run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write whatever is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + self.timeout)
+        self.flush()
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+class Tracer:
+    """
+    Context-propagated spans with head-based sampling: the decision is made
+    once per trace (at the root, or taken from an incoming traceparent) and
+    unsampled traces skip attribute and export work entirely. Disabled until
+    configure() is given an exporter and a non-zero sample rate.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.exporter: Optional[BatchSpanExporter] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def configure(self, sample_rate: float, exporter: Optional[BatchSpanExporter]):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", traceparent: Optional[str] = None, **attributes):
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current.get()
+        if parent is not None and not parent.sampled:
+            # Inside an unsampled trace: nothing to record, keep the existing context
+            yield parent
+            return
+        if parent is None:
+            parent = parse_traceparent(traceparent)
+        if parent is None:
+            span = Span(name, f"{random.getrandbits(128):032x}", None, random.random() < self.sample_rate, kind)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, parent.sampled, kind)
+        span.set_attributes(attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.sampled:
+                span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            if span.sampled:
+                span.end_ns = time.time_ns()
+                self.exporter.export(span)
+
+
+tracer = Tracer()
+
+
+def current_span():
+    """The active span, or a no-op span outside a (sampled) trace"""
+    span = _current.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def annotate(attributes: Dict[str, Any]):
+    """Set attributes on the active span, if it is being recorded"""
+    span = _current.get()
+    if span is not None and span.sampled:
+        span.set_attributes(attributes)
+
+
+def traced(name: str):
+    """Run the decorated function inside a span called name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
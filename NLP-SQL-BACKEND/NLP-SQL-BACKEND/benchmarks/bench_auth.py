@@ -0,0 +1,93 @@
+"""
+Requests/sec for an authenticated no-op endpoint, with the token and user
+caches disabled (JWT verification and a system DB lookup per request) and
+enabled. Requests go through the full ASGI stack via TestClient against a
+file-backed SQLite system DB.
+
+    python benchmarks/bench_auth.py [--requests 2000] [--users 50]
+"""
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "bench-encryption-key")
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import auth_service, models
+from app.auth_cache import TokenCache, UserCache
+from app.database import Base, get_db
+
+def make_client(path: str, users: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add_all(models.User(email=f"user{i}@example.com", full_name=f"User {i}", hashed_password="") for i in range(users))
+    db.commit()
+    db.close()
+
+    app = FastAPI()
+
+    @app.get("/noop")
+    async def noop(current_user=Depends(auth_service.get_current_user)):
+        return {"id": current_user.id}
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_db
+    return TestClient(app)
+
+def requests_per_second(client: TestClient, headers: list, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        response = client.get("/noop", headers=headers[i % len(headers)])
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        client = make_client(os.path.join(workdir, "system.db"), args.users)
+        headers = [
+            {"Authorization": f"Bearer {auth_service.create_access_token({'sub': f'user{i}@example.com'})}"}
+            for i in range(args.users)
+        ]
+
+        # Before: every request verifies the JWT and reads the user row
+        auth_service.token_cache = TokenCache(ttl_seconds=0)
+        auth_service.user_cache = UserCache(ttl_seconds=0)
+        uncached = requests_per_second(client, headers, args.requests)
+
+        # After: verified tokens and user records are served from memory
+        auth_service.token_cache = TokenCache()
+        auth_service.user_cache = UserCache()
+        requests_per_second(client, headers, len(headers))
+        cached = requests_per_second(client, headers, args.requests)
+
+        print(f"Authenticated no-op endpoint, {args.requests} requests over {args.users} users")
+        print(f"  uncached: {uncached:8.0f} req/s")
+        print(f"  cached:   {cached:8.0f} req/s")
+        print(f"  speedup:  {cached / uncached:8.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
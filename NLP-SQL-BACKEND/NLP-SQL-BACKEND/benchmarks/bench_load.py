@@ -0,0 +1,475 @@
+"""
+End-to-end load test of /api/ask, fully offline. Starts:
+
+  - a fake Ollama that answers /api/generate with canned SQL for each
+    question after a configurable latency (fixed, uniform or lognormal),
+  - a seeded SQLite tenant database (customers, products, orders),
+  - optionally a Redis stand-in speaking enough RESP for CacheManager,
+  - the app itself under uvicorn with --workers processes,
+
+then replays a weighted question mix at a target request rate (open loop:
+latency is measured from each request's scheduled send time, so a backed-up
+server shows up as latency rather than as a lower send rate) and reports
+throughput, latency percentiles overall and per /api/ask stage, cache hit
+rate and error rate. --variants sets how many distinct forms each question
+takes, and so how often the result cache can answer. Any app setting can be
+overridden with --env to compare configurations.
+
+The stand-ins run in this process alongside the client threads, so at high
+rates their share of the GIL shows up in llm and cache timings; pass
+--redis URL to measure against a real Redis.
+
+    python benchmarks/bench_load.py [--rps 20] [--duration 60] [--workers 2] [--redis standin|none|URL]
+        [--llm-latency lognormal:800:0.4] [--env DB_POOL_SIZE=10 --env CACHE_TTL_SECONDS=60] [--json out.json]
+"""
+import sys
+import os
+import argparse
+import json
+import math
+import random
+import re
+import shutil
+import socket
+import socketserver
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# (weight, question, what the model answers); {n} is the variant, so each one is a distinct cache key.
+# Fences and preambles go through the real cleaning path.
+QUESTION_MIX = [
+    (25, "How many orders did customer {n} place?", "SELECT COUNT(*) AS orders FROM orders WHERE customer_id = {n}"),
+    (20, "What is the revenue by region for product {n}?",
+     "```sql\nSELECT c.region, SUM(o.amount) AS revenue\nFROM orders o\nJOIN customers c ON c.id = o.customer_id\n"
+     "WHERE o.product_id = {n}\nGROUP BY c.region\nORDER BY revenue DESC\n```"),
+    (15, "Which {n} products sold the most units?",
+     "Here is the query:\nSELECT p.name, SUM(o.quantity) AS units FROM orders o JOIN products p ON p.id = o.product_id "
+     "GROUP BY p.name ORDER BY units DESC LIMIT {n}"),
+    (15, "How many orders of product {n} were placed each month?",
+     "SELECT substr(created_at, 1, 7) AS month, COUNT(*) AS orders FROM orders WHERE product_id = {n} "
+     "GROUP BY month ORDER BY month"),
+    (10, "Which customers placed more than {n} orders?",
+     "SELECT c.name, c.region, COUNT(*) AS orders FROM customers c JOIN orders o ON o.customer_id = c.id "
+     "GROUP BY c.id, c.name, c.region HAVING COUNT(*) > {n} ORDER BY orders DESC LIMIT 100"),
+    (10, "What is the average order value of customer {n}?",
+     "SELECT AVG(amount) AS avg_order, COUNT(*) AS orders FROM orders WHERE customer_id = {n}"),
+    (5, "Show the {n} largest orders", "SELECT id, customer_id, amount, created_at FROM orders ORDER BY amount DESC LIMIT {n}"),
+]
+QUESTION_PATTERNS = [(re.compile(re.escape(question).replace(r"\{n\}", r"(\d+)")), sql) for _, question, sql in QUESTION_MIX]
+
+REGIONS = ["north", "south", "east", "west", "central"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def parse_latency(spec: str):
+    """fixed:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA -> function returning seconds"""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def seed_tenant_db(path: str, customers: int, orders: int):
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, email TEXT, region TEXT, signed_up TEXT);
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price NUMERIC);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+                             product_id INTEGER REFERENCES products(id), quantity INTEGER, amount NUMERIC, created_at TEXT);
+    """)
+    start = datetime(2022, 1, 1)
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?, ?)", [
+        (i, f"Customer {i}", f"customer{i}@example.com", rng.choice(REGIONS),
+         (start + timedelta(days=rng.randrange(1000))).date().isoformat())
+        for i in range(1, customers + 1)
+    ])
+    conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?)", [
+        (i, f"Product {i}", f"category_{i % 8}", round(rng.uniform(5, 500), 2)) for i in range(1, 201)
+    ])
+    rows = []
+    for i in range(1, orders + 1):
+        quantity = rng.randint(1, 5)
+        rows.append((i, rng.randint(1, customers), rng.randint(1, 200), quantity, round(quantity * rng.uniform(5, 500), 2),
+                     (start + timedelta(minutes=rng.randrange(1000 * 24 * 60))).isoformat(sep=" ")))
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+class FakeOllama:
+    """/api/generate returning the canned answer for the question found in the prompt"""
+
+    def __init__(self, latency, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", free_port()), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                prompt = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["prompt"]
+                fake.calls += 1
+                time.sleep(fake.latency())
+                if random.random() < fake.error_rate:
+                    fake.errors += 1
+                    self._reply(500, {"error": "injected failure"})
+                    return
+                answer = fake.answer(prompt)
+                self._reply(200, {"model": "fake", "response": answer, "done": True,
+                                  "prompt_eval_count": len(prompt) // 4, "eval_count": len(answer) // 4})
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def answer(self, prompt: str) -> str:
+        for pattern, sql in QUESTION_PATTERNS:
+            match = pattern.search(prompt)
+            if match:
+                return sql.format(n=match.group(1))
+        # Follow-up refinements and unknown prompts get the first answer
+        return QUESTION_MIX[0][2].format(n=1)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class RedisStandIn:
+    """The RESP commands CacheManager sends (GET/SET/SETEX/INCR/LPUSH/LTRIM/LRANGE/SCAN/DEL), backed by a dict"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.commands = Counter()
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", free_port()), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+
+    def _handler(self):
+        store = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.proto = 2
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    args = []
+                    for _ in range(int(line[1:])):
+                        size = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(size + 2)[:-2])
+                    command = args[0].decode().upper()
+                    if command == "HELLO" and len(args) > 1:
+                        self.proto = int(args[1])
+                    self.wfile.write(store.execute(command, args[1:], self.proto))
+
+        return Handler
+
+    def execute(self, command: str, args: list, proto: int = 2) -> bytes:
+        self.commands[command] += 1
+        with self.lock:
+            for key in [k for k, at in self.expires.items() if at < time.time()]:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            if command == "PING":
+                return b"+PONG\r\n"
+            if command == "GET":
+                return bulk(self.data.get(args[0]), proto)
+            if command in ("SET", "SETEX"):
+                # SETEX key ttl value, or SET key value [EX ttl] as newer clients send it
+                key, value, ttl = (args[0], args[2], args[1]) if command == "SETEX" else (
+                    args[0], args[1], args[args.index(b"EX") + 1] if b"EX" in args else None)
+                self.data[key] = value
+                self.expires.pop(key, None)
+                if ttl is not None:
+                    self.expires[key] = time.time() + int(ttl)
+                return b"+OK\r\n"
+            if command in ("INCR", "INCRBY"):
+                value = int(self.data.get(args[0], b"0")) + (int(args[1]) if command == "INCRBY" else 1)
+                self.data[args[0]] = str(value).encode()
+                return f":{value}\r\n".encode()
+            if command == "LPUSH":
+                self.data.setdefault(args[0], [])[:0] = list(reversed(args[1:]))
+                return f":{len(self.data[args[0]])}\r\n".encode()
+            if command in ("LTRIM", "LRANGE"):
+                items = self.data.get(args[0], [])
+                start, end = int(args[1]), int(args[2])
+                selected = items[start:None if end == -1 else end + 1]
+                if command == "LTRIM":
+                    self.data[args[0]] = selected
+                    return b"+OK\r\n"
+                return array(selected)
+            if command == "DEL":
+                return f":{sum(self.data.pop(key, None) is not None for key in args)}\r\n".encode()
+            if command == "SCAN":
+                pattern = args[args.index(b"MATCH") + 1].rstrip(b"*") if b"MATCH" in args else b""
+                return b"*2\r\n" + bulk(b"0") + array([key for key in self.data if key.startswith(pattern)])
+            if command == "HELLO":
+                # Newer redis-py negotiates RESP3 on connect; replies differ only in how nil is written
+                return b"%2\r\n" + bulk(b"server") + bulk(b"redis-stand-in") + bulk(b"proto") + b":%d\r\n" % proto
+            if command in ("CLIENT", "SELECT"):
+                return b"+OK\r\n"
+            return f"-ERR unknown command '{command}'\r\n".encode()
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def bulk(value, proto: int = 2) -> bytes:
+    if value is None:
+        return b"_\r\n" if proto == 3 else b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def array(values: list) -> bytes:
+    return b"*%d\r\n" % len(values) + b"".join(bulk(value) for value in values)
+
+
+def start_app(port: int, workers: int, env: dict, log) -> subprocess.Popen:
+    # Create the system tables once, so the workers don't race to do it
+    subprocess.run([sys.executable, "-c", "from app.database import init_db; init_db()"],
+                   cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited during startup, see {log.name}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The app did not become healthy within 60s")
+
+
+def connect_tenant(base: str, tenant_db: str) -> tuple:
+    """Register a user, connect the seeded database and wait for its schema; returns (headers, tenant_id)"""
+    credentials = {"email": "loadtest@example.com", "password": "load-test-password"}
+    requests.post(f"{base}/api/auth/register", json={**credentials, "full_name": "Load Test"}, timeout=30)
+    login = requests.post(f"{base}/api/auth/login", timeout=30,
+                          data={"username": credentials["email"], "password": credentials["password"]})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    connect = requests.post(f"{base}/api/connect-db", headers=headers, timeout=30, json={
+        "db_type": "sqlite", "host": "", "port": "", "username": "", "password": "", "database": tenant_db
+    })
+    connect.raise_for_status()
+    tenant_id = connect.json()["tenant_id"]
+    deadline = time.time() + 60
+    while requests.get(f"{base}/api/schema-status/{tenant_id}", headers=headers, timeout=30).json().get("state") != "complete":
+        if time.time() > deadline:
+            raise RuntimeError("Schema extraction did not complete within 60s")
+        time.sleep(0.2)
+    return headers, tenant_id
+
+
+def run_load(base: str, headers: dict, tenant_id: str, rps: float, duration: float, concurrency: int,
+             variants: int, seed: int) -> list:
+    """Open-loop replay of the question mix; one result dict per request"""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in QUESTION_MIX]
+    local = threading.local()
+    results = []
+
+    def send(scheduled: float, question: str):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        result = {"question": question, "status": None, "cache_hit": False, "timings": {}, "error": None}
+        try:
+            response = local.session.post(f"{base}/api/ask", headers=headers, timeout=300, json={
+                "tenant_id": tenant_id, "question": question, "include_timings": True
+            })
+            result["status"] = response.status_code
+            if response.ok:
+                body = response.json()
+                result["cache_hit"] = body["cache_hit"]
+                result["timings"] = body.get("timings") or {}
+                if body.get("error") or body.get("timed_out"):
+                    result["error"] = "timed_out" if body.get("timed_out") else "query_error"
+            else:
+                result["error"] = f"http_{response.status_code}"
+        except requests.RequestException as e:
+            result["error"] = type(e).__name__
+        result["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+        results.append(result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        for i in range(int(rps * duration)):
+            scheduled = start + i / rps
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            question = rng.choices(QUESTION_MIX, weights)[0][1].format(n=rng.randint(1, variants))
+            pool.submit(send, scheduled, question)
+    return results
+
+
+def summarize(results: list, wall_seconds: float) -> dict:
+    answered = [r for r in results if r["status"] == 200]
+    latencies = [r["latency_ms"] for r in results]
+    stages = defaultdict(list)
+    for r in answered:
+        for name, ms in r["timings"].items():
+            stages[name].append(ms)
+    return {
+        "requests": len(results),
+        "throughput_rps": round(len(answered) / wall_seconds, 2),
+        "error_rate": round(sum(r["error"] is not None for r in results) / len(results), 4) if results else 0.0,
+        "errors": dict(Counter(r["error"] for r in results if r["error"])),
+        "cache_hit_rate": round(sum(r["cache_hit"] for r in answered) / len(answered), 4) if answered else 0.0,
+        "latency_ms": {f"p{p}": round(percentile(latencies, p), 1) for p in (50, 95, 99)} | {"max": round(max(latencies, default=0), 1)},
+        "stages_ms": {
+            name: {"count": len(values)} | {f"p{p}": round(percentile(values, p), 1) for p in (50, 95, 99)}
+            for name, values in sorted(stages.items(), key=lambda item: -percentile(item[1], 50))
+        }
+    }
+
+
+def print_report(summary: dict, llm: FakeOllama, redis_stand_in):
+    latency = summary["latency_ms"]
+    print(f"\n{summary['requests']} requests, {summary['throughput_rps']} answered/s")
+    print(f"latency      p50 {latency['p50']:.1f} ms   p95 {latency['p95']:.1f} ms   p99 {latency['p99']:.1f} ms   max {latency['max']:.1f} ms")
+    print(f"cache hits   {summary['cache_hit_rate']:.1%}")
+    print(f"errors       {summary['error_rate']:.2%} {summary['errors'] or ''}")
+    print(f"fake LLM     {llm.calls} calls, {llm.errors} injected failures")
+    if redis_stand_in:
+        print(f"redis        {dict(redis_stand_in.commands)}")
+    print(f"\n{'stage':22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in summary["stages_ms"].items():
+        print(f"{name:22}{stats['count']:>8}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=20, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds at the target rate before measuring")
+    parser.add_argument("--concurrency", type=int, default=256, help="Most requests in flight from the client")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--redis", default="standin", help="standin, none (memory cache only) or a Redis URL")
+    parser.add_argument("--llm-latency", default="lognormal:800:0.4", help="fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM calls answered with HTTP 500")
+    parser.add_argument("--variants", type=int, default=50, help="Distinct forms of each question (fewer = more cache hits)")
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="App setting override (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the configuration and summary to this file")
+    parser.add_argument("--app-log", help="Keep the app's output in this file (default: discarded)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nlpsql-load-")
+    llm = FakeOllama(parse_latency(args.llm_latency), args.llm_error_rate)
+    redis_stand_in = RedisStandIn() if args.redis == "standin" else None
+    process = None
+    log = open(args.app_log or os.path.join(workdir, "app.log"), "w")
+    try:
+        tenant_db = os.path.join(workdir, "tenant.db")
+        seed_tenant_db(tenant_db, args.customers, args.orders)
+        llm.start()
+        if redis_stand_in:
+            redis_stand_in.start()
+        redis_url = redis_stand_in.url if redis_stand_in else "redis://127.0.0.1:1/0" if args.redis == "none" else args.redis
+
+        port = free_port()
+        env = {
+            **os.environ,
+            "ENCRYPTION_KEY": os.environ.get("ENCRYPTION_KEY", "load-test-encryption-key"),
+            "SYSTEM_DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'system_data.db')}",
+            "REDIS_URL": redis_url,
+            "OLLAMA_BASE_URL": llm.url,
+            "ALLOW_SQLITE_TENANTS": "true",
+            "ROLLUP_DIR": os.path.join(workdir, "rollups"),
+            "TRACE_EXPORT_PATH": os.path.join(workdir, "traces.jsonl"),
+            **dict(override.split("=", 1) for override in args.env)
+        }
+        process = start_app(port, args.workers, env, log)
+        base = f"http://127.0.0.1:{port}"
+        headers, tenant_id = connect_tenant(base, tenant_db)
+
+        print(f"{args.workers} workers, redis={args.redis}, LLM latency {args.llm_latency}, "
+              f"{args.rps} req/s for {args.duration}s (+{args.warmup}s warmup)")
+        if args.warmup > 0:
+            run_load(base, headers, tenant_id, args.rps, args.warmup, args.concurrency, args.variants, args.seed + 1)
+        llm.calls = llm.errors = 0
+        started = time.perf_counter()
+        results = run_load(base, headers, tenant_id, args.rps, args.duration, args.concurrency, args.variants, args.seed)
+        summary = summarize(results, time.perf_counter() - started)
+        print_report(summary, llm, redis_stand_in)
+
+        if args.json:
+            config = {key: value for key, value in vars(args).items() if key != "json"}
+            with open(args.json, "w") as f:
+                json.dump({"config": config, "llm_calls": llm.calls, "summary": summary}, f, indent=2)
+            print(f"\nResults written to {args.json}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        log.close()
+        llm.stop()
+        if redis_stand_in:
+            redis_stand_in.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Microbenchmarks for the CPU-bound pieces of /api/ask: LLM output cleaning,
+SQL/MQL validation, schema formatting for prompts, result cache keys and
+(de)serialization, and tenant row conversion. Schemas are synthetic (10 to
+5000 tables by default) and LLM outputs come from a fixed corpus of the
+shapes models actually return. Redis and Ollama are replaced by in-process
+stand-ins, so nothing external is needed.
+
+Results are printed as a table and, with --json, written as JSON. --compare
+checks a run against a stored JSON baseline and exits non-zero when any case
+is slower than the baseline by more than --threshold.
+
+    python benchmarks/bench_pipeline.py [--sizes 10,100,1000,5000] [--filter validate] [--json results.json]
+    python benchmarks/bench_pipeline.py --json benchmarks/baseline.json           # store a baseline
+    python benchmarks/bench_pipeline.py --compare benchmarks/baseline.json [--threshold 0.15]
+"""
+import sys
+import os
+import argparse
+import json
+import platform
+import statistics
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "bench-encryption-key")
+
+from bson import ObjectId
+
+from app.cache_service import CacheManager
+from app.query_executor import QueryExecutor
+from app.services.nlp.llm_client import LLMClient
+from app.services.nlp.mocks import MockRow
+from app.services.nlp.mql_validator import MQLValidator
+from app.services.nlp.prompt_builder import PromptBuilder
+from app.services.nlp.sql_validator import SQLValidator
+
+COLUMN_TYPES = ["integer", "bigint", "varchar(255)", "text", "numeric(12,2)", "timestamp", "boolean", "date"]
+
+# Raw model outputs, as returned before cleaning
+SQL_OUTPUTS = [
+    "SELECT COUNT(*) FROM table_0",
+    "```sql\nSELECT column_0, SUM(column_4) AS total\nFROM table_1\nGROUP BY column_0\nORDER BY total DESC\nLIMIT 10;\n```",
+    "Here is the query you asked for:\n\nselect t.column_2, t.column_5 from public.table_2 t where t.column_5 >= '2024-01-01'",
+    "Sure! The following SQL joins the two tables:\n```\nSELECT a.column_0, b.column_3\nFROM table_3 a\n"
+    "JOIN table_4 b ON b.column_1 = a.column_0\nWHERE a.column_6 = true\n```\nThis returns one row per match.",
+    "SELECT column_0,\n       AVG(column_4) AS avg_value,\n       MAX(column_5) AS latest\n  FROM table_5\n"
+    " WHERE column_7 BETWEEN '2024-01-01' AND '2024-12-31'\n GROUP BY column_0\nHAVING COUNT(*) > 5",
+    "```SQL\nselect distinct column_2 from table_6 left join table_7 on table_7.column_1 = table_6.column_0 limit 50\n```",
+]
+MQL_OUTPUTS = [
+    '{"collection": "table_0", "pipeline": [{"$match": {"column_6": true}}, {"$count": "total"}]}',
+    "```json\n{\"collection\": \"table_1\", \"pipeline\": [{\"$group\": {\"_id\": \"$column_0\", "
+    "\"total\": {\"$sum\": \"$column_4\"}}}, {\"$sort\": {\"total\": -1}}, {\"$limit\": 10}]}\n```",
+    # Single quotes and a differently cased collection take the repair and case-insensitive lookup paths
+    "Here is the aggregation:\n{'collection': 'TABLE_2', 'pipeline': [{'$match': {'column_5': {'$gte': '2024-01-01'}}}, "
+    "{'$project': {'column_2': 1, 'column_5': 1}}]}",
+]
+
+
+class InProcessRedis:
+    """The Redis calls CacheManager makes, against a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.data.get(key, [])[start:end + 1]
+
+
+class InProcessCache(CacheManager):
+    def __init__(self):
+        self.redis_stand_in = InProcessRedis()
+        super().__init__()
+
+    def _check_redis(self):
+        self.redis_client = self.redis_stand_in
+        self.available = True
+        return True
+
+
+def make_schema(tables: int, columns: int = 12) -> dict:
+    schema = {"tables": {}}
+    for t in range(tables):
+        schema["tables"][f"table_{t}"] = {
+            "columns": {f"column_{c}": {"type": COLUMN_TYPES[(t + c) % len(COLUMN_TYPES)]} for c in range(columns)},
+            "relationships": [
+                {"column": "column_1", "references": {"table": f"table_{(t + 1) % tables}", "column": "column_0"}}
+            ]
+        }
+    return schema
+
+
+def make_rows(count: int) -> list:
+    return [
+        {"id": i, "customer": f"Customer {i % 97}", "amount": Decimal("19.99") * (i % 13),
+         "ratio": i / 7, "active": i % 2 == 0, "created_at": datetime(2024, 1 + i % 12, 1 + i % 28, 12, 30)}
+        for i in range(count)
+    ]
+
+
+def build_cases(sizes: list) -> dict:
+    """name -> zero-argument callable performing one operation"""
+    llm = LLMClient()
+    sql_validator = SQLValidator()
+    mql_validator = MQLValidator()
+    builder = PromptBuilder()
+    executor = QueryExecutor()
+    cleaned_sql = [llm._clean_output(output) for output in SQL_OUTPUTS]
+    cases = {
+        "llm_clean_output": lambda: [llm._clean_output(output) for output in SQL_OUTPUTS],
+    }
+
+    for size in sizes:
+        schema = make_schema(size)
+        cases[f"sql_validate[tables={size}]"] = lambda s=schema: [sql_validator.validate(q, s) for q in cleaned_sql]
+        cases[f"mql_validate[tables={size}]"] = lambda s=schema: [mql_validator.validate(q, s) for q in MQL_OUTPUTS]
+        cases[f"prompt_format_schema[tables={size}]"] = lambda s=schema: builder._format_schema(s)
+
+    cache = InProcessCache()
+    statements = [f"{q} -- variant {i}" for i in range(20) for q in cleaned_sql]
+    cases["cache_generate_key"] = lambda: [cache._generate_key("tenant_1", q, "v1") for q in statements]
+    for count in (10, 1000):
+        # amount as float: _json_serializer has no Decimal case, and the Redis write would just fail
+        rows = [{**executor._convert_row(MockRow(row)), "amount": float(row["amount"])} for row in make_rows(count)]
+
+        def cache_round_trip(rows=rows):
+            # Serialize into the Redis stand-in, then read back through Redis (memory copy dropped)
+            cache.cache_result("tenant_1", "SELECT * FROM table_0", rows, schema_version="v1", record_history=False)
+            cache.memory_cache.clear()
+            return cache.get_cached_result("tenant_1", "SELECT * FROM table_0", schema_version="v1")
+
+        cases[f"cache_round_trip[rows={count}]"] = cache_round_trip
+
+    sql_rows = [MockRow(row) for row in make_rows(1000)]
+    documents = [{"_id": ObjectId(), **row} for row in make_rows(1000)]
+    cases["convert_sql_rows[rows=1000]"] = lambda: [executor._convert_row(row) for row in sql_rows]
+    cases["convert_mongo_documents[rows=1000]"] = lambda: [executor._convert_document(doc) for doc in documents]
+    return cases
+
+
+def measure(func, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    per_op = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"median_us": statistics.median(per_op) * 1e6, "min_us": min(per_op) * 1e6, "loops": number}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """(name, baseline_us, current_us, ratio, verdict) for cases present in both runs"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["median_us"] / previous["median_us"]
+        verdict = "REGRESSION" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "ok"
+        rows.append((name, previous["median_us"], current["median_us"], ratio, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Schema sizes in tables, comma separated")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case (median is reported)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before a case is flagged")
+    args = parser.parse_args()
+
+    cases = build_cases([int(size) for size in args.sizes.split(",") if size])
+    results = {}
+    print(f"{'case':44}{'median':>14}{'min':>14}")
+    for name, func in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(func, args.repeat)
+        print(f"{name:44}{results[name]['median_us']:>11.1f} us{results[name]['min_us']:>11.1f} us")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                         "created_at": datetime.utcnow().isoformat(), "repeat": args.repeat},
+                "results": results
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n{'case':44}{'baseline':>14}{'current':>14}{'ratio':>8}")
+        for name, previous, current, ratio, verdict in rows:
+            print(f"{name:44}{previous:>11.1f} us{current:>11.1f} us{ratio:>8.2f}  {verdict}")
+        regressions = [row for row in rows if row[-1] == "REGRESSION"]
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Per-request prompt-building cost for a large tenant schema, with and without
+the rendered-prompt cache.
+
+    python benchmarks/bench_prompt_building.py [--tables 1000] [--columns 12] [--requests 200]
+"""
+import sys
+import os
+import argparse
+import time
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.nlp.prompt_builder import PromptBuilder
+
+def make_schema(tables: int, columns: int) -> dict:
+    schema = {"tables": {}}
+    for t in range(tables):
+        schema["tables"][f"table_{t}"] = {
+            "columns": {f"column_{c}": {"type": "integer" if c % 3 else "varchar(255)"} for c in range(columns)},
+            "relationships": [
+                {"column": "column_1", "references": {"table": f"table_{(t + 1) % tables}", "column": "column_0"}}
+            ]
+        }
+    return schema
+
+def time_requests(build, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        build(f"How many rows in table_{i % 50} last week?")
+    return (time.perf_counter() - started) / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    schema = make_schema(args.tables, args.columns)
+    builder = PromptBuilder()
+    key = ("bench_tenant", "v1", None)
+
+    # Before: every request re-renders the whole schema
+    uncached = time_requests(lambda q: builder.build(schema, q, db_type="postgresql"), args.requests)
+
+    # After: first request renders, the rest splice the question into the cached template
+    builder.build(schema, "warm up", db_type="postgresql", cache_key=key)
+    cached = time_requests(lambda q: builder.build(schema, q, db_type="postgresql", cache_key=key), args.requests)
+
+    prompt_kb = len(builder.build(schema, "x", db_type="postgresql", cache_key=key)) / 1024
+    print(f"Schema: {args.tables} tables x {args.columns} columns (prompt {prompt_kb:.0f} KiB)")
+    print(f"  uncached: {uncached * 1000:8.3f} ms/request")
+    print(f"  cached:   {cached * 1000:8.3f} ms/request")
+    print(f"  speedup:  {uncached / cached:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Worker memory held by tenant schemas: the previous layout (full + simplified
+nested dicts per tenant) against CompactSchema (one column-wise copy with
+interned names and types, both forms served as views).
+
+Schemas are decoded from JSON per tenant, as they are when loaded from a
+snapshot, so identical names are separate string objects until interned.
+The legacy layout is measured on a sample of tenants and extrapolated.
+
+    python benchmarks/bench_schema_memory.py [--tenants 1000] [--tables 500] [--columns 10] [--legacy-sample 20]
+"""
+import sys
+import os
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.compact_schema import CompactSchema
+
+COLUMN_NAMES = ["id", "name", "created_at", "updated_at", "status", "amount", "customer_id", "email",
+                "description", "price", "quantity", "order_id", "product_id", "is_active", "deleted_at"]
+COLUMN_TYPES = ["integer", "bigint", "varchar(255)", "text", "timestamp without time zone",
+                "numeric(12,2)", "boolean", "uuid", "jsonb", "date"]
+
+def tenant_schema_json(seed: int, tables: int, columns: int) -> str:
+    rng = random.Random(seed)
+    schema = {}
+    for t in range(tables):
+        cols = [{"name": "id", "type": "integer", "nullable": False, "primary_key": True}]
+        for c in range(columns - 1):
+            name = rng.choice(COLUMN_NAMES) if rng.random() < 0.7 else f"attr_{rng.randrange(200)}"
+            cols.append({"name": f"{name}_{c}" if name == "id" else name, "type": rng.choice(COLUMN_TYPES),
+                         "nullable": rng.random() < 0.5, "primary_key": False})
+        schema[f"table_{t}"] = {
+            "columns": cols,
+            "relations": [{"column": "customer_id", "references_table": f"table_{(t + 1) % tables}", "references_column": "id"}],
+            "indexes": [{"name": f"ix_table_{t}_created", "columns": ["created_at"], "unique": False}],
+            "row_count": rng.randrange(1_000_000)
+        }
+    return json.dumps(schema)
+
+def legacy_layout(schema: dict) -> tuple:
+    """What SchemaExtractor used to keep: the full dict plus a separately built simplified dict"""
+    simple = {}
+    for name, table in schema.items():
+        simple[name] = {
+            "columns": {col["name"]: {"type": col["type"]} for col in table["columns"]},
+            "relationships": [
+                {"column": rel["column"], "references": {"table": rel["references_table"], "column": rel["references_column"]}}
+                for rel in table["relations"]
+            ]
+        }
+    return schema, {"tables": simple}
+
+def measure(build, count: int) -> float:
+    """Bytes retained per tenant after building `count` tenants"""
+    held = []
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        held.append(build(i))
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--legacy-sample", type=int, default=20)
+    args = parser.parse_args()
+
+    # A handful of distinct schema payloads, decoded fresh for each tenant
+    payloads = [tenant_schema_json(seed, args.tables, args.columns) for seed in range(8)]
+
+    started = time.perf_counter()
+    legacy = measure(lambda i: legacy_layout(json.loads(payloads[i % len(payloads)])), args.legacy_sample)
+    compact = measure(lambda i: CompactSchema.from_dict(json.loads(payloads[i % len(payloads)])), args.tenants)
+    elapsed = time.perf_counter() - started
+
+    mib = 1024 * 1024
+    print(f"{args.tenants} tenants x {args.tables} tables x {args.columns} columns")
+    print(f"  legacy (full + simple dicts): {legacy / mib:8.2f} MiB/tenant -> {legacy * args.tenants / mib:9.0f} MiB "
+          f"(extrapolated from {args.legacy_sample})")
+    print(f"  compact (views over one copy): {compact / mib:7.2f} MiB/tenant -> {compact * args.tenants / mib:9.0f} MiB (measured)")
+    print(f"  reduction: {legacy / compact:.1f}x  ({elapsed:.0f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,164 @@ Creates single instances of services to be shared across the app
 
 from app.db_service import DatabaseConnectionManager
 from app.schema_service import SchemaExtractor
+from app.mongo_schema import MongoSchemaInferrer
 from app.cache_service import CacheManager
 from app.cleanup_service import CleanupService
+from app.query_executor import QueryExecutor
+from app.schema_drift_service import SchemaDriftWatcher
+from app.chart_service import ChartService
+from app.profile_service import ProfileService
+from app.rollup_service import RollupManager
+from app.history_writer import HistoryWriter
+from app.history_service import HistoryService
+from app.slow_query_service import SlowQueryLog
 from app.services.nlp.query_service import QueryService
+from app.services.nlp.llm_client import LLMClient
+from app.services.nlp.followup_service import FollowUpService
+from app.metrics import metrics
+from app.tracing import BatchSpanExporter
+from app.database import engine as system_engine
+from config import settings
 
 # Create singleton instances
 db_service = DatabaseConnectionManager()
 cache_service = CacheManager()
-schema_service = SchemaExtractor(db_service)
-cleanup_service = CleanupService(db_service, schema_service, cache_service)
-query_service = QueryService(db_service, schema_service, cache_service)
+schema_service = SchemaExtractor(
+    db_service,
+    max_workers=settings.SCHEMA_EXTRACTION_WORKERS,
+    chunk_size=settings.SCHEMA_EXTRACTION_CHUNK_SIZE,
+    max_concurrent_extractions=settings.SCHEMA_MAX_CONCURRENT_EXTRACTIONS,
+    partial_wait_seconds=settings.SCHEMA_PARTIAL_WAIT_SECONDS,
+    snapshot_check_seconds=settings.SCHEMA_SNAPSHOT_CHECK_SECONDS,
+    mongo_inferrer=MongoSchemaInferrer(
+        sample_size=settings.MONGO_SCHEMA_SAMPLE_SIZE,
+        time_budget_ms=settings.MONGO_SCHEMA_TIME_BUDGET_MS,
+        max_depth=settings.MONGO_SCHEMA_MAX_DEPTH
+    )
+)
+schema_drift_watcher = SchemaDriftWatcher(
+    db_service,
+    schema_service,
+    interval_seconds=settings.SCHEMA_DRIFT_INTERVAL_SECONDS,
+    max_interval_seconds=settings.SCHEMA_DRIFT_MAX_INTERVAL_SECONDS,
+    jitter=settings.SCHEMA_DRIFT_JITTER
+)
+# Refreshed tables drop the cached results and rendered prompts that read them
+schema_service.add_change_listener(cache_service.invalidate_tables)
+query_executor = QueryExecutor(default_timeout_ms=settings.QUERY_TIMEOUT_MS)
+profile_service = ProfileService(
+    db_service,
+    schema_service,
+    query_executor,
+    sample_rows=settings.COLUMN_PROFILE_SAMPLE_ROWS,
+    time_budget_ms=settings.COLUMN_PROFILE_TIME_BUDGET_MS,
+    top_k=settings.COLUMN_PROFILE_TOP_K,
+    histogram_bins=settings.COLUMN_PROFILE_HISTOGRAM_BINS
+)
+rollup_manager = RollupManager(
+    db_service,
+    schema_service,
+    query_executor,
+    storage_dir=settings.ROLLUP_DIR,
+    min_hits=settings.ROLLUP_MIN_HITS,
+    max_rollups_per_tenant=settings.ROLLUP_MAX_PER_TENANT,
+    refresh_seconds=settings.ROLLUP_REFRESH_SECONDS,
+    max_rows=settings.ROLLUP_MAX_ROWS
+)
+# Rollups are opt-in: services only consult them when enabled
+active_rollups = rollup_manager if settings.ROLLUPS_ENABLED else None
+history_writer = HistoryWriter(
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL_SECONDS,
+    max_queue=settings.HISTORY_QUEUE_MAX,
+    enqueue_timeout_ms=settings.HISTORY_ENQUEUE_TIMEOUT_MS
+)
+history_service = HistoryService(
+    retention_days=settings.HISTORY_RETENTION_DAYS,
+    batch_size=settings.HISTORY_COMPACTION_BATCH,
+    recent_window=settings.HISTORY_FREQUENT_WINDOW
+)
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    max_per_tenant=settings.SLOW_QUERY_MAX_PER_TENANT,
+    explain=settings.SLOW_QUERY_EXPLAIN_ENABLED,
+    explain_timeout_ms=settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS
+)
+cleanup_service = CleanupService(
+    db_service,
+    schema_service,
+    cache_service,
+    profile_service=profile_service,
+    rollup_manager=rollup_manager,
+    history_service=history_service,
+    slow_query_log=slow_query_log
+)
+span_exporter = BatchSpanExporter(
+    path=settings.TRACE_EXPORT_PATH,
+    url=settings.TRACE_EXPORT_URL,
+    service_name=settings.TRACE_SERVICE_NAME,
+    batch_size=settings.TRACE_BATCH_SIZE,
+    flush_interval=settings.TRACE_FLUSH_INTERVAL_SECONDS,
+    max_queue=settings.TRACE_QUEUE_MAX
+)
+llm_client = LLMClient(model=settings.OLLAMA_MODEL, base_url=settings.OLLAMA_BASE_URL)
+followup_service = FollowUpService(
+    cache_service,
+    llm_client=llm_client,
+    max_rows=settings.FOLLOWUP_MAX_ROWS,
+    ttl=settings.FOLLOWUP_TTL,
+    timeout_ms=settings.FOLLOWUP_TIMEOUT_MS,
+    use_llm=settings.FOLLOWUP_LLM_ENABLED
+)
+query_service = QueryService(
+    db_service,
+    schema_service,
+    cache_service,
+    llm_client=llm_client,
+    query_executor=query_executor,
+    profile_service=profile_service,
+    rollup_manager=active_rollups,
+    followup_service=followup_service if settings.FOLLOWUPS_ENABLED else None,
+    history_writer=history_writer,
+    slow_query_log=slow_query_log
+)
+chart_service = ChartService(
+    db_service,
+    schema_service,
+    query_executor,
+    cache_service=cache_service,
+    max_points=settings.CHART_MAX_POINTS,
+    max_raw_points=settings.CHART_MAX_RAW_POINTS,
+    batch_concurrency=settings.CHART_BATCH_CONCURRENCY,
+    cache_ttl=settings.CHART_CACHE_TTL,
+    rollup_manager=active_rollups
+)
+schema_service.add_change_listener(query_service.prompt_builder.invalidate)
+schema_service.add_change_listener(profile_service.invalidate)
+schema_service.add_change_listener(rollup_manager.invalidate)
+
+# Pool and queue gauges are read when /metrics is scraped
+metrics.configure(max_tenant_labels=settings.METRICS_MAX_TENANT_LABELS)
+metrics.gauge("nlpsql_tenant_pools", "Tenant engines currently registered",
+              lambda: db_service.registry.get_stats()["engines"])
+
+def _tenant_pool_connections():
+    stats = db_service.registry.get_stats()
+    return [({"state": "reserved"}, stats["reserved_connections"]),
+            ({"state": "checked_out"}, stats["checked_out_connections"])]
+
+metrics.gauge("nlpsql_tenant_pool_connections", "Tenant pool connections reserved and checked out",
+              _tenant_pool_connections)
+metrics.gauge("nlpsql_system_db_pool_connections", "System database pool connections", lambda: [
+    ({"state": "checked_out"}, system_engine.pool.checkedout()),
+    ({"state": "idle"}, system_engine.pool.checkedin())
+] if hasattr(system_engine.pool, "checkedout") else None)
+metrics.gauge("nlpsql_history_queue_depth", "Query history rows waiting to be written",
+              lambda: history_writer.get_stats()["queued"])
+metrics.gauge("nlpsql_cache_lookups_total", "Result cache lookups", lambda: [
+    ({"result": "hit"}, cache_service.hits),
+    ({"result": "miss"}, cache_service.misses)
+], kind="counter")
 
 # Dependency functions for FastAPI
 def get_db_service():
@@ -35,4 +183,36 @@ def get_cleanup_service():
 
 def get_query_service():
     """Dependency to get Query service instance"""
-    return query_service
\ No newline at end of file
+    return query_service
+
+def get_query_executor():
+    """Dependency to get tenant query executor instance"""
+    return query_executor
+
+def get_chart_service():
+    """Dependency to get insights chart service instance"""
+    return chart_service
+
+def get_profile_service():
+    """Dependency to get column profiling service instance"""
+    return profile_service
+
+def get_rollup_manager():
+    """Dependency to get rollup manager instance"""
+    return rollup_manager
+
+def get_history_writer():
+    """Dependency to get query history writer instance"""
+    return history_writer
+
+def get_history_service():
+    """Dependency to get query history service instance"""
+    return history_service
+
+def get_slow_query_log():
+    """Dependency to get slow query log instance"""
+    return slow_query_log
+
+def get_schema_drift_watcher():
+    """Dependency to get schema drift watcher instance"""
+    return schema_drift_watcher
\ No newline at end of file
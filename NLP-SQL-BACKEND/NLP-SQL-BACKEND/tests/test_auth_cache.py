@@ -0,0 +1,130 @@
+import sys
+import os
+import time
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import auth_service, models
+from app.auth_cache import TokenCache, UserCache
+from app.auth_router import router as auth_router
+from app.database import Base, get_db
+
+def make_app(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    app = FastAPI()
+    app.include_router(auth_router)
+
+    @app.get("/noop")
+    async def noop(current_user=Depends(auth_service.get_current_user)):
+        return {"id": current_user.id}
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_db
+
+    db = session_factory()
+    db.add(models.User(email="ada@example.com", full_name="Ada", hashed_password=""))
+    db.commit()
+    db.close()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return TestClient(app), statements
+
+def test_auth_cache(tmp_path):
+    auth_service.token_cache = TokenCache(ttl_seconds=300)
+    auth_service.user_cache = UserCache(ttl_seconds=300)
+    client, statements = make_app(tmp_path)
+    token = auth_service.create_access_token({"sub": "ada@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    decodes = []
+    decode = auth_service.jwt.decode
+    auth_service.jwt.decode = lambda *args, **kwargs: decodes.append(1) or decode(*args, **kwargs)
+    try:
+        # 1. Only the first request verifies the token, checks revocations and reads the user
+        for _ in range(5):
+            assert client.get("/noop", headers=headers).json() == {"id": 1}
+        print(f"✅ 5 requests: {len(decodes)} decode(s), {len(statements)} system DB statement(s)")
+        assert len(decodes) == 1 and len(statements) == 3
+
+        # 2. A user update drops the cached record
+        auth_service.invalidate_user(email="ada@example.com")
+        client.get("/noop", headers=headers)
+        assert len(statements) == 4 and len(decodes) == 1
+
+        # 3. A revoked token is refused even after its cache entry is gone
+        assert client.post("/api/auth/logout", headers=headers).status_code == 200
+        assert client.get("/noop", headers=headers).status_code == 401
+        auth_service.token_cache.clear()
+        assert client.get("/noop", headers=headers).status_code == 401
+
+        # 4. Bad tokens are never cached
+        assert client.get("/noop", headers={"Authorization": "Bearer nonsense"}).status_code == 401
+        assert auth_service.token_cache.get("nonsense") is None
+    finally:
+        auth_service.jwt.decode = decode
+    print(f"✅ Token cache: {auth_service.token_cache.get_stats()}")
+
+def test_logout_reaches_other_workers(tmp_path):
+    client, _ = make_app(tmp_path)
+    token = auth_service.create_access_token({"sub": "ada@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+    # Each worker process has its own caches; swap them to play two workers
+    worker_a, worker_b = TokenCache(ttl_seconds=300), TokenCache(ttl_seconds=300)
+    auth_service.user_cache = UserCache(ttl_seconds=300)
+
+    auth_service.token_cache = worker_b
+    assert client.get("/noop", headers=headers).status_code == 200 # Now cached on B
+
+    # 1. Logging out on A persists the revocation
+    auth_service.token_cache = worker_a
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+
+    # 2. B drops its cached token at its next revocation sync
+    auth_service.token_cache = worker_b
+    worker_b.synced_at = 0
+    assert client.get("/noop", headers=headers).status_code == 401
+
+    # 3. A worker that never saw the token refuses it straight away
+    auth_service.token_cache = TokenCache(ttl_seconds=300)
+    assert client.get("/noop", headers=headers).status_code == 401
+    print(f"✅ Worker B after sync: {worker_b.get_stats()}")
+
+def test_token_cache_respects_exp():
+    cache = TokenCache(ttl_seconds=300, max_entries=2)
+    cache.put("expired", "a@example.com", expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+    for token in ("t1", "t2", "t3"):
+        cache.put(token, "a@example.com")
+    assert cache.get("t1") is None and cache.get("t3") == "a@example.com"
+    cache.revoke("t3")
+    assert cache.get("t3") is None and cache.is_revoked("t3")
+
+    users = UserCache()
+    user = auth_service.CachedUser(id=7, email="b@example.com", full_name="B", google_id=None, created_at=None)
+    users.put(user)
+    assert users.get("b@example.com") == user
+    users.invalidate("b@example.com")
+    assert users.get("b@example.com") is None
+
+    print("\n✅ Auth caches verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_auth_cache(pathlib.Path(tempfile.mkdtemp()))
+    test_logout_reaches_other_workers(pathlib.Path(tempfile.mkdtemp()))
+    test_token_cache_respects_exp()
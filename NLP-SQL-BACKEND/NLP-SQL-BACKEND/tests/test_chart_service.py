@@ -0,0 +1,199 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+import math
+import threading
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from app.auth_service import get_current_user
+from app.chart_service import ChartService, ColumnNotFoundError, NUMERIC_TYPE, lttb
+from app.database import get_db
+from app.insights_router import router as insights_router
+from dependencies import get_chart_service
+from app.compact_schema import CompactSchema
+from app.services.nlp.mocks import MockCacheService
+
+SCHEMA = CompactSchema.from_dict({
+    "orders": {
+        "columns": [
+            {"name": "id", "type": "integer", "nullable": False, "primary_key": True},
+            {"name": "status", "type": "varchar(20)", "nullable": True, "primary_key": False},
+            {"name": "amount", "type": "numeric(10,2)", "nullable": True, "primary_key": False},
+            {"name": "created", "type": "timestamp", "nullable": True, "primary_key": False},
+        ],
+        "relations": [], "indexes": [], "row_count": 10
+    }
+})
+
+class FakeDbService:
+    def __init__(self, db_type):
+        self.record = SimpleNamespace(db_type=db_type, database_name="shop", query_timeout_ms=None)
+    def get_connection_info(self, tenant_id, user_id, db):
+        return self.record
+    def get_engine(self, tenant_id, user_id, db):
+        return SimpleNamespace(dialect=postgresql.dialect())
+
+class FakeSchemaService:
+    def get_schema(self, tenant_id, simplified=False):
+        return SCHEMA.full
+    def get_schema_version(self, tenant_id):
+        return "v1"
+
+class RecordingExecutor:
+    """Returns canned rows in order and records every query sent"""
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.sent = []
+        self.lock = threading.Lock()
+    def resolve_timeout_ms(self, conn_record):
+        return 1000
+    def execute_sql(self, engine, sql, db_type, tenant_id, timeout_ms=None, cancel_token=None):
+        with self.lock:
+            self.sent.append(sql)
+            return self.answers.pop(0)
+    def execute_mongo(self, client, db_name, collection, pipeline, tenant_id, timeout_ms=None, cancel_token=None):
+        self.sent.append(pipeline)
+        return self.answers.pop(0)
+
+def chart(**overrides):
+    spec = dict(tenant_id="t1", table_name="orders", x_column="status", y_column="amount",
+                chart_type="bar", aggregation="auto", bucket="auto", max_points=None)
+    spec.update(overrides)
+    return SimpleNamespace(**spec)
+
+def test_chart_service():
+    # 1. LTTB keeps the endpoints and the spike
+    xs = [float(i) for i in range(1000)]
+    ys = [math.sin(i / 50) for i in range(1000)]
+    ys[500] = 25.0
+    kept = lttb(xs, ys, 100)
+    print(f"✅ LTTB kept {len(kept)} of {len(xs)} points")
+    assert len(kept) == 100 and kept[0] == 0 and kept[-1] == 999
+    assert 500 in kept and kept == sorted(kept)
+    assert lttb(xs[:10], ys[:10], 50) == list(range(10))
+
+    # 2. Categories are grouped in the database, top-N capped
+    executor = RecordingExecutor([[{"x": "paid", "y": 40}, {"x": "new", "y": 30}, {"x": "void", "y": 1}]])
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), executor, max_points=2)
+    data = service.get_chart_data(chart(), user_id=1, db=None)
+    print(f"✅ Category SQL: {executor.sent[0]}")
+    assert 'SUM("amount")' in executor.sent[0] and 'GROUP BY "status"' in executor.sent[0]
+    assert "LIMIT 3" in executor.sent[0]
+    assert data["x"] == ["new", "paid"] and data["truncated"] is True
+
+    # 3. Temporal axes are bucketed with date_trunc sized to max_points
+    executor = RecordingExecutor([
+        [{"lo": "2024-01-01T00:00:00", "hi": "2024-12-31T00:00:00"}],
+        [{"x": "2024-01-01T00:00:00", "y": 5}],
+    ])
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), executor, max_points=60)
+    data = service.get_chart_data(chart(x_column="created", chart_type="line"), user_id=1, db=None)
+    print(f"✅ Time bucket SQL: {executor.sent[1]}")
+    assert data["bucket"] == "week"
+    assert "date_trunc('week', \"created\")" in executor.sent[1]
+
+    # 4. Raw lines are fetched once and downsampled to max_points
+    raw = [{"x": i, "y": i % 7} for i in range(1000)]
+    executor = RecordingExecutor([raw])
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), executor, max_points=100)
+    data = service.get_chart_data(chart(x_column="id", chart_type="line", aggregation="none"), user_id=1, db=None)
+    assert len(data["x"]) == 100 and data["raw_points"] == 1000 and data["downsampled"] is True
+
+    # 5. MongoDB pushes numeric line buckets into $bucketAuto
+    executor = RecordingExecutor([[{"_id": {"min": 1, "max": 5}, "y": 12}]])
+    service = ChartService(FakeDbService("mongodb"), FakeSchemaService(), executor, max_points=20)
+    data = service.get_chart_data(chart(x_column="id", chart_type="line"), user_id=1, db=None)
+    print(f"✅ Mongo pipeline: {executor.sent[0]}")
+    assert executor.sent[0][1]["$bucketAuto"]["buckets"] == 20
+    assert data == {"x": ["1"], "y": [12.0], "bucket": "auto", "aggregation": "sum", "truncated": False, "downsampled": False}
+
+    # 6. Names outside the schema never reach the database
+    executor = RecordingExecutor([])
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), executor)
+    try:
+        service.get_chart_data(chart(x_column="status; DROP TABLE orders"), user_id=1, db=None)
+        assert False, "unknown column accepted"
+    except ColumnNotFoundError as e:
+        print(f"✅ Rejected: {e}")
+    assert executor.sent == []
+
+    print("\n✅ Chart aggregation verified successfully!")
+
+def test_chart_batch_cache():
+    cache = MockCacheService()
+    rows = [{"x": "paid", "y": 40}]
+    executor = RecordingExecutor([rows, rows, rows])
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), executor, cache_service=cache, max_points=50)
+
+    # 1. Specs that differ only in option spelling share one cache entry
+    assert ChartService.cache_key(chart(chart_type="BAR"), 50) == ChartService.cache_key(chart(max_points=500), 50)
+    assert ChartService.cache_key(chart(x_column="Status"), 50) != ChartService.cache_key(chart(), 50)
+
+    # 2. A batch runs every spec concurrently and isolates a bad one
+    specs = [chart(), chart(x_column="created", chart_type="pie"), chart(y_column="missing")]
+    batch = service.get_chart_batch("t1", specs, user_id=1, db=None)
+    print(f"✅ Batch: {batch}")
+    assert batch["charts"][0]["data"]["x"] == ["paid"] and batch["charts"][0]["data"]["cached"] is False
+    assert batch["charts"][2]["status_code"] == 404
+    assert len(executor.sent) == 2
+
+    # 3. Revisiting the dashboard is served from the cache without touching the database
+    again = service.get_chart_batch("t1", specs[:2], user_id=1, db=None)
+    assert again["cached"] == 2 and len(executor.sent) == 2
+    assert any(key.startswith("t1:v1:chart:") for key in cache.data)
+
+    # 4. The single-chart endpoint shares the same entries
+    assert service.get_chart_data(chart(tenant_id="t1", chart_type="Bar"), user_id=1, db=None)["cached"] is True
+
+def test_numeric_types():
+    # Whole type names across dialects, not substrings: point and interval are never summed
+    for numeric in ("integer", "int(11) unsigned", "int4", "bigint", "numeric(10,2)", "double precision", "DOUBLE_PRECISION", "long"):
+        assert NUMERIC_TYPE.search(numeric), numeric
+    for other in ("point", "interval", "varchar(20)", "timestamp", "boolean", "tsvector"):
+        assert not NUMERIC_TYPE.search(other), other
+    print("✅ Numeric column types recognized by whole name")
+
+def test_chart_errors_map_to_status():
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), RecordingExecutor([]))
+    app = FastAPI()
+    app.include_router(insights_router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    app.dependency_overrides[get_db] = lambda: None
+    app.dependency_overrides[get_chart_service] = lambda: service
+    client = TestClient(app)
+    body = {"tenant_id": "t1", "table_name": "orders", "x_column": "status", "y_column": "amount"}
+
+    # 1. Unknown tables and columns are 404s, in a single chart and inside a batch
+    assert client.post("/api/insights/chart-data", json={**body, "table_name": "refunds"}).status_code == 404
+    assert client.post("/api/insights/chart-data", json={**body, "y_column": "missing"}).status_code == 404
+    batch = client.post("/api/insights/chart-data/batch", json={"tenant_id": "t1", "charts": [{**body, "x_column": "nope"}]})
+    assert batch.json()["charts"][0]["status_code"] == 404
+
+    # 2. A KeyError from a bug is a server error, not a missing resource
+    def broken(*args, **kwargs):
+        raise KeyError("x")
+    service.get_chart_data = service.get_chart_batch = broken
+    assert client.post("/api/insights/chart-data", json=body).status_code == 500
+    assert client.post("/api/insights/chart-data/batch", json={"tenant_id": "t1", "charts": [body]}).status_code == 500
+
+    # 3. Filters are refused instead of silently returning (and caching) unfiltered data
+    service = ChartService(FakeDbService("postgresql"), FakeSchemaService(), RecordingExecutor([]), cache_service=MockCacheService())
+    app.dependency_overrides[get_chart_service] = lambda: service
+    filtered = {**body, "filters": {"status": "paid"}}
+    assert client.post("/api/insights/chart-data", json=filtered).status_code == 400
+    batch = client.post("/api/insights/chart-data/batch", json={"tenant_id": "t1", "charts": [filtered]})
+    assert batch.json()["charts"][0]["status_code"] == 400 and service.query_executor.sent == []
+    print("✅ Not-found errors map to 404, other lookups to 500")
+
+if __name__ == "__main__":
+    test_chart_service()
+    test_chart_batch_cache()
+    test_numeric_types()
+    test_chart_errors_map_to_status()
@@ -0,0 +1,102 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import TenantProfile
+from app.column_stats import HyperLogLog, profile_rows
+from app.profile_service import ProfileService
+from app.query_executor import QueryExecutor
+from app.schema_service import SchemaExtractor
+from app.services.nlp.prompt_builder import PromptBuilder
+
+class TenantDBService:
+    def __init__(self, engine):
+        self.engine = engine
+        self.record = SimpleNamespace(db_type="sqlite", database_name=None, query_timeout_ms=None)
+    def get_connection_info(self, tenant_id, user_id, db):
+        return self.record
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+def test_column_stats():
+    # 1. HyperLogLog stays within a few percent in 4 KiB
+    sketch = HyperLogLog()
+    for i in range(100000):
+        sketch.add(f"user-{i}")
+    print(f"✅ HLL estimate for 100000 distinct: {sketch.count()}")
+    assert abs(sketch.count() - 100000) / 100000 < 0.05
+    small = HyperLogLog()
+    for value in ["a", "b", "c", "a"]:
+        small.add(value)
+    assert small.count() == 3
+
+    # 2. One pass yields nulls, range, top values, histogram and nested paths
+    rows = [{"status": s, "amount": a, "meta": {"source": "web"}} for s, a in
+            [("paid", 10), ("paid", 20), ("new", 30), (None, 40)]]
+    profile = profile_rows(rows, ["status", "amount", "meta.source"], top_k=2, bins=3)
+    status, amount = profile["columns"]["status"], profile["columns"]["amount"]
+    print(f"✅ Column profile: {profile}")
+    assert profile["sampled_rows"] == 4
+    assert status["null_fraction"] == 0.25 and status["distinct"] == 2
+    assert status["top_values"][0] == ["paid", 2] and status["histogram"] is None
+    assert (amount["min"], amount["max"]) == (10.0, 40.0)
+    assert amount["histogram"] == {"edges": [10.0, 20.0, 30.0, 40.0], "counts": [1, 1, 2]}
+    assert profile["columns"]["meta.source"]["top_values"] == [["web", 4]]
+
+def test_profile_service(tmp_path):
+    system_engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}")
+    Base.metadata.create_all(bind=system_engine)
+    session_factory = sessionmaker(bind=system_engine)
+
+    tenant_engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}")
+    with tenant_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, status VARCHAR(10), amount NUMERIC, created TIMESTAMP)"))
+        for i in range(60):
+            conn.execute(text("INSERT INTO orders VALUES (:i, :s, :a, :c)"),
+                         {"i": i, "s": ("paid", "new", "void")[i % 3], "a": i * 1.5, "c": f"2024-01-{i % 28 + 1:02d}"})
+
+    db_service = TenantDBService(tenant_engine)
+    schema_service = SchemaExtractor(db_service, session_factory=session_factory)
+    schema_service.extract_and_store_schema("tenant_1", 1, db=None)
+    service = ProfileService(db_service, schema_service, QueryExecutor(), sample_rows=50, session_factory=session_factory)
+
+    # 1. One bounded query per table, statistics persisted for other workers
+    profile = service.profile_tenant("tenant_1", 1, db=None)
+    orders = profile["tables"]["orders"]
+    assert orders["sampled_rows"] == 50
+    assert orders["columns"]["status"]["distinct"] == 3
+    other = ProfileService(db_service, schema_service, QueryExecutor(), session_factory=session_factory)
+    assert other.get_profile("tenant_1")["version"] == profile["version"]
+
+    # 2. Suggestions and prompt hints come from the profile alone
+    suggestions = service.suggest_charts("tenant_1")
+    print(f"✅ Suggestions: {suggestions}")
+    assert suggestions[0]["chart_type"] == "line" and suggestions[0]["x_column"] == "created"
+    assert suggestions[0]["y_column"] == "amount" and suggestions[0]["aggregation"] == "sum"
+    assert any(s["chart_type"] == "pie" and s["x_column"] == "status" for s in suggestions)
+    version, hints = service.prompt_hints("tenant_1")
+    prompt = PromptBuilder().build(schema_service.get_schema("tenant_1", simplified=True), "Paid orders?",
+                                   db_type="postgresql", column_hints=hints)
+    assert "status (VARCHAR(10)) values: 'paid', 'new', 'void'" in prompt
+
+    # 3. Changed tables drop out of the profile, a disconnect removes it
+    service.invalidate("tenant_1", ["orders"])
+    assert service.get_profile("tenant_1")["tables"] == {}
+    assert service.get_profile("tenant_1")["version"] != version
+    service.remove_profile("tenant_1")
+    assert ProfileService(db_service, schema_service, QueryExecutor(), session_factory=session_factory).get_profile("tenant_1") is None
+
+    print("\n✅ Column profiling verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_column_stats()
+    test_profile_service(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,60 @@
+import sys
+import os
+import json
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.compact_schema import CompactSchema
+
+def test_compact_schema():
+    schema = {
+        "orders": {
+            "columns": [
+                {"name": "id", "type": "integer", "nullable": False, "primary_key": True},
+                {"name": "customer_id", "type": "integer", "nullable": True, "primary_key": False}
+            ],
+            "relations": [{"column": "customer_id", "references_table": "customers", "references_column": "id"}],
+            "indexes": [{"name": "ix_orders_customer", "columns": ["customer_id"], "unique": False}],
+            "row_count": 42
+        },
+        "customers": {
+            "columns": [{"name": "id", "type": "integer", "nullable": False, "primary_key": True}],
+            "relations": [],
+            "indexes": [],
+            "row_count": 7
+        }
+    }
+    compact = CompactSchema.from_dict(json.loads(json.dumps(schema)), version="v1")
+
+    # 1. The full view round-trips the extractor shape
+    print(f"✅ Full view: {dict(compact.full)}")
+    assert dict(compact.full) == schema
+
+    # 2. The simplified view is a projection of the same tables
+    simple = compact.simplified
+    assert simple["version"] == "v1"
+    assert simple["tables"]["orders"] == {
+        "columns": {"id": {"type": "integer"}, "customer_id": {"type": "integer"}},
+        "relationships": [{"column": "customer_id", "references": {"table": "customers", "column": "id"}}]
+    }
+    assert set(simple["tables"].keys()) == {"orders", "customers"}
+
+    # 3. Names and types are interned across tables (and tenants)
+    other = CompactSchema.from_dict(json.loads(json.dumps(schema)))
+    assert compact.tables["orders"].column_types[0] is other.tables["customers"].column_types[0]
+    assert compact.tables["orders"].column_names[0] is other.tables["orders"].column_names[0]
+
+    # 4. Views are read-only; dicts handed out are copies
+    try:
+        simple["tables"]["orders"] = {}
+        assert False, "view should be read-only"
+    except TypeError:
+        pass
+    compact.full["orders"]["columns"].clear()
+    assert len(compact.full["orders"]["columns"]) == 2
+
+    print("\n✅ Compact schema verified successfully!")
+
+if __name__ == "__main__":
+    test_compact_schema()
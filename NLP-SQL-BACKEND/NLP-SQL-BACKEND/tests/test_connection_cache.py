@@ -0,0 +1,114 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import TenantConnection
+from app.db_service import DatabaseConnectionManager
+from config import settings
+
+def test_connection_cache():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(TenantConnection(tenant_id="t1", user_id=7, db_type="mysql", host="h", port="3306",
+                            database_name="shop", username="u", password="x"))
+    db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    manager = DatabaseConnectionManager()
+
+    # 1. First lookup reads the system DB, repeat lookups do not
+    info = manager.get_connection_info("t1", 7, db)
+    assert info.db_type == "mysql" and info.database_name == "shop"
+    reads = len(statements)
+    for _ in range(5):
+        assert manager.get_connection_info("t1", 7, db) == info
+    print(f"✅ System DB statements: {reads} for 6 lookups")
+    assert reads == 1 and len(statements) == 1
+
+    # 2. Another user never sees the tenant
+    assert manager.get_connection_info("t1", 8, db) is None
+
+    # 3. Disconnect invalidates the cached ownership
+    manager.close_connection("t1", user_id=7, db=db)
+    assert manager.get_connection_info("t1", 7, db) is None
+    print(f"✅ Cache stats: {manager.metadata_cache.get_stats()}")
+
+    print("\n✅ Connection metadata cache verified successfully!")
+
+def test_sqlite_tenants_opt_in(tmp_path):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    manager = DatabaseConnectionManager()
+    credentials = {"db_type": "sqlite", "host": "", "port": "", "username": "", "password": "",
+                   "database": str(tmp_path / "tenant.db")}
+
+    # 1. Server-local files are refused unless explicitly allowed
+    assert not manager.connect("t1", credentials, db, user_id=7)
+
+    # 2. Allowed (load tests), the file is a tenant like any other
+    settings.ALLOW_SQLITE_TENANTS = True
+    try:
+        assert manager.connect("t1", credentials, db, user_id=7)
+        assert manager.get_connection_info("t1", 7, db).db_type == "sqlite"
+        assert manager.get_engine("t1", 7, db).dialect.name == "sqlite"
+    finally:
+        settings.ALLOW_SQLITE_TENANTS = False
+        manager.close_connection("t1", user_id=7, db=db)
+
+def test_concurrent_restore_opens_one_engine(tmp_path):
+    class SlowOpenManager(DatabaseConnectionManager):
+        opened = []
+        def _open_engine(self, credentials):
+            time.sleep(0.05) # Long enough for every request to miss the registry
+            engine = super()._open_engine(credentials)
+            self.opened.append(engine)
+            return engine
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    manager = SlowOpenManager()
+    credentials = {"db_type": "sqlite", "host": "", "port": "", "username": "", "password": "",
+                   "database": str(tmp_path / "tenant.db")}
+    settings.ALLOW_SQLITE_TENANTS = True
+    try:
+        with session_factory() as db:
+            assert manager.connect("t1", credentials, db, user_id=7)
+            manager.get_connection_info("t1", 7, db)
+        manager.registry.remove("t1")
+        manager.opened.clear()
+
+        # Requests racing for an evicted tenant share one restored engine; none is disposed under another
+        engines = []
+        threads = [threading.Thread(target=lambda: engines.append(manager.get_engine("t1", 7, None))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"✅ {len(manager.opened)} engine opened for {len(engines)} concurrent requests")
+        assert len(manager.opened) == 1 and all(e is manager.opened[0] for e in engines)
+        assert manager.registry.get("t1") is manager.opened[0]
+    finally:
+        settings.ALLOW_SQLITE_TENANTS = False
+        manager.close_connection("t1")
+
+    print("\n✅ SQLite tenant opt-in verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_connection_cache()
+    test_sqlite_tenants_opt_in(pathlib.Path(tempfile.mkdtemp()))
+    test_concurrent_restore_opens_one_engine(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, text
+
+from app.engine_registry import TenantEngineRegistry
+
+def make_engine(registry, tmp_path, name):
+    return create_engine(f"sqlite:///{tmp_path / name}.db", **registry.sql_engine_options())
+
+def test_engine_registry(tmp_path):
+    # 1. Global budget: 3 connections per tenant, 7 in total -> only two tenants fit
+    registry = TenantEngineRegistry(pool_size=2, max_overflow=1, max_tenants=10, max_total_connections=7)
+    for name in ("a", "b", "c"):
+        registry.put(name, make_engine(registry, tmp_path, name), "postgresql")
+    print(f"✅ Tenants after budget eviction: {registry.tenant_ids()}")
+    assert registry.tenant_ids() == ["b", "c"]
+    assert registry.get_stats()["reserved_connections"] == 6
+
+    # 2. LRU order follows use, and busy pools are evicted last
+    registry.get("b")
+    busy = registry.get("c").connect()
+    registry.put("d", make_engine(registry, tmp_path, "d"), "postgresql")
+    assert registry.tenant_ids() == ["c", "d"]
+    busy.close()
+
+    # 3. Checkout waits and utilization are tracked per tenant
+    with registry.get("d").connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = registry.get_pool_stats("d")
+    print(f"✅ Pool stats: {stats}")
+    assert stats["checkouts"] == 1
+    assert stats["checked_out"] == 1
+    assert stats["utilization_percentage"] == round(1 / 3 * 100, 2)
+
+    # 4. Idle pools are disposed
+    registry.idle_ttl_seconds = 0
+    time.sleep(0.01)
+    assert sorted(registry.evict_idle()) == ["c", "d"]
+    assert len(registry) == 0
+
+    print("\n✅ Engine registry verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_engine_registry(pathlib.Path(tempfile.mkdtemp()))
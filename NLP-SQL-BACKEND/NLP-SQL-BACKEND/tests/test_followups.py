@@ -0,0 +1,148 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+
+from app.query_executor import QueryExecutor
+from app.services.nlp.followup_service import FollowUpService, FollowUpPlanner, column_types, refers_to_previous
+from app.services.nlp.query_service import QueryService
+from app.services.nlp.mocks import MockSchemaService, MockCacheService
+
+class TenantDBService:
+    def __init__(self, engine):
+        self.engine = engine
+    def get_connection_info(self, tenant_id, user_id=None, db=None):
+        return SimpleNamespace(db_type="sqlite", database_name=None, query_timeout_ms=None)
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+class ScriptedLLM:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+class CountingExecutor(QueryExecutor):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+    def execute_sql(self, engine, sql, db_type, **kwargs):
+        self.sent.append(sql)
+        return super().execute_sql(engine, sql, db_type, **kwargs)
+
+def test_followup_planner():
+    rows = [
+        {"region": "East", "month": "2024-01-01", "amount": 10.5, "orders": 3},
+        {"region": "West", "month": "2023-02-01", "amount": 7.0, "orders": 1},
+        {"region": "New York", "month": "2024-03-01", "amount": 2.0, "orders": 5},
+    ]
+    planner = FollowUpPlanner(rows, column_types(rows))
+    expected = {
+        "now only for 2024": "SELECT * FROM previous_result WHERE substr(\"month\", 1, 4) = '2024'",
+        "sort by amount descending": "SELECT * FROM previous_result ORDER BY \"amount\" DESC",
+        "excluding new york": "SELECT * FROM previous_result WHERE \"region\" <> 'New York'",
+        "top 2 by orders": "SELECT * FROM previous_result ORDER BY \"orders\" DESC LIMIT 2",
+        "group that by region": "SELECT \"region\", SUM(\"amount\") AS \"amount\", SUM(\"orders\") AS \"orders\" "
+                                "FROM previous_result GROUP BY \"region\"",
+    }
+    for question, sql in expected.items():
+        print(f"✅ {question!r} -> {planner.plan(question)}")
+        assert planner.plan(question) == sql
+    # Anything it can't fully account for goes elsewhere
+    assert planner.plan("now show revenue by product") is None
+    assert planner.plan("sort by customer") is None
+
+    # Only questions that point back at this result are worth an LLM follow-up
+    types = column_types(rows)
+    assert refers_to_previous("how many of those are there?", types)
+    assert refers_to_previous("top 3 regions by amount", types)
+    assert not refers_to_previous("top 5 customers by revenue", types)
+    assert not refers_to_previous("customers that churned last year", types)
+
+def test_followups_answered_locally():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, total_amount NUMERIC, created_at TEXT)"))
+        for i in range(6):
+            conn.execute(text("INSERT INTO orders VALUES (:i, :a, :c)"), {"i": i, "a": i * 10, "c": f"202{3 + i % 2}-0{i + 1}-01"})
+
+    cache = MockCacheService()
+    llm = ScriptedLLM(
+        "SELECT id, total_amount, created_at FROM orders",
+        "SELECT COUNT(*) AS orders FROM previous_result",
+        "NEW_QUERY",
+        "SELECT SUM(total_amount) AS total FROM orders",
+        "SELECT id, total_amount FROM orders ORDER BY total_amount DESC LIMIT 5"
+    )
+    executor = CountingExecutor()
+    followups = FollowUpService(cache, llm_client=llm)
+    service = QueryService(TenantDBService(engine), MockSchemaService(), cache, llm_client=llm,
+                           query_executor=executor, followup_service=followups)
+
+    # 1. The first question goes through the LLM and the tenant database
+    first = service.ask("t1", "Show orders", user_id=1, conversation_id="c1")
+    assert len(first["answer"]) == 6 and len(executor.sent) == 1
+
+    # 2. Rule-based refinements run over the cached rows and chain
+    refined = service.ask("t1", "now only for 2024", user_id=1, conversation_id="c1")
+    print(f"✅ Local follow-up: {refined['sql']}")
+    assert refined["local_followup"] and [r["id"] for r in refined["answer"]] == [1, 3, 5]
+    sorted_rows = service.ask("t1", "sort by total amount descending", user_id=1, conversation_id="c1")
+    assert [r["id"] for r in sorted_rows["answer"]] == [5, 3, 1]
+
+    # 3. The LLM decides the rest: answerable locally, or a new query
+    counted = service.ask("t1", "how many of those are there?", user_id=1, conversation_id="c1")
+    assert counted["local_followup"] and counted["answer"] == [{"orders": 3}]
+    assert "previous_result" in llm.prompts[1]
+    fresh = service.ask("t1", "and what is the total revenue of those customers?", user_id=1, conversation_id="c1")
+    assert not fresh.get("local_followup") and fresh["answer"] == [{"total": 150}]
+    assert len(executor.sent) == 2
+
+    # 4. A plain new question goes straight to a new query, with no follow-up LLM call
+    prompts = len(llm.prompts)
+    top = service.ask("t1", "top 5 customers by revenue", user_id=1, conversation_id="c1")
+    assert not top.get("local_followup") and len(top["answer"]) == 5
+    assert len(llm.prompts) == prompts + 1 and "previous_result" not in llm.prompts[-1]
+
+    # 5. Other conversations and users never see this result
+    assert followups.answer("t1", 2, "c1", "sort by id") is None
+    assert followups.answer("t1", 1, "c2", "sort by id") is None
+    print(f"✅ Follow-up stats: {followups.get_stats()}")
+
+def test_followup_history_keeps_tenant_dialect():
+    class MySQLTenant(TenantDBService):
+        def get_connection_info(self, tenant_id, user_id=None, db=None):
+            return SimpleNamespace(db_type="mysql", database_name=None, query_timeout_ms=None)
+
+    class RecordingHistoryWriter:
+        running = True
+        def __init__(self):
+            self.entries = []
+        def submit(self, *entry):
+            self.entries.append(entry)
+
+    cache = MockCacheService()
+    writer = RecordingHistoryWriter()
+    followups = FollowUpService(cache, use_llm=False)
+    service = QueryService(MySQLTenant(None), MockSchemaService(), cache, llm_client=ScriptedLLM(),
+                           followup_service=followups, history_writer=writer)
+    followups.remember("t1", 1, "c1", "Show orders", "SELECT id FROM orders", [{"id": 1}, {"id": 2}])
+
+    # A follow-up answered locally is still recorded as a question about the MySQL tenant
+    refined = service.ask("t1", "sort by id descending", user_id=1, conversation_id="c1")
+    assert refined["local_followup"] and [r["id"] for r in refined["answer"]] == [2, 1]
+    print(f"✅ History entry: {writer.entries}")
+    assert [entry[-1] for entry in writer.entries] == ["mysql"]
+
+    print("\n✅ Local follow-ups verified successfully!")
+
+if __name__ == "__main__":
+    test_followup_planner()
+    test_followups_answered_locally()
+    test_followup_history_keeps_tenant_dialect()
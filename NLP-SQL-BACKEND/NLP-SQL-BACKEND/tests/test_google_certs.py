@@ -0,0 +1,106 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from app.google_certs import GoogleCertCache
+
+def make_key_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test-signer")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    return key_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+class CertServer:
+    """Local stand-in for Google's certificate endpoint"""
+    def __init__(self, certs: dict, max_age: int):
+        self.body = json.dumps(certs).encode()
+        self.max_age = max_age
+        self.hits = 0
+        self.failing = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                if server.failing:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={server.max_age}, must-revalidate")
+                self.end_headers()
+                self.wfile.write(server.body)
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/oauth2/v1/certs"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+def test_google_cert_cache():
+    key_pem, cert_pem = make_key_and_cert()
+    server = CertServer({"kid-1": cert_pem}, max_age=3600)
+    try:
+        signer = crypt.RSASigner.from_string(key_pem, key_id="kid-1")
+        now = int(time.time())
+        token = jwt.encode(signer, {"iss": "https://accounts.google.com", "aud": "client-1", "sub": "42",
+                                    "email": "ada@example.com", "iat": now, "exp": now + 600}).decode()
+
+        # 1. Verified against the stand-in endpoint; the certificate set is fetched once per max-age
+        cache = GoogleCertCache(certs_url=server.url)
+        for _ in range(5):
+            assert cache.verify(token, audience="client-1")["email"] == "ada@example.com"
+        print(f"✅ 5 verifications, {server.hits} certificate fetch(es): {cache.get_stats()}")
+        assert server.hits == 1 and 3500 < cache.get_stats()["expires_in_seconds"] <= 3600
+
+        # 2. Near expiry a background refresh runs while the current set keeps serving
+        cache._fetched_at, cache._expires_at = time.monotonic() - 3540, time.monotonic() + 60
+        cache.get()
+        deadline = time.time() + 5
+        while (server.hits < 2 or cache._refreshing) and time.time() < deadline:
+            time.sleep(0.01)
+        assert server.hits == 2
+
+        # 3. Expired and the endpoint is down: the stale set still verifies, retries are spaced out
+        server.failing = True
+        cache._expires_at = time.monotonic() - 1
+        assert cache.verify(token, audience="client-1")["sub"] == "42"
+        assert cache.verify(token, audience="client-1")["sub"] == "42"
+        assert server.hits == 3 and cache.stale_served == 1
+
+        # 4. With nothing cached a failed fetch is an error
+        try:
+            GoogleCertCache(certs_url=server.url).get()
+            assert False, "expected a fetch error"
+        except RuntimeError as e:
+            print(f"✅ Cold cache with endpoint down: {e}")
+    finally:
+        server.close()
+
+    print("\n✅ Google certificate cache verified successfully!")
+
+if __name__ == "__main__":
+    test_google_cert_cache()
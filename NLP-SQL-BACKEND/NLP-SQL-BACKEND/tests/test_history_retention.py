@@ -0,0 +1,153 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import QueryHistory, QuestionFrequency
+from app.history_service import HistoryService
+
+def make_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)
+
+def test_history_keyset_pages(tmp_path):
+    engine, session_factory = make_db(tmp_path)
+    db = session_factory()
+    base = datetime(2026, 1, 1)
+    # Pairs of rows share a timestamp, so the id breaks ties
+    db.add_all(QueryHistory(tenant_id="t1", user_id=1, question=f"q{i}", query_text="SELECT 1", db_type="mysql",
+                            created_at=base + timedelta(minutes=i // 2)) for i in range(45))
+    db.add(QueryHistory(tenant_id="t1", user_id=2, question="other user", created_at=base))
+    db.commit()
+    service = HistoryService(session_factory=session_factory)
+
+    # 1. Pages follow each other without gaps or repeats
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = service.page(db, "t1", 1, limit=20, cursor=cursor)
+        seen += [r.question for r in rows]
+        pages += 1
+        if cursor is None:
+            break
+    print(f"✅ {len(seen)} rows in {pages} pages")
+    assert pages == 3 and len(seen) == 45 and len(set(seen)) == 45
+    assert seen[:3] == ["q44", "q43", "q42"]
+
+    # 2. The page query walks the composite index instead of sorting
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM query_history WHERE tenant_id = 't1' AND user_id = 1 "
+            "ORDER BY created_at DESC, id DESC LIMIT 21"
+        )))
+    print(f"✅ Plan: {plan}")
+    assert "ix_query_history_tenant_user_created" in plan and "TEMP B-TREE" not in plan
+
+    try:
+        service.page(db, "t1", 1, cursor="not-a-cursor")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    db.close()
+
+def test_history_compaction(tmp_path):
+    _, session_factory = make_db(tmp_path)
+    db = session_factory()
+    now = datetime(2026, 6, 1)
+    old, recent = now - timedelta(days=200), now - timedelta(days=1)
+    for i in range(6):
+        db.add(QueryHistory(tenant_id="t1", user_id=1, question="Revenue by month" if i % 2 else "revenue  by MONTH",
+                            query_text=f"SELECT {i}", db_type="postgresql", created_at=old + timedelta(hours=i)))
+    db.add(QueryHistory(tenant_id="t1", user_id=1, question="Top customers", query_text="SELECT c", created_at=old))
+    db.add(QueryHistory(tenant_id="t1", user_id=1, question="Revenue by month", query_text="SELECT new", created_at=recent))
+    db.commit()
+
+    # 1. Expired rows become per-question counts and are deleted, in small batches
+    service = HistoryService(session_factory=session_factory, retention_days=90, batch_size=3)
+    assert service.compact(now=now) == 7
+    db.expire_all()
+    assert db.query(QueryHistory).count() == 1
+    frequencies = {f.question: f for f in db.query(QuestionFrequency)}
+    print(f"✅ Compacted: {[(q, f.count) for q, f in frequencies.items()]}")
+    assert frequencies["Revenue by month"].count == 6 and frequencies["Revenue by month"].query_text == "SELECT 5"
+    assert frequencies["Top customers"].count == 1
+    assert service.compact(now=now) == 0
+
+    # 2. Frequent questions merge compacted counts with live rows
+    top = service.frequent_questions(db, "t1", limit=2)
+    assert [(e["question"], e["count"], e["sql"]) for e in top] == [("Revenue by month", 7, "SELECT new"),
+                                                                     ("Top customers", 1, "SELECT c")]
+
+    # 3. Only the latest recent_window live rows are grouped
+    db.add_all(QueryHistory(tenant_id="t1", user_id=1, question="Top customers", query_text="SELECT c2",
+                            created_at=recent + timedelta(minutes=i)) for i in range(3))
+    db.commit()
+    service.recent_window = 2
+    top = service.frequent_questions(db, "t1", limit=2)
+    assert [(e["question"], e["count"]) for e in top] == [("Revenue by month", 6), ("Top customers", 3)]
+
+    # 4. The retention sweep and the recent window each walk an index instead of the whole table
+    with session_factory.kw["bind"].connect() as conn:
+        for sql, index in [
+            ("SELECT * FROM query_history WHERE created_at < '2026-01-01' ORDER BY created_at, id LIMIT 3",
+             "ix_query_history_created"),
+            ("SELECT question FROM query_history WHERE tenant_id = 't1' ORDER BY created_at DESC LIMIT 2",
+             "ix_query_history_tenant_created"),
+        ]:
+            plan = " ".join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            print(f"✅ Plan: {plan}")
+            assert index in plan and "TEMP B-TREE" not in plan
+    db.close()
+
+
+def test_concurrent_compaction_counts_once(tmp_path):
+    # Two workers compacting the same SQLite store, where FOR UPDATE SKIP LOCKED is a no-op
+    engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    now = datetime(2026, 6, 1)
+    old = now - timedelta(days=200)
+    db.add_all(QueryHistory(tenant_id="t1", user_id=1, question=f"question {i % 7}", query_text="SELECT 1",
+                            created_at=old + timedelta(minutes=i)) for i in range(600))
+    db.commit()
+
+    services = [HistoryService(session_factory=session_factory, retention_days=90, batch_size=25) for _ in range(2)]
+    results, errors = [], []
+    start = threading.Barrier(2)
+
+    def worker(service):
+        start.wait()
+        try:
+            results.append(service.compact(now=now))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(service,)) for service in services]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.expire_all()
+    counted = sum(f.count for f in db.query(QuestionFrequency))
+    print(f"✅ Workers compacted {results}, frequencies total {counted}")
+    assert not errors and sum(results) == 600
+    assert counted == 600 and db.query(QueryHistory).count() == 0
+    db.close()
+
+    print("\n✅ History pagination and retention verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_history_keyset_pages(pathlib.Path(tempfile.mkdtemp()))
+    test_history_compaction(pathlib.Path(tempfile.mkdtemp()))
+    test_concurrent_compaction_counts_once(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,79 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+
+from app.metrics import MetricsRegistry, STAGE_SECONDS, ASK_TOTAL, metrics
+from app.services.nlp.query_service import QueryService
+from app.services.nlp.mocks import MockSchemaService, MockCacheService
+
+class TenantDBService:
+    def __init__(self, engine):
+        self.engine = engine
+    def get_connection_info(self, tenant_id, user_id=None, db=None):
+        return SimpleNamespace(db_type="sqlite", database_name=None, query_timeout_ms=None)
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+class FixedLLM:
+    def generate(self, prompt):
+        return "SELECT id, total_amount FROM orders"
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(max_tenant_labels=2)
+    latency = registry.histogram("demo_seconds", "Demo latency", ("stage", "tenant"), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, stage="llm", tenant=registry.tenant_label("t1"))
+    requests = registry.counter("demo_total", "Demo requests", ("outcome",))
+    requests.inc(outcome='say "hi"')
+    registry.gauge("demo_pools", "Demo pools", lambda: [({"state": "idle"}, 3)])
+    registry.gauge("demo_broken", "Never rendered", lambda: 1 / 0)
+
+    body = registry.render()
+    print(body)
+    # 1. Histogram buckets are cumulative and end with +Inf
+    assert 'demo_seconds_bucket{stage="llm",tenant="t1",le="0.1"} 1' in body
+    assert 'demo_seconds_bucket{stage="llm",tenant="t1",le="1"} 2' in body
+    assert 'demo_seconds_bucket{stage="llm",tenant="t1",le="+Inf"} 3' in body
+    assert 'demo_seconds_count{stage="llm",tenant="t1"} 3' in body
+    assert "# TYPE demo_seconds histogram" in body
+    # 2. Label values are escaped, gauges are read at render time, failing ones are skipped
+    assert 'demo_total{outcome="say \\"hi\\""} 1' in body
+    assert 'demo_pools{state="idle"} 3' in body and "demo_broken" not in body
+
+    # 3. Tenants past the cap share one label
+    assert [registry.tenant_label(t) for t in ("t1", "t2", "t3", "t4", "t2")] == ["t1", "t2", "other", "other", "t2"]
+
+def test_ask_stage_breakdown():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, total_amount NUMERIC)"))
+        conn.execute(text("INSERT INTO orders VALUES (1, 10), (2, 20)"))
+    service = QueryService(TenantDBService(engine), MockSchemaService(), MockCacheService(), llm_client=FixedLLM())
+    tenant = metrics.tenant_label("metrics-tenant")
+    llm_before = STAGE_SECONDS.count(stage="llm", tenant=tenant)
+
+    # 1. A database answer is timed stage by stage
+    first = service.ask("metrics-tenant", "Show orders", user_id=1)
+    print(f"✅ Breakdown: {first['timings']}")
+    for name in ("schema", "connection_lookup", "prompt", "llm", "validation", "cache_lookup",
+                 "engine", "tenant_query", "row_conversion", "cache_store", "history", "total"):
+        assert name in first["timings"], name
+    assert STAGE_SECONDS.count(stage="llm", tenant=tenant) == llm_before + 1
+
+    # 2. A cache hit never reaches the tenant database, and outcomes are counted
+    second = service.ask("metrics-tenant", "Show orders", user_id=1)
+    assert second["cache_hit"] and "tenant_query" not in second["timings"]
+    assert ASK_TOTAL.value(outcome="answered", tenant=tenant) >= 1
+    assert ASK_TOTAL.value(outcome="cache_hit", tenant=tenant) >= 1
+    assert 'nlpsql_stage_duration_seconds_count{stage="llm",tenant="metrics-tenant"}' in metrics.render()
+
+    print("\n✅ Metrics instrumentation verified successfully!")
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_ask_stage_breakdown()
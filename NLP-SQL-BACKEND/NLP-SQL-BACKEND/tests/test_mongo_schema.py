@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+from datetime import datetime
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from app.mongo_schema import MongoSchemaInferrer
+
+class FakeCollection:
+    """Just the collection methods the inferrer uses"""
+    def __init__(self, name, documents, delay=0.0, sample_supported=True):
+        self.name = name
+        self.documents = documents
+        self.delay = delay
+        self.sample_supported = sample_supported
+        self.calls = []
+    def aggregate(self, pipeline, maxTimeMS=None):
+        self.calls.append(("aggregate", pipeline, maxTimeMS))
+        if not self.sample_supported:
+            raise OperationFailure("$sample is not allowed")
+        size = pipeline[0]["$sample"]["size"]
+        for doc in self.documents[:size]:
+            time.sleep(self.delay)
+            yield doc
+    def find(self):
+        self.calls.append(("find",))
+        return self
+    def limit(self, n):
+        self.limit_n = n
+        return self
+    def max_time_ms(self, ms):
+        return iter(self.documents[:self.limit_n])
+    def estimated_document_count(self):
+        self.calls.append(("estimated_document_count",))
+        return 1_000_000
+    def count_documents(self, flt):
+        raise AssertionError("count_documents scans the collection")
+    def index_information(self):
+        return {
+            "_id_": {"key": [("_id", 1)]},
+            "customer.email_1": {"key": [("customer.email", 1)], "unique": True}
+        }
+
+def test_mongo_schema_inference():
+    documents = [
+        {"_id": ObjectId(), "total": 10, "customer": {"email": "a@x.io", "tier": "gold"},
+         "items": [{"sku": "A1", "qty": 2}], "tags": ["new"], "created": datetime(2026, 1, 1)},
+        {"_id": ObjectId(), "total": 12.5, "customer": {"email": "b@x.io"},
+         "items": [{"sku": "B2", "qty": 1, "discount": None}], "tags": [], "created": datetime(2026, 1, 2)},
+        {"_id": ObjectId(), "total": None, "customer": {"email": "c@x.io"}, "items": [], "tags": ["vip", 3]},
+        {"_id": ObjectId(), "total": 7, "customer": {"email": "d@x.io"}, "items": [{"sku": "C3", "qty": 5}]},
+    ]
+    collection = FakeCollection("orders", documents)
+    table = MongoSchemaInferrer(sample_size=50).infer(collection)
+    columns = {c["name"]: c for c in table["columns"]}
+    print(f"✅ Inferred columns: {[(c['name'], c['type'], c['frequency']) for c in table['columns']]}")
+
+    # 1. $sample, cheap count and indexes
+    assert collection.calls[0][1] == [{"$sample": {"size": 50}}]
+    assert table["row_count"] == 1_000_000
+    assert table["indexes"] == [{"name": "customer.email_1", "columns": ["customer.email"], "unique": True}]
+
+    # 2. Nested documents and arrays of documents become dotted paths
+    assert table["columns"][0]["name"] == "_id" and columns["_id"]["primary_key"]
+    assert columns["customer.email"]["type"] == "string" and columns["customer.email"]["frequency"] == 1.0
+    assert columns["customer.tier"]["frequency"] == 0.25 and columns["customer.tier"]["nullable"]
+    assert columns["items.sku"]["frequency"] == 0.75
+    assert columns["items"]["type"] == "array<object>"
+
+    # 3. Types are merged across the sample
+    assert columns["total"]["type"] == "double|int" and columns["total"]["nullable"]
+    assert columns["tags"]["type"] == "array<int|string>"
+    assert columns["created"]["type"] == "date"
+    assert columns["items.discount"]["type"] == "null"
+
+    # 4. Sampling stops at the time budget
+    slow = FakeCollection("events", [{"_id": i, "n": i} for i in range(100)], delay=0.01)
+    started = time.monotonic()
+    MongoSchemaInferrer(sample_size=100, time_budget_ms=50).infer(slow)
+    print(f"✅ Bounded sampling took {time.monotonic() - started:.2f}s")
+    assert time.monotonic() - started < 0.5
+
+    # 5. Collections that reject $sample fall back to find()
+    view = FakeCollection("order_view", documents, sample_supported=False)
+    assert len(MongoSchemaInferrer().infer(view)["columns"]) == len(table["columns"])
+    assert ("find",) in view.calls
+
+    print("\n✅ MongoDB schema inference verified successfully!")
+
+if __name__ == "__main__":
+    test_mongo_schema_inference()
@@ -47,5 +47,44 @@ def test_prompt_builder():
 
     print("\n✅ Hardened Prompt Builder verified successfully!")
 
+def test_prompt_cache():
+    builder = PromptBuilder(cache_size=4)
+    schema = MockSchemaService().get_schema("tenant_ecom")
+    key = ("tenant_ecom", "v1", None)
+
+    # 1. Cached rendering matches a fresh render, and only the question changes per request
+    fresh = builder.build(schema, "Total revenue this month?", db_type="mysql")
+    cached = builder.build(schema, "Total revenue this month?", db_type="mysql", cache_key=key)
+    again = builder.build(schema, "Orders per day?", db_type="mysql", cache_key=key)
+    assert cached == fresh
+    assert again.endswith("Orders per day?") and "queries for a mysql database" in again
+    print(f"✅ Prompt cache stats: {builder.get_stats()}")
+    assert builder.get_stats()["cached_templates"] == 1 and builder.hits == 1
+
+    # 2. db_type is part of the key, the schema text is shared between dialects
+    mongo = builder.build(schema, "Top customers?", db_type="mongodb", cache_key=key)
+    assert "MongoDB aggregation pipelines" in mongo
+    assert builder.get_stats()["cached_templates"] == 2 and builder.get_stats()["cached_schemas"] == 1
+
+    # 3. Invalidation drops everything for the tenant
+    builder.invalidate("tenant_ecom", ["orders"])
+    assert builder.get_stats()["cached_templates"] == 0
+
+    # 4. Published schema snapshots are read-only
+    from app.schema_service import SchemaExtractor
+    from app.compact_schema import compact_tables
+    extractor = SchemaExtractor(db_service=None)
+    extractor._store("tenant_ecom", compact_tables({"orders": {"columns": [{"name": "id", "type": "integer"}]}}), "v1")
+    snapshot = extractor.get_schema("tenant_ecom", simplified=True)
+    try:
+        snapshot["db_type"] = "mysql"
+        assert False, "snapshot should be read-only"
+    except TypeError:
+        pass
+    assert snapshot["version"] == "v1"
+
+    print("\n✅ Prompt cache verified successfully!")
+
 if __name__ == "__main__":
     test_prompt_builder()
+    test_prompt_cache()
@@ -0,0 +1,83 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.query_executor import QueryExecutor, QueryTimeoutError, QueryCancelledError, CancelToken
+from app.services.nlp.mocks import MockEngine
+
+class PgCanceled(Exception):
+    pgcode = "57014"
+
+class TimingOutConnection:
+    """Accepts the SET LOCAL statement, then fails the query like a PostgreSQL statement_timeout"""
+    def __init__(self):
+        self.statements = []
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        pass
+    def execute(self, statement, *args, **kwargs):
+        self.statements.append(str(statement))
+        if len(self.statements) > 1:
+            raise OperationalError(str(statement), {}, PgCanceled("canceling statement due to statement timeout"))
+
+class TimingOutEngine:
+    def __init__(self):
+        self.conn = TimingOutConnection()
+    def connect(self):
+        return self.conn
+
+def test_query_executor():
+    executor = QueryExecutor(default_timeout_ms=1500)
+
+    # 1. Rows come back JSON-friendly
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER, created DATE)"))
+        conn.execute(text("INSERT INTO orders VALUES (1, '2024-01-31')"))
+    rows = executor.execute_sql(engine, "SELECT id FROM orders", "sqlite", tenant_id="t1")
+    print(f"✅ Rows: {rows}")
+    assert rows == [{"id": 1}]
+    assert executor._convert_row(type("Row", (), {"_mapping": {"d": date(2024, 1, 31)}})()) == {"d": "2024-01-31"}
+
+    # 2. PostgreSQL budget is applied per transaction and a cancel maps to a timeout
+    pg_engine = TimingOutEngine()
+    try:
+        executor.execute_sql(pg_engine, "SELECT 1", "postgresql", tenant_id="t2", timeout_ms=250)
+        assert False, "timeout was not raised"
+    except QueryTimeoutError as e:
+        print(f"✅ Timeout surfaced: {e}")
+        assert e.timeout_ms == 250
+    assert pg_engine.conn.statements[0] == "SET LOCAL statement_timeout = 250"
+    assert executor.get_tenant_stats("t2")["timeouts"] == 1
+
+    # 3. A cancelled token stops the query before it reaches the database
+    token = CancelToken()
+    token.cancel()
+    try:
+        executor.execute_sql(MockEngine(), "SELECT 1", "postgresql", tenant_id="t3", cancel_token=token)
+        assert False, "cancellation was not raised"
+    except QueryCancelledError:
+        print("✅ Cancellation honoured")
+    assert executor.get_tenant_stats("t3")["cancellations"] == 1
+
+    # 4. Binding after cancel fires the server-side callback immediately
+    fired = []
+    token.bind(lambda: fired.append(True))
+    assert fired == [True]
+
+    # 5. Tenant override beats the global default
+    record = type("Conn", (), {"query_timeout_ms": 90000})()
+    assert executor.resolve_timeout_ms(record) == 90000
+    assert executor.resolve_timeout_ms(None) == 1500
+
+    print("\n✅ Query executor verified successfully!")
+
+if __name__ == "__main__":
+    test_query_executor()
@@ -0,0 +1,201 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+import threading
+from types import SimpleNamespace
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import QueryHistory
+from app.chart_service import ChartService
+from app.query_executor import QueryExecutor
+from app.rollup_service import RollupManager, RollupShape, parse_aggregate
+from app.schema_service import SchemaExtractor
+from app.services.nlp.query_service import QueryService
+from app.services.nlp.mocks import MockCacheService
+
+class TenantDBService:
+    """Reports MySQL (the tenant is SQLite, which shares the MySQL-flavoured SQL used here)"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.record = SimpleNamespace(db_type="mysql", database_name=None, query_timeout_ms=None)
+    def get_connection_info(self, tenant_id, user_id, db):
+        return self.record
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+class CountingExecutor(QueryExecutor):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+    def execute_sql(self, engine, sql, db_type, **kwargs):
+        self.sent.append(sql)
+        return super().execute_sql(engine, sql, "sqlite", **kwargs)
+
+class OrdersSchemaService:
+    def get_schema(self, tenant_id):
+        columns = {"id": "integer", "status": "varchar", "amount": "numeric", "created": "timestamp"}
+        return {"tables": {"orders": {"columns": {name: {"type": kind} for name, kind in columns.items()},
+                                      "relationships": []}}}
+    def get_schema_for_question(self, tenant_id, question):
+        return self.get_schema(tenant_id)
+    def get_schema_version(self, tenant_id):
+        return "1"
+
+class ScriptedLLM:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+    def generate(self, prompt):
+        return self.answers.pop(0)
+
+def chart(**overrides):
+    spec = dict(tenant_id="t1", table_name="orders", x_column="status", y_column="amount",
+                chart_type="bar", aggregation="sum", bucket="auto", max_points=None)
+    spec.update(overrides)
+    return SimpleNamespace(**spec)
+
+def test_parse_aggregate():
+    query = parse_aggregate(
+        "SELECT date_trunc('month', o.created) AS month, SUM(o.amount) AS revenue FROM orders o "
+        "GROUP BY 1 ORDER BY month LIMIT 1000", "postgresql"
+    )
+    print(f"✅ Parsed: {query}")
+    assert (query.table, query.column, query.unit, query.function, query.measure) == ("orders", "created", "month", "sum", "amount")
+    assert (query.group_key, query.value_key, query.order, query.limit) == ("month", "revenue", [("group", False)], 1000)
+
+    counted = parse_aggregate("SELECT COUNT(*), status FROM orders GROUP BY status ORDER BY COUNT(*) DESC", "mysql")
+    assert counted.function == "count*" and counted.value_key == "COUNT(*)" and not counted.group_first
+    assert counted.order == [("value", True)]
+
+    # Filters, joins and HAVING are not rollup material
+    for sql in (
+        "SELECT status, COUNT(*) FROM orders WHERE amount > 5 GROUP BY status",
+        "SELECT o.status, COUNT(*) FROM orders o JOIN users u ON u.id = o.user_id GROUP BY o.status",
+        "SELECT status, COUNT(*) FROM orders GROUP BY status HAVING COUNT(*) > 1",
+        "SELECT status, amount FROM orders LIMIT 10",
+    ):
+        assert parse_aggregate(sql, "postgresql") is None, sql
+
+def test_rollups(tmp_path):
+    system_engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}")
+    Base.metadata.create_all(bind=system_engine)
+    session_factory = sessionmaker(bind=system_engine)
+
+    tenant_engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}")
+    with tenant_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, status VARCHAR(10), amount NUMERIC, created TIMESTAMP)"))
+        for i in range(90):
+            conn.execute(text("INSERT INTO orders VALUES (:i, :s, :a, :c)"),
+                         {"i": i, "s": ("paid", "new", "void")[i % 3], "a": i, "c": f"2024-{i % 3 + 1:02d}-{i % 28 + 1:02d}"})
+
+    db_service = TenantDBService(tenant_engine)
+    schema_service = SchemaExtractor(db_service, session_factory=session_factory)
+    schema_service.extract_and_store_schema("t1", 1, db=None)
+    executor = CountingExecutor()
+    rollups = RollupManager(db_service, schema_service, executor, storage_dir=str(tmp_path / "rollups"),
+                            min_hits=2, session_factory=session_factory)
+    charts = ChartService(db_service, schema_service, executor, rollup_manager=rollups)
+
+    # 1. Repeated chart shapes are counted, then materialized once popular
+    direct = charts.get_chart_data(chart(), user_id=1, db=None)
+    charts.get_chart_data(chart(chart_type="pie"), user_id=1, db=None)
+    assert rollups.refresh_tenant("t1", 1, db=session_factory()) == []
+    charts.get_chart_data(chart(), user_id=1, db=None)
+    assert rollups.refresh_tenant("t1", 1, db=session_factory()) == [RollupShape("orders", "status", "category", "amount")]
+
+    # 2. The rollup answers the same chart, and a count-only pie, without querying the tenant
+    sent = len(executor.sent)
+    served = charts.get_chart_data(chart(), user_id=1, db=None)
+    pie = charts.get_chart_data(chart(chart_type="pie", aggregation="count"), user_id=1, db=None)
+    print(f"✅ Served from rollup: {served}")
+    assert served["source"] == "rollup" and (served["x"], served["y"]) == (direct["x"], direct["y"])
+    assert pie["source"] == "rollup" and pie["y"] == [30.0, 30.0, 30.0]
+    assert len(executor.sent) == sent
+
+    # 3. Shapes found in QueryHistory build day rollups that answer coarser buckets and questions
+    db = session_factory()
+    for _ in range(2):
+        db.add(QueryHistory(tenant_id="t1", user_id=1, question="revenue by month", db_type="postgresql",
+                            query_text="SELECT date_trunc('month', created) AS month, SUM(amount) AS revenue "
+                                       "FROM orders GROUP BY 1 ORDER BY 1 LIMIT 1000"))
+    db.commit()
+    assert RollupShape("orders", "created", "day", "amount") in rollups.refresh_tenant("t1", 1, db=db)
+    monthly = charts.get_chart_data(chart(x_column="created", chart_type="line", bucket="month"), user_id=1, db=None)
+    assert monthly["source"] == "rollup" and monthly["bucket"] == "month"
+    assert monthly["x"] == ["2024-01-01", "2024-02-01", "2024-03-01"] and sum(monthly["y"]) == sum(range(90))
+    answer = rollups.answer_sql(
+        "t1", "SELECT status, AVG(amount) AS average FROM orders GROUP BY status ORDER BY status LIMIT 1000", "mysql"
+    )
+    assert answer[0] == [{"status": "new", "average": 44.5}, {"status": "paid", "average": 43.5}, {"status": "void", "average": 45.5}]
+    assert rollups.answer_sql("t1", "SELECT status, SUM(id) FROM orders GROUP BY status", "mysql") is None
+
+    # 4. /ask reports which answers came from a rollup, and how fresh it was
+    llm = ScriptedLLM("SELECT status, AVG(amount) AS average FROM orders GROUP BY status ORDER BY status",
+                      "SELECT status, SUM(id) AS ids FROM orders GROUP BY status ORDER BY status")
+    service = QueryService(db_service, OrdersSchemaService(), MockCacheService(), llm_client=llm,
+                           query_executor=executor, rollup_manager=rollups)
+    sent = len(executor.sent)
+    asked = service.ask("t1", "average order amount by status", user_id=1)
+    print(f"✅ Asked from rollup: {asked['source']} refreshed at {asked['refreshed_at']}")
+    assert asked["source"] == "rollup" and asked["answer"] == answer[0] and len(executor.sent) == sent
+    assert asked["refreshed_at"] == answer[1] and datetime.fromisoformat(asked["refreshed_at"]) <= datetime.utcnow()
+    uncovered = service.ask("t1", "sum of ids by status", user_id=1)
+    assert "source" not in uncovered and "refreshed_at" not in uncovered and len(executor.sent) == sent + 1
+
+    # 5. A changed table drops its rollups; a disconnect removes the tenant's file
+    rollups.invalidate("t1", ["orders"])
+    assert rollups.find("t1", RollupShape("orders", "status", "category", "amount")) is None
+    rollups.remove_tenant("t1")
+    assert not os.path.exists(rollups._path("t1"))
+    print(f"✅ Rollup stats: {rollups.get_stats()}")
+
+def test_rollup_state_is_thread_safe(tmp_path):
+    rollups = RollupManager(None, None, None, storage_dir=str(tmp_path / "rollups"))
+    shapes = [RollupShape("orders", f"c{i}", "category", None) for i in range(50)]
+    errors = []
+
+    def requests(worker):
+        try:
+            for i in range(2000):
+                rollups.record(f"t{i % 2}", shapes[(worker + i) % len(shapes)])
+                rollups.find(f"t{i % 2}", shapes[i % len(shapes)])
+        except Exception as e:
+            errors.append(e)
+
+    def refresher():
+        try:
+            for i in range(300):
+                rollups._write("t0", shapes[i % len(shapes)], [])
+                rollups.invalidate("t0", ["orders"] if i % 10 == 0 else [])
+                rollups.get_stats()
+        except Exception as e:
+            errors.append(e)
+
+    # Request threads and the refresher share hits and catalogs without losing updates
+    threads = [threading.Thread(target=requests, args=(w,)) for w in range(4)] + [threading.Thread(target=refresher)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6) # Switch threads often enough for unguarded updates to collide
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert sum(sum(counter.values()) for counter in rollups.hits.values()) == 4 * 2000
+    print(f"✅ Concurrent rollup state: {rollups.get_stats()}")
+
+    print("\n✅ Rollups verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_parse_aggregate()
+    test_rollups(pathlib.Path(tempfile.mkdtemp()))
+    test_rollup_state_is_thread_safe(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,176 @@
+import sys
+import os
+import hashlib
+import threading
+import time
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import TenantConnection
+from app.engine_registry import TenantEngineRegistry
+from app.schema_service import SchemaExtractor
+from app.schema_drift_service import SchemaDriftWatcher
+from app.cache_service import CacheManager
+
+class RegistryDBService:
+    def __init__(self, registry):
+        self.registry = registry
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.registry.get(tenant_id)
+    def get_active_connections(self):
+        return self.registry.tenant_ids()
+
+class SQLiteChecksumExtractor(SchemaExtractor):
+    """SQLite has no catalog extractor; checksum the CREATE statements instead"""
+    def _table_checksums(self, engine, tenant_id, db, user_id):
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).fetchall()
+        return {name: hashlib.md5(sql.encode()).hexdigest() for name, sql in rows}
+
+def test_schema_drift(tmp_path):
+    system_engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}")
+    Base.metadata.create_all(bind=system_engine)
+    session_factory = sessionmaker(bind=system_engine)
+    with session_factory() as session:
+        session.add(TenantConnection(tenant_id="tenant_1", user_id=1, db_type="postgresql", host="h",
+                                     port="5432", database_name="shop", username="u", password="x"))
+        session.commit()
+
+    registry = TenantEngineRegistry()
+    tenant_engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}", **registry.sql_engine_options())
+    with tenant_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("CREATE TABLE customers (id INTEGER PRIMARY KEY)"))
+    registry.put("tenant_1", tenant_engine, "postgresql")
+
+    db_service = RegistryDBService(registry)
+    schema_service = SQLiteChecksumExtractor(db_service, session_factory=session_factory)
+    schema_service.extract_and_store_schema("tenant_1", 1, db=None)
+
+    cache = CacheManager()
+    cache.cache_result("tenant_1", "select * from orders", [1], tables=["orders"])
+    cache.cache_result("tenant_1", "select * from customers", [2], tables=["customers"])
+    schema_service.add_change_listener(cache.invalidate_tables)
+
+    watcher = SchemaDriftWatcher(db_service, schema_service, interval_seconds=60, max_interval_seconds=240,
+                                 jitter=0.1, session_factory=session_factory)
+
+    # 1. A newly seen tenant is scheduled within one interval, not checked immediately
+    assert watcher.due_tenants() == []
+    assert 0 <= watcher._schedule["tenant_1"][0] - time.monotonic() <= 60
+
+    # 2. No drift: the tenant backs off
+    watcher._schedule["tenant_1"] = (0.0, 60)
+    result = watcher.run_once()["tenant_1"]
+    assert result["changed"] == [] and watcher._schedule["tenant_1"][1] == 120
+
+    # 3. Drift refreshes only the changed table and drops only the results that read it
+    with tenant_engine.begin() as conn:
+        conn.execute(text("ALTER TABLE orders ADD COLUMN total REAL"))
+    watcher._schedule["tenant_1"] = (0.0, 120)
+    result = watcher.run_once()["tenant_1"]
+    print(f"✅ Drift result: {result}")
+    assert result["changed"] == ["orders"]
+    assert watcher._schedule["tenant_1"][1] == 60
+    assert [c["name"] for c in schema_service.get_schema("tenant_1")["orders"]["columns"]] == ["id", "total"]
+    assert cache.get_cached_result("tenant_1", "select * from orders") is None
+    assert cache.get_cached_result("tenant_1", "select * from customers") == [2]
+
+    print(f"✅ Watcher stats: {watcher.get_stats()}")
+    assert watcher.get_stats()["drifts"] == 1
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+    def get(self, key):
+        return self.data.get(key)
+    def lpush(self, key, value):
+        pass
+    def ltrim(self, key, start, end):
+        pass
+
+def offline_cache(redis_client=None) -> CacheManager:
+    cache = CacheManager()
+    cache.redis_client, cache.available, cache.last_check = redis_client, redis_client is not None, time.time()
+    return cache
+
+def indexed(cache) -> int:
+    return sum(len(keys) for tables in cache.table_keys.values() for keys in tables.values())
+
+def test_table_index_is_bounded():
+    # 1. Memory-only results leave the index when the LRU evicts them
+    cache = offline_cache()
+    for i in range(200):
+        cache.cache_result("tenant_1", f"select * from orders where id = {i}", [i], tables=["orders", "customers"])
+    print(f"✅ Memory only: {len(cache.key_tables)} indexed keys after 200 results")
+    assert len(cache.key_tables) == len(cache.memory_cache) == 50 and indexed(cache) == 100
+
+    # 2. Results in Redis stay indexed until their TTL passes, then a sweep drops them
+    cache = offline_cache(DictRedis())
+    for i in range(60):
+        cache.cache_result("tenant_1", f"select * from orders where id = {i}", [i], ttl=0, tables=["orders"])
+    assert len(cache.key_tables) == 60
+    cache._next_index_sweep = 0
+    cache.cache_result("tenant_1", "select * from customers", [0], ttl=300, tables=["customers"])
+    assert list(cache.table_keys["tenant_1"]) == ["customers"] and len(cache.key_tables) == 1
+
+    # 3. A hard cap bounds what a flood of long-lived keys can hold
+    cache.max_indexed_keys = 10
+    for i in range(100):
+        cache.cache_result("tenant_1", f"select * from orders where id = {i}", [i], ttl=300, tables=["orders"])
+    assert len(cache.key_tables) == 10 and indexed(cache) == 10
+
+    # 4. Invalidation still reaches what is indexed, and leaves nothing behind
+    assert cache.invalidate_tables("tenant_1", ["orders"]) == 10
+    assert cache.table_keys == {} and len(cache.key_tables) == 0
+    print(f"✅ Cache stats: {cache.get_stats()}")
+
+
+def test_table_index_is_thread_safe():
+    cache = offline_cache(DictRedis())
+    errors = []
+
+    def writer(worker):
+        try:
+            for i in range(2000):
+                cache.cache_result(f"tenant_{i % 3}", f"select * from orders where id = {worker}-{i}", [i],
+                                   ttl=0 if i % 2 else 300, tables=["orders", "customers"])
+                cache._next_index_sweep = 0
+        except Exception as e:
+            errors.append(e)
+
+    def invalidator():
+        try:
+            for i in range(500):
+                cache.invalidate_tables(f"tenant_{i % 3}", ["orders"])
+                cache.invalidate_tenant_cache(f"tenant_{(i + 1) % 3}")
+        except Exception as e:
+            errors.append(e)
+
+    # 1. Writers, sweeps and invalidations on several threads leave a consistent index
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)] + [threading.Thread(target=invalidator)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert indexed(cache) == 2 * len(cache.key_tables)
+    for key, (tenant, names, _) in cache.key_tables.items():
+        assert all(key in cache.table_keys[tenant][table] for table in names)
+    print(f"✅ Concurrent index: {len(cache.key_tables)} keys, consistent")
+
+    print("\n✅ Schema drift detection verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_schema_drift(pathlib.Path(tempfile.mkdtemp()))
+    test_table_index_is_bounded()
+    test_table_index_is_thread_safe()
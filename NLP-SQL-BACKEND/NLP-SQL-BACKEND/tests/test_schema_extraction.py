@@ -0,0 +1,74 @@
+import sys
+import os
+import threading
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ENCRYPTION_KEY", "test-encryption-key")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.schema_service import SchemaExtractor, ExtractionProgress
+from app.compact_schema import compact_tables
+
+class EngineOnlyDBService:
+    def __init__(self, engine):
+        self.engine = engine
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+def test_parallel_extraction(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}")
+    with engine.begin() as conn:
+        for i in range(12):
+            conn.execute(text(f"CREATE TABLE t{i} (id INTEGER PRIMARY KEY, name TEXT)"))
+
+    system_engine = create_engine(f"sqlite:///{tmp_path / 'system.db'}")
+    Base.metadata.create_all(bind=system_engine)
+    extractor = SchemaExtractor(EngineOnlyDBService(engine), max_workers=3, chunk_size=5,
+                                session_factory=sessionmaker(bind=system_engine))
+
+    # 1. Background extraction fans out and reports progress
+    progress = extractor.start_extraction("tenant_1", user_id=1)
+    assert progress.done.wait(10)
+    status = extractor.get_progress("tenant_1")
+    print(f"✅ Extraction status: {status}")
+    assert status["state"] == "complete"
+    assert status["tables_total"] == 12 and status["tables_extracted"] == 12
+    assert len(extractor.get_schema("tenant_1", simplified=True)["tables"]) == 12
+
+def test_partial_schema_for_question():
+    extractor = SchemaExtractor(db_service=None, partial_wait_seconds=5)
+    progress = ExtractionProgress("tenant_2")
+    progress.start(["orders", "order_items", "customers"])
+    progress.extracted_tables.add("customers")
+    extractor.progress["tenant_2"] = progress
+    extractor._store("tenant_2", compact_tables({"customers": {"columns": []}}))
+
+    # 1. Table mentions tolerate plurals and underscores
+    assert extractor._tables_mentioned(progress.table_names, "How many customer rows?") == {"customers"}
+    assert "order_items" in extractor._tables_mentioned(progress.table_names, "top order items")
+
+    # 2. The question only needs an extracted table, so it does not wait
+    schema = extractor.get_schema_for_question("tenant_2", "How many customers signed up?")
+    assert "customers" in schema["tables"]
+
+    # 3. A question about a pending table waits until extraction publishes it
+    def finish_later():
+        extractor._store("tenant_2", compact_tables({"customers": {"columns": []}, "orders": {"columns": []}}))
+        progress.extracted_tables.add("orders")
+        progress.finish()
+    timer = threading.Timer(0.2, finish_later)
+    timer.start()
+    schema = extractor.get_schema_for_question("tenant_2", "Total orders this month?")
+    print(f"✅ Partial schema after wait: {list(schema['tables'])}")
+    assert "orders" in schema["tables"]
+
+    print("\n✅ Parallel schema extraction verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_parallel_extraction(pathlib.Path(tempfile.mkdtemp()))
+    test_partial_schema_for_question()
@@ -0,0 +1,89 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+
+from app.slow_query_service import SlowQueryLog, fingerprint
+from app.services.nlp.query_service import QueryService
+from app.services.nlp.mocks import MockSchemaService, MockCacheService
+
+class TenantDBService:
+    def __init__(self, engine):
+        self.engine = engine
+    def get_connection_info(self, tenant_id, user_id=None, db=None):
+        return SimpleNamespace(db_type="sqlite", database_name=None, query_timeout_ms=None)
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+class FixedLLM:
+    def generate(self, prompt):
+        return "SELECT id, total_amount FROM orders WHERE total_amount > 5"
+
+def make_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, total_amount NUMERIC)"))
+        conn.execute(text("INSERT INTO orders VALUES (1, 10), (2, 20)"))
+    return engine
+
+def wait_for_plans(log):
+    # One explain worker: a no-op submitted now finishes after every queued plan
+    log._background.submit(lambda: None).result()
+
+def test_slow_query_log(tmp_path):
+    engine = make_engine(tmp_path)
+    log = SlowQueryLog(threshold_ms=100, max_per_tenant=2)
+
+    # 1. Fast queries are ignored; slow ones are grouped by shape, keeping the slowest literals
+    assert not log.observe("t1", "sqlite", engine, "SELECT * FROM orders WHERE id = 1", 20, 1)
+    assert log.observe("t1", "sqlite", engine, "SELECT * FROM orders WHERE id = 1", 150, 1)
+    assert log.observe("t1", "sqlite", engine, "select *  from orders where id = 2", 300, 1)
+    assert fingerprint("SELECT * FROM orders WHERE id = 1") == fingerprint("select * from orders where id = 22")
+    worst = log.worst("t1")
+    assert len(worst) == 1 and worst[0]["count"] == 2 and worst[0]["max_ms"] == 300
+    assert worst[0]["query"] == "select *  from orders where id = 2"
+
+    # 2. A full log only makes room for something slower than its fastest entry
+    assert log.observe("t1", "sqlite", engine, "SELECT COUNT(*) FROM orders", 200, 1)
+    assert not log.observe("t1", "sqlite", engine, "SELECT MAX(id) FROM orders", 120, 1)
+    assert log.observe("t1", "sqlite", engine, "SELECT SUM(total_amount) FROM orders", 500, 1, timed_out=True)
+    worst = log.worst("t1")
+    assert [q["max_ms"] for q in worst] == [500, 300] and worst[0]["timeouts"] == 1
+
+    # 3. Plans are captured in the background
+    wait_for_plans(log)
+    print(f"✅ Worst offenders: {[(q['query'], q['plan']) for q in worst]}")
+    assert all(q["plan"] and q["plan_error"] is None for q in log.worst("t1"))
+    assert any("SCAN" in step for step in log.worst("t1")[0]["plan"])
+    assert any("SEARCH" in step for step in log.worst("t1")[1]["plan"])
+
+    log.remove_tenant("t1")
+    assert log.worst("t1") == []
+
+def test_ask_logs_slow_queries(tmp_path):
+    engine = make_engine(tmp_path)
+    log = SlowQueryLog(threshold_ms=0)
+    service = QueryService(TenantDBService(engine), MockSchemaService(), MockCacheService(), llm_client=FixedLLM(),
+                           slow_query_log=log)
+
+    result = service.ask("t1", "Big orders", user_id=1)
+    wait_for_plans(log)
+    logged = log.worst("t1")
+    print(f"✅ Logged from ask: {logged[0]['query']} ({logged[0]['max_ms']}ms)")
+    assert len(logged) == 1 and logged[0]["query"] == result["sql"] and logged[0]["last_rows"] == 2
+    assert logged[0]["plan"]
+
+    # A cache hit never reaches the tenant database, so nothing new is logged
+    service.ask("t1", "Big orders", user_id=1)
+    assert log.worst("t1")[0]["count"] == 1
+
+    print("\n✅ Slow query log verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_slow_query_log(pathlib.Path(tempfile.mkdtemp()))
+    test_ask_logs_slow_queries(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,106 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow importing from the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+from starlette.concurrency import run_in_threadpool
+
+from app.tracing import tracer, BatchSpanExporter, current_span
+from app.services.nlp.query_service import QueryService
+from app.services.nlp.mocks import MockSchemaService, MockCacheService
+
+class TenantDBService:
+    def __init__(self, engine):
+        self.engine = engine
+    def get_connection_info(self, tenant_id, user_id=None, db=None):
+        return SimpleNamespace(db_type="sqlite", database_name=None, query_timeout_ms=None)
+    def get_engine(self, tenant_id, user_id=None, db=None):
+        return self.engine
+
+class FixedLLM:
+    def generate(self, prompt):
+        return "SELECT id, total_amount FROM orders"
+
+def exported_spans(path):
+    spans = []
+    with open(path) as f:
+        for line in f:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+def attributes(span):
+    return {a["key"]: list(a["value"].values())[0] for a in span["attributes"]}
+
+def test_ask_trace_exported(tmp_path):
+    # A file database, since the request runs on a threadpool thread
+    engine = create_engine(f"sqlite:///{tmp_path / 'tenant.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, total_amount NUMERIC)"))
+        conn.execute(text("INSERT INTO orders VALUES (1, 10), (2, 20), (3, 30)"))
+    service = QueryService(TenantDBService(engine), MockSchemaService(), MockCacheService(), llm_client=FixedLLM())
+    exporter = BatchSpanExporter(path=str(tmp_path / "traces.jsonl"), flush_interval=0.05)
+    exporter.start()
+    tracer.configure(1.0, exporter)
+    try:
+        # 1. The caller's traceparent is continued, and the context follows the request into the threadpool
+        caller = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+        async def request():
+            with tracer.span("POST /api/ask", kind="server", traceparent=caller):
+                return await run_in_threadpool(service.ask, "t1", "Show orders", 1)
+
+        result = asyncio.run(request())
+        assert len(result["answer"]) == 3
+    finally:
+        tracer.configure(0.0, None)
+        exporter.stop()
+
+    spans = exported_spans(tmp_path / "traces.jsonl")
+    by_name = {span["name"]: span for span in spans}
+    print(f"✅ Exported spans: {sorted(by_name)}")
+    assert {span["traceId"] for span in spans} == {"0af7651916cd43dd8448eb211c80319c"}
+    assert by_name["POST /api/ask"]["parentSpanId"] == "b7ad6b7169203331"
+    ask = by_name["QueryService.ask"]
+    assert ask["parentSpanId"] == by_name["POST /api/ask"]["spanId"]
+    assert by_name["ask.llm"]["parentSpanId"] == ask["spanId"]
+
+    # 2. Spans carry what is needed to explain a slow request
+    assert attributes(ask)["result.rows"] == "3" and int(attributes(ask)["result.bytes"]) > 0
+    assert attributes(by_name["ask.tenant_query"])["db.rows"] == "3"
+    assert attributes(ask)["ask.outcome"] == "answered"
+    assert exporter.get_stats()["exported"] == len(spans)
+
+def test_head_sampling():
+    exporter = BatchSpanExporter(path=os.devnull)
+    tracer.configure(1e-9, exporter)
+    try:
+        # 1. Unsampled traces still propagate ids, but record and export nothing
+        with tracer.span("root") as root:
+            with tracer.span("child") as child:
+                child.set_attribute("ignored", 1)
+            assert not root.recording and current_span() is root and not root.attributes
+
+        # 2. An incoming sampled flag wins over the local rate
+        with tracer.span("root", traceparent="00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01") as span:
+            assert span.recording and span.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert exporter.get_stats()["queued"] == 1
+    finally:
+        tracer.configure(0.0, None)
+
+    # 3. Tracing off: the span is a shared no-op
+    with tracer.span("off") as span:
+        assert not span.recording
+
+    print("\n✅ Request tracing verified successfully!")
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_ask_trace_exported(pathlib.Path(tempfile.mkdtemp()))
+    test_head_sampling()